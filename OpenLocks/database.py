@@ -0,0 +1,67 @@
+"""
+Настройки SQLite для одного файла db.sqlite3, в который одновременно пишут
+потоки бота, таймеры (очередь исходящих операций, дайджесты) и процесс админки.
+
+Используется в settings.py:
+
+    DATABASES = {'default': sqlite_database(BASE_DIR / 'db.sqlite3')}
+"""
+from pathlib import Path
+
+# Сколько соединение ждёт освобождения блокировки, прежде чем вернуть
+# «database is locked», мс
+SQLITE_BUSY_TIMEOUT = 20_000
+
+# PRAGMA, выполняемые на каждом новом соединении (OPTIONS['init_command']).
+# journal_mode=WAL сохраняется в самом файле БД: читатели не блокируют писателя,
+# писатель не блокирует читателей. Остальные действуют в пределах соединения.
+SQLITE_PRAGMAS = {
+    # действует только для нового файла, до создания таблиц; существующий
+    # переводится командой manage.py dbmaintain --enable-incremental-vacuum
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    # в WAL-режиме NORMAL не теряет целостность при сбое, только последние транзакции
+    # при отключении питания, зато не делает fsync на каждый COMMIT
+    'synchronous': 'NORMAL',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение — размер в КиБ: 64 МБ страничного кэша на соединение
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_init_command(pragmas: dict = None) -> str:
+    """Строка PRAGMA для OPTIONS['init_command']"""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+def sqlite_database(name, conn_max_age=None, pragmas: dict = None) -> dict:
+    """
+    Конфигурация DATABASES для SQLite.
+
+    conn_max_age=None — постоянные соединения: Django держит по одному соединению
+    на поток, поэтому потоки бота и воркеры админки не переоткрывают файл
+    и не выполняют PRAGMA на каждый запрос.
+
+    Тестовая база — тоже файл (test_<имя> рядом с основной), а не общая база
+    в памяти: только так тесты видят WAL и busy_timeout, как в работе.
+    """
+    name = Path(name)
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': {
+            # транзакция сразу берёт блокировку на запись: две транзакции
+            # «прочитать и записать» ждут друг друга, а не падают с database is locked
+            'transaction_mode': 'IMMEDIATE',
+            # таймаут модуля sqlite3 (секунды) до выполнения init_command
+            'timeout': SQLITE_BUSY_TIMEOUT / 1000,
+            'init_command': sqlite_init_command(pragmas),
+        },
+        'TEST': {
+            'NAME': name.with_name(f'test_{name.name}'),
+        },
+    }
@@ -14,6 +14,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 
+from OpenLocks.database import sqlite_database
+
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,6 +43,9 @@ CSRF_TRUSTED_ORIGINS = [
     "https://openlocks.silkgroup.su"
 ]
 
+# Холодный архив закрытых заявок (manage.py cold_archive)
+TASK_ARCHIVE_DIR = BASE_DIR / 'archive' / 'tasks'
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = '/www/static/'
@@ -100,9 +105,16 @@ CSP_STYLE_SRC   = ("'self'",)
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 DATABASES = {
+    # WAL, busy_timeout, PRAGMA кэша и постоянные соединения — см. OpenLocks/database.py
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3'),
+}
+
+# Общий для процесса бота и воркеров админки кэш (например, данные ботов из get_me):
+# кэш в памяти у каждого процесса свой, а файловый видят все
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -1,26 +1,29 @@
 import base64
 import io
+import json
 import os
 import secrets
 import string
 import zipfile
 
-import telebot
 from django import forms
 from django.contrib import admin, messages
-from django.db.models import Count, IntegerField, Q, Value
-from django.http import HttpResponse, HttpResponseRedirect
+from django.contrib.admin.views.main import ORDER_VAR
+from django.core.paginator import Paginator
+from django.db.models import Count, IntegerField, Prefetch, Q, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import path, reverse
 from django.utils import timezone
-from django.utils.html import format_html
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
 from django.utils.http import urlencode
 
 from rangefilter.filters import DateRangeFilter, NumericRangeFilter
 
 from solo.admin import SingletonModelAdmin
 
-from tgbot.managers.ssh_manager import SSHAccessManager, sync_keys
+from tgbot.managers.ssh_manager import SSHAccessManager
 from tgbot.models import *
 from tgbot.forms import SSHKeyAdminForm, SSHKeyChangeForm, SendMessageForm
 
@@ -28,6 +31,88 @@ admin.site.site_header = "Администрирование Open Locks"
 admin.site.site_title = "Администрирование Open Locks"
 admin.site.index_title = "Администрирование Open Locks"
 
+##############################
+# Списки больших таблиц
+##############################
+class EstimatedCountPaginator(Paginator):
+    """
+    Для списка без фильтров берёт число строк из статистики ANALYZE
+    (manage.py dbmaintain) вместо COUNT(*) по всей таблице.
+    Небольшие таблицы и отфильтрованные списки считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        from tgbot.logics.constants import Constants
+        from tgbot.logics.db_maintenance import table_row_estimate
+
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = table_row_estimate(queryset.model._meta.db_table)
+            if estimate is not None and estimate >= Constants.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdminMixin:
+    """Списки больших таблиц: оценка числа строк и без второго COUNT(*) по всей таблице"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def stream_export(queryset, fmt):
+    """Ответ, который отдаёт выгрузку порциями по мере чтения из базы"""
+    from tgbot.logics.export import CONTENT_TYPES, export_filename, export_lines
+    response = StreamingHttpResponse(export_lines(queryset, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(queryset.model, fmt)}"'
+    return response
+
+
+@admin.action(description="Выгрузить в CSV")
+def export_csv(modeladmin, request, queryset):
+    return stream_export(queryset, 'csv')
+
+
+@admin.action(description="Выгрузить в JSONL")
+def export_jsonl(modeladmin, request, queryset):
+    return stream_export(queryset, 'jsonl')
+
+
+def enqueue_job(request, kind, payload=None, total=1):
+    """Ставит фоновую задачу в очередь и открывает страницу её прогресса"""
+    from tgbot.logics.jobs import enqueue
+    job = enqueue(kind, payload=payload, total=total, created_by=request.user.get_username())
+    return redirect('admin:tgbot_backgroundjob_progress', job.pk)
+
+
+class TelegramUserChatIdFilter(admin.SimpleListFilter):
+    """
+    Фильтр по chat_id пользователя полем ввода — вместо списка всех
+    пользователей в боковой панели
+    """
+    title = "пользователю (chat_id)"
+    parameter_name = 'telegram_user_chat_id'
+    template = 'admin/tgbot/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # непустой список, иначе фильтр не выводится
+        return (('', ''),)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': [
+                (key, value) for key, value in changelist.params.items() if key != self.parameter_name
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if value.lstrip('-').isdigit():
+            return queryset.filter(telegram_user__chat_id=int(value))
+        return queryset
+
 ##############################
 # TelegramBotToken Admin
 ##############################
@@ -38,18 +123,21 @@ class TelegramBotTokenAdmin(admin.ModelAdmin):
     readonly_fields = ('bot_link', )
 
     def bot_link(self, obj: TelegramBotToken):
+        """Берётся из кэша get_me: страница не ждёт ответа Telegram, кэш обновляется в фоне"""
+        from tgbot.logics.bot_identity import cached_identity
+
         if not obj.token:
             return "Bot token is not defined"
-        try:
-            bot_instance = telebot.TeleBot(obj.token)
-            bot_info = bot_instance.get_me()
-            return format_html(
-                '<a href="https://t.me/{}" target="_blank">https://t.me/{}</a>',
-                bot_info.username,
-                bot_info.username,
-            )
-        except Exception as e:
-            return f"Ошибка: {e}"
+        bot_info = cached_identity(obj.token)
+        if bot_info is None:
+            return "Загружается…"
+        if bot_info.error:
+            return f"Ошибка: {bot_info.error}"
+        return format_html(
+            '<a href="https://t.me/{}" target="_blank">https://t.me/{}</a>',
+            bot_info.username,
+            bot_info.username,
+        )
     bot_link.short_description = "Ссылка на бота"
 
 ##############################
@@ -84,9 +172,7 @@ class ServerAdmin(SingletonModelAdmin):
 
     @admin.action(description="Синхронизировать SSH ключи")
     def sync_ssh_keys(self, request, queryset=None):
-        server = Server.get_solo()
-        sync_keys()
-        self.message_user(request, f"SSH ключи синхронизированы для сервера {server.ip}.", level=messages.SUCCESS)
+        return enqueue_job(request, BackgroundJob.Kind.SYNC_SSH_KEYS)
 
     def get_urls(self):
         urls = super().get_urls()
@@ -108,17 +194,13 @@ class ServerAdmin(SingletonModelAdmin):
         server = Server.get_solo()
         alphabet = string.ascii_letters + string.digits
         new_password = ''.join(secrets.choice(alphabet) for _ in range(12))
-        new_password_for_user = (server.user, new_password)
-        manager = SSHAccessManager()
-        manager.set_auth_methods(
-            server.password_auth,
-            server.pubkey_auth,
-            server.permit_root_login,
-            server.permit_empty_passwords,
-            new_password_for_user
+        # пароль показывается сейчас, а из параметров задачи стирается после выполнения
+        self.message_user(request, f"Пароль для пользователя {server.user} будет сброшен. Новый пароль: {new_password}", level=messages.SUCCESS)
+        return enqueue_job(
+            request,
+            BackgroundJob.Kind.RESET_PASSWORD,
+            payload={"user": server.user, "password": new_password},
         )
-        self.message_user(request, f"Пароль для пользователя {server.user} сброшен. Новый пароль: {new_password}", level=messages.SUCCESS)
-        return HttpResponseRedirect(request.path)
 
 ##############################
 # SSHKey Admin
@@ -146,9 +228,7 @@ class SSHKeyAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def sync_keys(self, request):
-        sync_keys()
-        self.message_user(request, "SSH ключи успешно синхронизированы.", messages.SUCCESS)
-        return redirect("..")
+        return enqueue_job(request, BackgroundJob.Kind.SYNC_SSH_KEYS)
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
@@ -242,7 +322,8 @@ class SSHKeyAdmin(admin.ModelAdmin):
 @admin.register(Configuration)
 class ConfigurationAdmin(SingletonModelAdmin):
     fieldsets = (
-        (None, {'fields': ('test_mode', 'auto_request_permission')}),
+        (None, {'fields': ('test_mode', 'auto_request_permission', 'push_new_tasks', 'digest_interval', 'copy_task_media')}),
+        ('Хранение', {'fields': ('task_retention_days', 'delete_archived_messages', 'cold_archive_days')}),
     )
 
 
@@ -259,6 +340,10 @@ class UserResponseInline(admin.TabularInline):
     verbose_name = "Отклик пользователя"
     verbose_name_plural = "Отклики пользователя"
 
+    def get_queryset(self, request):
+        # строка инлайна выводит str(отклика) — пользователь и заявка
+        return super().get_queryset(request).select_related('telegram_user', 'task', 'payment_type')
+
 ##############################
 # TelegramUser Admin
 ##############################
@@ -276,6 +361,8 @@ class TelegramUserAdmin(admin.ModelAdmin):
         'is_admin',
         'send_admin_notifications',
         'admin_signature',
+        'digest_mode',
+        'mention_state',
         'created_at',
     )
     search_fields = ('chat_id', 'first_name', 'last_name', 'username')
@@ -288,6 +375,8 @@ class TelegramUserAdmin(admin.ModelAdmin):
         'created_at',
         'is_admin',
         'send_admin_notifications',
+        'digest_mode',
+        'mention_state',
     )
     actions = [
         'allow_publish_tasks',
@@ -296,11 +385,16 @@ class TelegramUserAdmin(admin.ModelAdmin):
         'unblock_users',
         'refresh_user_data',
         'send_message_action',
+        export_csv,
+        export_jsonl,
     ]
     readonly_fields = (
         'bot_was_blocked',
+        'mention_checked_at',
+        'profile_synced_at',
         'created_at',
     )
+    filter_horizontal = ('tags',)
     inlines = [UserResponseInline]
 
     def get_urls(self):
@@ -355,35 +449,12 @@ class TelegramUserAdmin(admin.ModelAdmin):
     @admin.action(description="Обновить данные пользователя")
     def refresh_user_data(self, request, queryset):
         """
-        Для каждого выбранного TelegramUser вызывает sync_user_data(user).
-        Логирует успехи и ошибки через сообщения в админке.
+        Ставит в очередь фоновую задачу, которая обновляет профили выбранных
+        TelegramUser из Telegram (пропуская недавно обновлённые), и открывает её прогресс.
         """
-        from tgbot.handlers.user_helper import sync_user_data
-
-        total = queryset.count()
-        successes = 0
-        errors = []
-
-        for user in queryset:
-            try:
-                sync_user_data(user)
-                successes += 1
-            except Exception as e:
-                errors.append(f"{user.chat_id}: {e}")
-
-        if successes:
-            self.message_user(
-                request,
-                f"Успешно обновлено данных для {successes} из {total} пользователя(ей).",
-                level=messages.SUCCESS
-            )
-        if errors:
-            for err in errors:
-                self.message_user(
-                    request,
-                    f"Ошибка при обновлении пользователя {err}",
-                    level=messages.ERROR
-                )
+        user_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        return enqueue_job(request, BackgroundJob.Kind.REFRESH_USERS, payload={"user_ids": user_ids}, total=len(user_ids))
+
     @admin.action(description="Отправить сообщение выбранным пользователям")
     def send_message_action(self, request, queryset):
         user_ids = ",".join(str(user.id) for user in queryset)
@@ -392,19 +463,24 @@ class TelegramUserAdmin(admin.ModelAdmin):
     def process_send_message(self, request, users):
         """
         Обрабатывает форму отправки сообщения для заданного списка пользователей.
-        Если POST – выполняет отправку, если GET – отображает форму.
+        Если POST – ставит рассылку в очередь фоновых задач, если GET – отображает форму.
         """
-        from tgbot.logics.administrator_actions import mass_mailing
         if request.method == "POST":
             form = SendMessageForm(request.POST)
             if form.is_valid():
-                message_text = form.cleaned_data["message"]
-                sender = form.cleaned_data["sender"]
-                result = mass_mailing(admin=sender, users=users, text=message_text)
-                if result is None:
-                    result = "Не удалось отправить сообщения"
-                messages.success(request, result)
-                return redirect("..")
+                from tgbot.logics.mailing import create_campaign
+                campaign = create_campaign(
+                    sender=form.cleaned_data["sender"],
+                    text=form.cleaned_data["message"],
+                    users=users,
+                    created_by=request.user.get_username(),
+                )
+                return enqueue_job(
+                    request,
+                    BackgroundJob.Kind.MASS_MAILING,
+                    payload={"campaign_id": campaign.pk},
+                    total=campaign.recipients_total,
+                )
         else:
             form = SendMessageForm()
 
@@ -415,8 +491,8 @@ class TelegramUserAdmin(admin.ModelAdmin):
         """
         Обработчик для отправки сообщения конкретному пользователю (на странице change).
         """
-        user = self.get_object(request, object_id)
-        return self.process_send_message(request, [user])
+        users = self.get_queryset(request).filter(pk=object_id)
+        return self.process_send_message(request, users)
 
 
     def send_message_view(self, request):
@@ -438,17 +514,41 @@ class PaymentTypeModelAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'description')
     search_fields = ('name',)
 
+##############################
+# Tag Admin
+##############################
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'subscribers_count', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('created_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_subscribers_count=Count('subscribers', distinct=True))
+
+    @admin.display(description='Подписчики', ordering='_subscribers_count')
+    def subscribers_count(self, obj):
+        return obj._subscribers_count
+
 ##############################
 # Files Inline for Task
 ##############################
+def sent_messages_prefetch():
+    """Отправленные сообщения файла вместе с получателями — одним запросом на страницу"""
+    return Prefetch('message_ledger', queryset=SentMessage.objects.select_related('telegram_user'))
+
+
 class FilesInline(admin.TabularInline):
     model = Files
     extra = 0
     readonly_fields = ('file_id', 'file_type', 'get_sent_messages', 'created_at')
     can_delete = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(sent_messages_prefetch())
+
     def get_sent_messages(self, obj):
-        return ", ".join(f"{sm.message_id} ({sm.telegram_user})" for sm in obj.sent_messages.all())
+        return ", ".join(f"{sm.message_id} ({sm.telegram_user})" for sm in obj.message_ledger.all())
     get_sent_messages.short_description = "Отправленные сообщения"
 
 ##############################
@@ -463,6 +563,9 @@ class ResponseInline(admin.TabularInline):
     verbose_name = "Отклик"
     verbose_name_plural = "Отклики"
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('telegram_user', 'payment_type')
+
 ##############################
 # Task Admin
 ##############################
@@ -470,7 +573,7 @@ from tgbot.logics.constants import Constants
 from tgbot.logics.random_numbers import random_number_list
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'id',
         'random_task_number',
@@ -478,11 +581,17 @@ class TaskAdmin(admin.ModelAdmin):
         'creator',
         'stage',
         'created_at',
+        'closed_at',
     )
     # стандартные поля для текстового поиска
     search_fields = ('title', 'description')
     readonly_fields = ('random_task_number',)
+    list_filter = ('stage', 'tags')
+    list_select_related = ('creator',)
+    autocomplete_fields = ('creator',)
+    filter_horizontal = ('tags',)
     inlines = [FilesInline, ResponseInline]
+    actions = [export_csv, export_jsonl]
 
     def random_task_number(self, obj):
         num = random_number_list.get(obj.pk)
@@ -493,18 +602,32 @@ class TaskAdmin(admin.ModelAdmin):
         """
         Если запрос — ровно та же длина цифр, что NUMBER_LENGTH,
         игнорируем поиск по текстовым полям и ищем только по случайному номеру.
-        Иначе — обычный поиск по title/description.
+        Иначе — полнотекстовый поиск FTS5 по title/description с ранжированием
+        и поиском по началу слов, а без FTS5 — обычный LIKE.
         """
+        from django.db.models import F
+        from tgbot.logics.task_fts import search_tasks
+
+        search_term = search_term.strip()
         # проверяем, всё ли цифры, и ровно нужная длина
         if search_term.isdigit() and len(search_term) == Constants.NUMBER_LENGTH:
-            # ищем среди всех задач
-            matching_pks = [
-                pk for pk in self.model.objects.values_list('pk', flat=True)
-                if f"{random_number_list.get(pk):0{Constants.NUMBER_LENGTH}}" == search_term
-            ]
-            queryset = self.model.objects.filter(pk__in=matching_pks)
+            # номер однозначно задаёт остаток id по модулю — считается в запросе
+            index = random_number_list.index_of(int(search_term))
+            if index is None:
+                return queryset.none(), False
+            queryset = queryset.annotate(
+                _number_index=F('id') % random_number_list.max_value
+            ).filter(_number_index=index)
             return queryset, False
 
+        if search_term:
+            ranked = search_tasks(queryset, search_term)
+            if ranked is not None:
+                # без выбранной в списке сортировки — сначала самые релевантные
+                if ORDER_VAR not in request.GET:
+                    ranked = ranked.order_by('_fts_rank', '-pk')
+                return ranked, False
+
         # иначе — стандартная обработка (по title/description)
         return super().get_search_results(request, queryset, search_term)
 
@@ -521,25 +644,302 @@ class TaskAdmin(admin.ModelAdmin):
             delete_all_task_related(task)
         super().delete_queryset(request, queryset)
 
+##############################
+# Response Admin
+##############################
+@admin.register(Response)
+class ResponseAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'task', 'telegram_user', 'payment_type', 'created_at')
+    search_fields = ('telegram_user__chat_id', 'telegram_user__username', 'task__title')
+    list_filter = ('payment_type', TelegramUserChatIdFilter, ('created_at', DateRangeFilter))
+    list_select_related = ('task', 'telegram_user', 'payment_type')
+    autocomplete_fields = ('task', 'telegram_user')
+    actions = [export_csv, export_jsonl]
+
 ##############################
 # Files Admin
 ##############################
 @admin.register(Files)
-class FilesAdmin(admin.ModelAdmin):
+class FilesAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'task', 'file_type', 'file_id', 'created_at', 'get_sent_messages')
     search_fields = ('file_id', 'task__title')
     list_filter = ('file_type', 'created_at')
+    list_select_related = ('task',)
+    autocomplete_fields = ('task',)
     readonly_fields = ('file_id', 'file_type', 'created_at')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(sent_messages_prefetch())
+
     def get_sent_messages(self, obj):
-        return ", ".join(f"{sm.message_id} ({sm.telegram_user})" for sm in obj.sent_messages.all())
+        return ", ".join(f"{sm.message_id} ({sm.telegram_user})" for sm in obj.message_ledger.all())
     get_sent_messages.short_description = "Отправленные сообщения"
 
 ##############################
 # SentMessage Admin
 ##############################
 @admin.register(SentMessage)
-class SentMessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'message_id', 'telegram_user', 'created_at')
+class SentMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'message_id', 'kind', 'telegram_user', 'task', 'created_at')
     search_fields = ('message_id', 'telegram_user__chat_id', 'telegram_user__username')
-    list_filter = ('telegram_user', 'created_at')
+    list_filter = ('kind', TelegramUserChatIdFilter, 'created_at')
+    list_select_related = ('telegram_user', 'task')
+    autocomplete_fields = ('telegram_user', 'task')
+    raw_id_fields = ('file', 'response')
+    actions = [export_csv, export_jsonl]
+
+
+##############################
+# OutboxMessage Admin
+##############################
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'id', 'operation', 'status', 'task', 'telegram_user', 'chat_id', 'attempts', 'next_attempt_at', 'error', 'updated_at'
+    )
+    search_fields = ('telegram_user__chat_id', 'telegram_user__username', 'chat_id', 'error')
+    list_filter = ('status', 'operation', 'updated_at')
+    list_select_related = ('task', 'telegram_user')
+    readonly_fields = [field.name for field in OutboxMessage._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+##############################
+# DeadLetter Admin
+##############################
+@admin.register(DeadLetter)
+class DeadLetterAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'operation', 'error_class', 'chat_id', 'task', 'attempts', 'updated_at', 'replayed_at')
+    search_fields = ('chat_id', 'telegram_user__username', 'error_class', 'error_message')
+    list_filter = ('operation', 'error_class', ('replayed_at', admin.EmptyFieldListFilter), 'updated_at')
+    list_select_related = ('task', 'telegram_user')
+    readonly_fields = [field.name for field in DeadLetter._meta.fields]
+    actions = ['replay']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Отправить повторно")
+    def replay(self, request, queryset):
+        from tgbot.logics.dead_letters import replay_dead_letters
+        outbox_ids, skipped = replay_dead_letters(queryset)
+        self.message_user(
+            request,
+            f"Поставлено в очередь: {len(outbox_ids)}, пропущено: {skipped}.",
+            level=messages.SUCCESS
+        )
+
+
+##############################
+# ArchivedTask Admin
+##############################
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('task_id', 'random_task_number', 'title', 'creator_chat_id', 'responses_count', 'created_at', 'closed_at')
+    # номер ищется как число, поэтому «0042» тоже находит заявку №0042
+    search_fields = ('=task_id', '=number', '=creator_chat_id', 'title')
+    list_filter = (('created_at', DateRangeFilter), ('closed_at', DateRangeFilter))
+    readonly_fields = [field.name for field in ArchivedTask._meta.fields] + ['archived_record']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Случайный номер")
+    def random_task_number(self, obj):
+        return obj.random_task_number
+
+    @admin.display(description="Заявка из архива")
+    def archived_record(self, obj):
+        from tgbot.logics.cold_archive import load_archived_task
+        record = load_archived_task(obj)
+        if record is None:
+            return "Запись не найдена в файле архива"
+        return format_html("<pre>{}</pre>", json.dumps(record, ensure_ascii=False, indent=2))
+
+
+##############################
+# DailyStats Admin
+##############################
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'tasks_created', 'tasks_closed', 'responses', 'unique_masters', 'reconciled_at')
+    list_filter = (('date', DateRangeFilter),)
+    readonly_fields = [field.name for field in DailyStats._meta.fields] + ['payment_breakdown', 'top_masters']
+    date_hierarchy = 'date'
+    change_list_template = "admin/tgbot/dailystats/change_list.html"
+    actions = ['reconcile_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        """Над таблицей — итоги за выбранный период из тех же строк сводки"""
+        from django.db.models import Sum
+        response = super().changelist_view(request, extra_context=extra_context)
+        cl = getattr(response, 'context_data', {}).get('cl')
+        if cl is None:
+            return response
+
+        dates = cl.queryset.values('date')
+        response.context_data['totals'] = cl.queryset.aggregate(
+            tasks_created=Sum('tasks_created'),
+            tasks_closed=Sum('tasks_closed'),
+            responses=Sum('responses'),
+        )
+        response.context_data['totals']['unique_masters'] = (
+            DailyMasterActivity.objects.filter(date__in=dates).values('telegram_user').distinct().count()
+        )
+        response.context_data['payment_totals'] = (
+            DailyPaymentStats.objects.filter(date__in=dates)
+            .values('payment_type__name')
+            .annotate(total=Sum('responses'))
+            .order_by('-total')
+        )
+        return response
+
+    @admin.display(description="Отклики по типам оплаты")
+    def payment_breakdown(self, obj):
+        rows = DailyPaymentStats.objects.filter(date=obj.date).select_related('payment_type').order_by('-responses')
+        return format_html_join(
+            '', '<div>{}: {}</div>',
+            ((row.payment_type or 'Без типа оплаты', row.responses) for row in rows)
+        ) or '—'
+
+    @admin.display(description="Мастера")
+    def top_masters(self, obj):
+        rows = DailyMasterActivity.objects.filter(date=obj.date).select_related('telegram_user').order_by('-responses')
+        return format_html_join(
+            '', '<div>{}: {}</div>',
+            ((row.telegram_user, row.responses) for row in rows)
+        ) or '—'
+
+    @admin.action(description="Пересчитать по таблицам")
+    def reconcile_selected(self, request, queryset):
+        from django.db.models import Max, Min
+        from tgbot.logics.stats import reconcile
+        bounds = queryset.aggregate(start=Min('date'), end=Max('date'))
+        days = reconcile(bounds['start'], bounds['end']) if bounds['start'] else 0
+        self.message_user(request, f"Сверено дней: {days}.", level=messages.SUCCESS)
+
+
+##############################
+# BackgroundJob Admin
+##############################
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'eta', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    # в параметрах может быть пароль — в админке они не показываются
+    exclude = ('payload',)
+    readonly_fields = [field.name for field in BackgroundJob._meta.fields if field.name != 'payload'] + ['progress', 'eta']
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                '<int:object_id>/progress/',
+                self.admin_site.admin_view(self.progress_view),
+                name='tgbot_backgroundjob_progress'
+            ),
+        ]
+        return custom_urls + urls
+
+    @admin.display(description="Прогресс")
+    def progress(self, obj):
+        return format_html(
+            '<a href="{}">{} из {} ({}%)</a>',
+            reverse('admin:tgbot_backgroundjob_progress', args=[obj.pk]),
+            obj.processed,
+            obj.total,
+            obj.percent,
+        )
+
+    @admin.display(description="Осталось")
+    def eta(self, obj):
+        return obj.eta if obj.eta is not None else '—'
+
+    def progress_view(self, request, object_id):
+        job = self.get_object(request, object_id)
+        if job is None:
+            self.message_user(request, "Фоновая задача не найдена.", level=messages.ERROR)
+            return redirect('admin:tgbot_backgroundjob_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': str(job),
+            'job': job,
+            'refresh': None if job.is_finished else Constants.JOB_PROGRESS_REFRESH,
+        }
+        return render(request, 'admin/tgbot/backgroundjob/progress.html', context)
+
+
+##############################
+# Mailing Admin
+##############################
+@admin.register(MailingCampaign)
+class MailingCampaignAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'status', 'sender', 'recipients_total', 'sent', 'failed', 'skipped',
+        'throughput', 'created_by', 'created_at', 'finished_at', 'recipients_link',
+    )
+    list_filter = ('status', 'created_at')
+    list_select_related = ('sender',)
+    search_fields = ('text',)
+    readonly_fields = [field.name for field in MailingCampaign._meta.fields] + ['throughput', 'recipients_link']
+    actions = ['cancel_campaigns', 'resume_campaigns']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Сообщений/мин")
+    def throughput(self, obj):
+        return obj.throughput if obj.throughput is not None else '—'
+
+    @admin.display(description="Получатели")
+    def recipients_link(self, obj):
+        url = reverse('admin:tgbot_mailingrecipient_changelist')
+        return format_html('<a href="{}?campaign__id__exact={}">Получатели</a>', url, obj.pk)
+
+    @admin.action(description="Остановить рассылку")
+    def cancel_campaigns(self, request, queryset):
+        count = queryset.filter(
+            status__in=(MailingCampaign.Status.PENDING, MailingCampaign.Status.RUNNING)
+        ).update(status=MailingCampaign.Status.CANCELLED)
+        self.message_user(request, f"Остановлено рассылок: {count}.", level=messages.SUCCESS)
+
+    @admin.action(description="Продолжить остановленную рассылку")
+    def resume_campaigns(self, request, queryset):
+        from tgbot.logics.jobs import enqueue
+        campaigns = []
+        for campaign in queryset.filter(status=MailingCampaign.Status.CANCELLED):
+            # повторное нажатие не ставит вторую задачу той же рассылки
+            if not MailingCampaign.objects.filter(
+                pk=campaign.pk, status=MailingCampaign.Status.CANCELLED
+            ).update(status=MailingCampaign.Status.PENDING):
+                continue
+            campaigns.append(campaign)
+            pending = campaign.recipients.filter(status=MailingRecipient.Status.PENDING).count()
+            enqueue(
+                BackgroundJob.Kind.MASS_MAILING,
+                payload={"campaign_id": campaign.pk},
+                total=pending,
+                created_by=request.user.get_username(),
+            )
+        self.message_user(request, f"Продолжено рассылок: {len(campaigns)}.", level=messages.SUCCESS)
+
+
+@admin.register(MailingRecipient)
+class MailingRecipientAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'campaign', 'telegram_user', 'status', 'message_id', 'error', 'updated_at')
+    list_filter = ('status', TelegramUserChatIdFilter)
+    list_select_related = ('campaign', 'telegram_user')
+    search_fields = ('=campaign__id', 'telegram_user__username')
+    readonly_fields = [field.name for field in MailingRecipient._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,122 @@
+"""
+Переносы данных для миграций приложения tgbot.
+Миграции генерируются при развёртывании (makemigrations), поэтому переносы,
+которые должны пройти без ручной правки сгенерированных файлов, выполняются
+после каждого migrate (post_migrate в tgbot/signals.py) и повторный запуск
+ничего не меняет. Остальные функции подключаются в сгенерированный файл
+через migrations.RunPython.
+"""
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+# (вид записи, таблица связи, столбец связи, SQL для id задания)
+_LEGACY_SENT_MESSAGE_LINKS = (
+    ("task", "tgbot_task_sent_messages", "task_id", "link.task_id"),
+    ("file", "tgbot_files_sent_messages", "files_id",
+     "(SELECT f.task_id FROM tgbot_files f WHERE f.id = link.files_id)"),
+    ("response", "tgbot_response_sent_messages", "response_id",
+     "(SELECT r.task_id FROM tgbot_response r WHERE r.id = link.response_id)"),
+)
+
+
+def fill_sent_message_ledger(connection) -> int:
+    """
+    Переносит связи из старых таблиц Task.sent_messages, Files.sent_messages и
+    Response.sent_messages в поля kind/task/file/response журнала SentMessage.
+    Переносятся только ещё не перенесённые строки, поэтому функция выполняется
+    после каждого migrate. Старые таблицы остаются, пока их не удалит
+    отдельный выпуск (см. missing_sent_message_links).
+    Возвращает число перенесённых записей.
+    """
+    existing = set(connection.introspection.table_names())
+    total = 0
+
+    with connection.cursor() as cursor:
+        columns = {
+            column.name for column in connection.introspection.get_table_description(cursor, "tgbot_sentmessage")
+        }
+        if "kind" not in columns:
+            # миграция с новыми полями журнала ещё не применена
+            return 0
+        for kind, table, column, task_sql in _LEGACY_SENT_MESSAGE_LINKS:
+            if table not in existing:
+                continue
+            assignments = [
+                f"task_id = (SELECT MIN({task_sql}) FROM {table} link "
+                f"WHERE link.sentmessage_id = tgbot_sentmessage.id)"
+            ]
+            if kind != "task":
+                assignments.append(
+                    f"{kind}_id = (SELECT MIN(link.{column}) FROM {table} link "
+                    f"WHERE link.sentmessage_id = tgbot_sentmessage.id)"
+                )
+            cursor.execute(
+                f"UPDATE tgbot_sentmessage SET kind = %s, {', '.join(assignments)} "
+                f"WHERE {kind}_id IS NULL AND id IN (SELECT sentmessage_id FROM {table})",
+                [kind],
+            )
+            if cursor.rowcount:
+                logger.info(f"fill_sent_message_ledger: {table}: перенесено {cursor.rowcount} записей")
+            total += max(cursor.rowcount, 0)
+    return total
+
+
+def missing_sent_message_links(connection) -> dict[str, int]:
+    """
+    Сколько связей каждой старой таблицы ещё не перенесено в журнал SentMessage.
+    Старые поля sent_messages можно удалять из моделей, только когда везде 0:
+    иначе сгенерированный RemoveField удалит таблицу вместе с неперенесёнными связями.
+    """
+    existing = set(connection.introspection.table_names())
+    missing = {}
+    with connection.cursor() as cursor:
+        for kind, table, column, task_sql in _LEGACY_SENT_MESSAGE_LINKS:
+            if table not in existing:
+                continue
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {table} link "
+                f"JOIN tgbot_sentmessage message ON message.id = link.sentmessage_id "
+                f"WHERE message.{kind}_id IS NULL"
+            )
+            missing[table] = cursor.fetchone()[0]
+    return missing
+
+
+def dedupe_responses(apps, schema_editor):
+    """
+    Удаляет повторные отклики одного мастера на одно задание, оставляя самый ранний,
+    чтобы можно было добавить ограничение response_unique_task_user.
+
+    В миграции операция ставится перед AddConstraint:
+
+        migrations.RunPython(dedupe_responses, migrations.RunPython.noop)
+    """
+    from django.db.models import Count, Min
+
+    Response = apps.get_model("tgbot", "Response")
+    duplicates = (
+        Response.objects
+        .values("task_id", "telegram_user_id")
+        .annotate(first_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+
+    removed = 0
+    for row in duplicates.iterator():
+        deleted, _ = (
+            Response.objects
+            .filter(task_id=row["task_id"], telegram_user_id=row["telegram_user_id"])
+            .exclude(id=row["first_id"])
+            .delete()
+        )
+        removed += deleted
+    logger.info(f"dedupe_responses: удалено повторных откликов и связанных записей: {removed}")
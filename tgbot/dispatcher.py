@@ -1,9 +1,9 @@
 import telebot
-from tgbot.logics.constants import Messages
-from tgbot.models import Configuration, TelegramBotToken, TelegramUser
+from tgbot.logics.constants import Constants, Messages
+from tgbot.models import BotUpdateOffset, Configuration, TelegramBotToken, TelegramUser
 from tgbot.logics.commands import init_bot_commands
 from typing import List
-from telebot import TeleBot
+from telebot import TeleBot, util
 from telebot.types import Update, Message, CallbackQuery
 from telebot.apihelper import ApiException
 
@@ -16,6 +16,9 @@ import time
 import threading
 import queue
 import concurrent.futures
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
 
 # Убедимся, что папка logs существует
 Path("logs").mkdir(parents=True, exist_ok=True)
@@ -28,6 +31,29 @@ class SyncBot(TeleBot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # недавно обработанные update_id — защита от повторной обработки
+        self._seen_updates: OrderedDict = OrderedDict()
+        self._seen_lock = threading.Lock()
+
+        # партии апдейтов, обработчики которых ещё выполняются в пуле потоков:
+        # id партии → [наибольший update_id, незавершённых задач, раздача закончена]
+        self._batches: OrderedDict = OrderedDict()
+        self._batches_lock = threading.Lock()
+        self._batch_ids = itertools.count(1)
+        # партия, которую сейчас раздаёт process_new_updates в потоке polling
+        self._dispatch_local = threading.local()
+
+        # чаты, успешные отправки в которые внутри deferred_unblock() ещё не сбросили bot_was_blocked
+        self._unblock_lock = threading.Lock()
+        self._unblock_depth = 0
+        self._unblocked_chats: set = set()
+
+        # продолжаем с сохранённого в БД смещения
+        stored_offset = self._load_update_offset()
+        self.has_stored_offset = stored_offset is not None
+        self._stored_update_id = stored_offset or 0
+        self.last_update_id = self._stored_update_id
+
         # очередь задач: каждый элемент — (func, args, kwargs, future)
         self._call_queue: queue.Queue = queue.Queue()
         # поток-демон, который обрабатывает очередь
@@ -42,9 +68,58 @@ class SyncBot(TeleBot):
                 future.set_result(result)
             except Exception as e:
                 future.set_exception(e)
+            finally:
+                self._call_queue.task_done()
             # задержка между запросами
             time.sleep(0.05)
 
+    def drain_queue(self):
+        """
+        Блокируется, пока не будут выполнены все уже поставленные в очередь вызовы.
+        """
+        self._call_queue.join()
+
+    def reload_token(self, token: str):
+        """
+        Переключает бота на новый токен без пересоздания объекта:
+        зарегистрированные обработчики сохраняются, а очередь исходящих
+        вызовов перед переключением дорабатывается со старым токеном.
+        Polling на момент вызова должен быть остановлен.
+        """
+        self.drain_queue()
+        self.token = token
+        self.bot_id = util.extract_bot_id(token)
+        # сбрасываем закэшированный get_me
+        self._user = None
+        with self._seen_lock:
+            self._seen_updates.clear()
+        with self._batches_lock:
+            # обработчики апдейтов старого токена не должны сохранять offset нового
+            self._batches.clear()
+        stored_offset = self._load_update_offset()
+        self.has_stored_offset = stored_offset is not None
+        self._stored_update_id = stored_offset or 0
+        self.last_update_id = self._stored_update_id
+        logger.info(f"Бот переключён на токен бота {self.bot_id}")
+
+    @contextmanager
+    def deferred_unblock(self):
+        """
+        Внутри блока успешная отправка сообщения не проверяет признак
+        bot_was_blocked получателя отдельным запросом: чаты запоминаются,
+        и признак сбрасывается у всех одним запросом при выходе из блока.
+        """
+        with self._unblock_lock:
+            self._unblock_depth += 1
+        try:
+            yield
+        finally:
+            with self._unblock_lock:
+                self._unblock_depth -= 1
+                chat_ids, self._unblocked_chats = self._unblocked_chats, set()
+            if chat_ids:
+                TelegramUser.objects.filter(chat_id__in=chat_ids, bot_was_blocked=True).update(bot_was_blocked=False)
+
     def _enqueue(self, func, *args, **kwargs):
         """
         Помещает вызов func(*args, **kwargs) в очередь и
@@ -73,6 +148,10 @@ class SyncBot(TeleBot):
             raise
         else:
             # при успешной отправке — сбрасываем признак блокировки
+            with self._unblock_lock:
+                if self._unblock_depth:
+                    self._unblocked_chats.add(chat_id)
+                    return msg
             try:
                 u = TelegramUser.objects.get(chat_id=chat_id)
                 if u.bot_was_blocked:
@@ -115,15 +194,94 @@ class SyncBot(TeleBot):
             logger.error(f"Failed to edit_message_reply_markup {message_id}: {e}")
             raise
 
+    def _load_update_offset(self) -> int | None:
+        if self.bot_id is None:
+            return None
+        try:
+            return BotUpdateOffset.get_offset(self.bot_id)
+        except Exception as e:
+            logger.error(f"Не удалось загрузить offset для бота {self.bot_id}: {e}")
+            return None
+
+    def _store_update_offset(self, update_id: int):
+        """
+        Сохраняет в БД последний обработанный update_id,
+        чтобы после перезапуска polling продолжился с него.
+        """
+        if self.bot_id is None or update_id <= self._stored_update_id:
+            return
+        try:
+            BotUpdateOffset.set_offset(self.bot_id, update_id)
+            self._stored_update_id = update_id
+            self.has_stored_offset = True
+        except Exception as e:
+            logger.error(f"Не удалось сохранить offset {update_id} для бота {self.bot_id}: {e}")
+
+    def _exec_task(self, task, *args, **kwargs):
+        """
+        Обработчики апдейтов из process_new_updates выполняются в пуле потоков
+        TeleBot. Задача оборачивается, чтобы offset партии сохранялся только
+        после того, как все её обработчики завершились.
+        """
+        batch_id = getattr(self._dispatch_local, "batch_id", None)
+        if batch_id is None or not self.threaded:
+            return super()._exec_task(task, *args, **kwargs)
+
+        with self._batches_lock:
+            self._batches[batch_id][1] += 1
+
+        def tracked(*task_args, **task_kwargs):
+            try:
+                return task(*task_args, **task_kwargs)
+            finally:
+                self._finish_batch_task(batch_id)
+
+        return super()._exec_task(tracked, *args, **kwargs)
+
+    def _finish_batch_task(self, batch_id: int, dispatched: bool = False):
+        """
+        Отмечает завершение задачи партии (или окончание её раздачи) и сохраняет
+        offset последней партии, у которой она и все предыдущие партии обработаны.
+        Если процесс упадёт посреди обработчика, апдейт придёт снова после перезапуска.
+        """
+        with self._batches_lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return
+            if dispatched:
+                batch[2] = True
+            else:
+                batch[1] -= 1
+
+            completed = None
+            while self._batches:
+                update_id, pending, done = next(iter(self._batches.values()))
+                if pending or not done:
+                    break
+                self._batches.popitem(last=False)
+                completed = update_id
+            if completed is not None:
+                self._store_update_offset(completed)
+
+    def _remember_update(self, update_id: int) -> bool:
+        """
+        Запоминает update_id в ограниченном множестве недавно виденных.
+        Возвращает False, если этот апдейт уже обрабатывался.
+        """
+        with self._seen_lock:
+            if update_id <= self._stored_update_id or update_id in self._seen_updates:
+                return False
+            self._seen_updates[update_id] = None
+            while len(self._seen_updates) > Constants.SEEN_UPDATES_LIMIT:
+                self._seen_updates.popitem(last=False)
+            return True
+
     def _eat_update(self, update: Update):
         """
         Повышает offset (last_update_id), чтобы этот update не возвращался.
         """
-        try:
-            # TeleBot хранит последний апдейт в last_update_id или _last_update_id
+        if update.update_id > self.last_update_id:
             self.last_update_id = update.update_id
-        except AttributeError:
-            self._last_update_id = update.update_id
         logger.debug(f"_eat_update: съеден update {update.update_id}")
 
     def process_new_updates(self, updates: List[Update]):
@@ -133,12 +291,21 @@ class SyncBot(TeleBot):
         Все пропущенные апдейты «съедаются» методом _eat_update.
         """
         to_handle: List[Update] = []
+        if not updates:
+            return
+        max_update_id = max(update.update_id for update in updates)
 
         for update in updates:
-            # 1) Достаем сообщение или callback
-            message_or_callback = update.message or update.callback_query
+            # 0) Пропускаем апдейты, которые уже обрабатывались
+            if not self._remember_update(update.update_id):
+                logger.info(f"Повторный update {update.update_id} пропущен")
+                self._eat_update(update)
+                continue
+
+            # 1) Достаем сообщение, callback или inline-запрос
+            message_or_callback = update.message or update.callback_query or update.inline_query
             if message_or_callback is None:
-                logger.debug("Пропущен update без message/callback: %r", update)
+                logger.debug("Пропущен update без message/callback/inline_query: %r", update)
                 self._eat_update(update)
                 continue
 
@@ -172,12 +339,23 @@ class SyncBot(TeleBot):
             # 5) Всё успешно — добавляем к обработке
             to_handle.append(update)
 
+        batch_id = next(self._batch_ids)
+        with self._batches_lock:
+            self._batches[batch_id] = [max_update_id, 0, False]
+
         # 6) Передаём оставшиеся апдейты в TeleBot
         if to_handle:
+            self._dispatch_local.batch_id = batch_id
             try:
                 super().process_new_updates(to_handle)
             except Exception as e:
                 logger.exception("Ошибка super().process_new_updates: %s", e)
+            finally:
+                self._dispatch_local.batch_id = None
+
+        # 7) Фиксируем offset, когда обработчики партии завершатся,
+        # чтобы после перезапуска не потерять и не повторить апдейты
+        self._finish_batch_task(batch_id, dispatched=True)
 
     def _handle_blocked_user(self, update: Update, user) -> bool:
         from tgbot.handlers.user_helper import is_group_chat
@@ -192,8 +370,11 @@ class SyncBot(TeleBot):
                     text=msg,
                     reply_to_message_id=update.message.message_id
                 )
-            else:
+            elif update.callback_query:
                 self.answer_callback_query(update.callback_query.id, msg)
+            else:
+                # заблокированному пользователю inline-поиск ничего не находит
+                self.answer_inline_query(update.inline_query.id, [], is_personal=True)
 
             # «Съедаем» update прямо здесь
             self._eat_update(update)
@@ -267,8 +448,20 @@ class SyncBot(TeleBot):
                 return None
             raise
 
+    def _do_copy_messages(self, chat_id, from_chat_id, message_ids, *args, **kwargs):
+        try:
+            return super().copy_messages(chat_id, from_chat_id, message_ids, *args, **kwargs)
+        except ApiException as e:
+            if e.error_code == 403 and "bot was blocked by the user" in str(e).lower():
+                TelegramUser.objects.filter(chat_id=chat_id).update(bot_was_blocked=True)
+                return None
+            raise
+
     def send_message(self, chat_id, *args, **kwargs):
         return self._enqueue(self._do_send_message, chat_id, *args, **kwargs)
+
+    def copy_messages(self, chat_id, from_chat_id, message_ids, *args, **kwargs):
+        return self._enqueue(self._do_copy_messages, chat_id, from_chat_id, message_ids, *args, **kwargs)
     
     def send_media_group(self, chat_id, media, *args, **kwargs):
         return self._enqueue(self._do_send_media_group, chat_id, media, *args, **kwargs)
@@ -302,13 +495,23 @@ class SyncBot(TeleBot):
 
 logger.add("logs/dispatcher.log", rotation="10 MB", level="INFO")
 
-main_bot_token = TelegramBotToken.get_main_bot_token()
-test_bot_token = TelegramBotToken.get_test_bot_token()
-
-# Подмена токенов в тестовом режиме
-if Configuration.get_solo().test_mode:
-    if test_bot_token:
-        main_bot_token, test_bot_token = test_bot_token, main_bot_token
+def resolve_bot_tokens() -> tuple[str, str, bool]:
+    """
+    Возвращает (токен основного бота, токен тестового бота, test_mode)
+    с учётом подмены токенов в тестовом режиме.
+    """
+    main_token = TelegramBotToken.get_main_bot_token()
+    test_token = TelegramBotToken.get_test_bot_token()
+    test_mode = Configuration.get_solo().test_mode
+
+    # Подмена токенов в тестовом режиме
+    if test_mode and test_token:
+        main_token, test_token = test_token, main_token
+    return main_token, test_token, test_mode
+
+main_bot_token, test_bot_token, _test_mode = resolve_bot_tokens()
+if _test_mode:
+    if TelegramBotToken.get_test_bot_token():
         logger.info("Running in test mode — tokens swapped.")
     else:
         logger.warning("Running in test mode, but test token is missing. Using main token as is.")
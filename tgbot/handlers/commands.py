@@ -1,9 +1,8 @@
 from tgbot.logics.text_helper import *
-import datetime
 from django.utils import timezone
 from telebot.types import Message
 from tgbot.dispatcher import bot
-from tgbot.models import TelegramUser, Configuration, Task
+from tgbot.models import TelegramUser, Configuration, Task, Tag
 from tgbot.logics.messages import *
 from tgbot.logics.constants import *
 from tgbot.logics.keyboards import *
@@ -68,15 +67,50 @@ def handle_admin(message: Message):
 def handle_today(message: Message):
     """
     Показывает, сколько заявок было отправлено с начала сегодняшнего дня.
+    Число берётся из сводки за день, а не считается по таблице заявок.
     """
+    from tgbot.logics.stats import today_tasks_created
     now = timezone.localtime()
-    today_start = timezone.make_aware(
-        datetime.datetime.combine(now.date(), datetime.time.min),
-        timezone.get_current_timezone()
-    )
-    count = Task.objects.filter(created_at__gte=today_start).count()
+    count = today_tasks_created()
     date_str = now.strftime("%d.%m.%Y")
     bot.send_message(
         chat_id=message.chat.id,
         text=f"За {date_str} {word_number_case_was(count)} {word_number_case_sent(count)} {word_number_case_tasks(count)}"
     )
+
+@bot.message_handler(commands=[Commands.TAGS])
+def handle_tags(message: Message):
+    """
+    Показывает мастеру тэги, на которые можно подписаться.
+    """
+    user = TelegramUser.get_user_by_chat_id(chat_id=message.chat.id)
+    if not user:
+        bot.send_message(chat_id=message.chat.id, text=Messages.USER_IS_NO_REGISTERED)
+        return
+
+    if not Tag.objects.exists():
+        bot.send_message(chat_id=message.chat.id, text=Messages.NO_TAGS)
+        return
+
+    bot.send_message(
+        chat_id=message.chat.id,
+        text=Messages.MASTER_TAGS,
+        reply_markup=master_tags_keyboard(user=user)
+    )
+
+@bot.message_handler(commands=[Commands.DIGEST])
+def handle_digest(message: Message):
+    """
+    Включает или выключает режим сводки: новые заявки приходят одним сообщением.
+    """
+    user = TelegramUser.get_user_by_chat_id(chat_id=message.chat.id)
+    if not user:
+        bot.send_message(chat_id=message.chat.id, text=Messages.USER_IS_NO_REGISTERED)
+        return
+
+    user.digest_mode = not user.digest_mode
+    user.save(update_fields=["digest_mode"])
+    bot.send_message(
+        chat_id=message.chat.id,
+        text=Messages.DIGEST_MODE_ON if user.digest_mode else Messages.DIGEST_MODE_OFF
+    )
@@ -0,0 +1,41 @@
+from telebot.types import InlineQuery
+
+from tgbot.dispatcher import bot
+from tgbot.models import TelegramUser
+from tgbot.logics.constants import Constants
+from tgbot.logics.task_search import inline_task_results
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+@bot.inline_handler(func=lambda query: True)
+def handle_inline_query(query: InlineQuery):
+    """
+    Поиск открытых заявок через inline-режим (@бот запрос).
+    Выбранная заявка отправляется с кнопками типов оплаты,
+    отклик на неё работает так же, как на заявку из рассылки.
+    """
+    user = TelegramUser.get_user_by_chat_id(chat_id=query.from_user.id)
+    if not user or not user.can_publish_tasks:
+        bot.answer_inline_query(query.id, [], cache_time=Constants.INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    offset = int(query.offset) if query.offset and query.offset.isdigit() else 0
+    try:
+        results, next_offset = inline_task_results(user, query.query, offset)
+        bot.answer_inline_query(
+            query.id,
+            results,
+            cache_time=Constants.INLINE_CACHE_TIME,
+            is_personal=True,
+            next_offset=next_offset,
+        )
+    except Exception as e:
+        logger.error(f"handle_inline_query: ошибка поиска заявок для {user.chat_id}: {e}")
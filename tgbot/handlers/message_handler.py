@@ -1,6 +1,7 @@
 import os
 import time
 import threading
+from django.db import transaction
 from telebot.types import Message
 from tgbot.dispatcher import bot
 from tgbot.models import *
@@ -26,11 +27,11 @@ def extract_files_from_message(message: Message) -> list:
     files = []
     if message.content_type == 'photo' and message.photo:
         highest = message.photo[-1]
-        files.append({"file_id": highest.file_id, "type": "photo"})
+        files.append({"file_id": highest.file_id, "type": "photo", "message_id": message.message_id})
     elif message.content_type == 'document' and message.document:
-        files.append({"file_id": message.document.file_id, "type": "document"})
+        files.append({"file_id": message.document.file_id, "type": "document", "message_id": message.message_id})
     elif message.content_type == 'video' and message.video:
-        files.append({"file_id": message.video.file_id, "type": "video"})
+        files.append({"file_id": message.video.file_id, "type": "video", "message_id": message.message_id})
     return files
 
 def send_temporary_error(chat_id: int, reply_to_message_id, message_text: str):
@@ -70,25 +71,58 @@ def process_task_submission(chat_id: int, text: str, reply_to_message_id: int, f
         send_temporary_error(chat_id, reply_to_message_id, Messages.USER_CANT_PUBLISH_TASKS)
         return
 
-    # Всё ок — создаём задачу
-    logger.info(f"Создаём задачу от пользователя {chat_id}: '{text}'")
-    task = Task.objects.create(
-        title=text if len(text) <= 255 else text[:255],
-        description=text,
-        creator=user,
-        creator_message_id_to_reply=reply_to_message_id,
-        stage=Task.Stage.CREATED
-    )
-    logger.info(f"Задача {task.id} сохранена")
+    # 4) Упоминание диспетчера заведомо не сработает — не создаём заявку и не начинаем рассылку
+    if user.mention_is_broken():
+        logger.info(f"Упоминание пользователя {chat_id} не работает, заявка не создана")
+        send_temporary_error(chat_id, reply_to_message_id, Messages.USER_MENTION_PROBLEM)
+        return
+
+    # 5) Повторная доставка того же сообщения (например, после перезапуска) — не создаём дубль
+    if Task.objects.filter(creator=user, creator_message_id_to_reply=reply_to_message_id).exists():
+        logger.info(f"Заявка на сообщение {reply_to_message_id} от {chat_id} уже создана, пропускаем")
+        return
+
+    # Если настроены тэги, диспетчер сначала выбирает их, и только потом заявка рассылается
+    choose_tags = Tag.objects.exists()
 
-    # Сохраняем файлы, если есть
-    if files:
-        for f in files:
-            Files.objects.create(
+    # Всё ок — создаём задачу, файлы и рассылку мастерам одной транзакцией
+    logger.info(f"Создаём задачу от пользователя {chat_id}: '{text}'")
+    with transaction.atomic():
+        task = Task.objects.create(
+            title=text if len(text) <= 255 else text[:255],
+            description=text,
+            creator=user,
+            creator_message_id_to_reply=reply_to_message_id,
+            stage=Task.Stage.PENDING_TAG if choose_tags else Task.Stage.CREATED
+        )
+
+        # Сохраняем файлы, если есть
+        if files:
+            for f in files:
+                Files.objects.create(
+                    task=task,
+                    file_id=f["file_id"],
+                    file_type=f["type"],
+                    source_message_id=f.get("message_id")
+                )
+
+        if not choose_tags:
+            enqueue_task_broadcast(
                 task=task,
-                file_id=f["file_id"],
-                file_type=f["type"]
+                reply_markup=payment_types_keyboard(task=task)
             )
+    logger.info(f"Задача {task.id} сохранена")
+
+    if choose_tags:
+        # Рассылка начнётся после нажатия «Опубликовать»
+        send_task_message(
+            recipient=user,
+            task=task,
+            text=Messages.TASK_CHOOSE_TAGS_TASK_TEXT.format(task_text=task.dispather_task_text),
+            reply_markup=task_tags_keyboard(task=task),
+            reply_to_message_id=task.creator_message_id_to_reply,
+        )
+        return
 
     # Отправляем задачу диспетчеру
     send_task_message(
@@ -100,10 +134,7 @@ def process_task_submission(chat_id: int, text: str, reply_to_message_id: int, f
     )
 
     # Рассылаем мастерам
-    broadcast_send_task_to_users(
-        task=task,
-        reply_markup=payment_types_keyboard(task=task)
-    )
+    deliver_task_broadcast(task)
     
 
 def process_pending_text(chat_id: int, message: Message, text: str):
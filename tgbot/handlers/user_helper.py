@@ -1,4 +1,5 @@
-from telebot.types import Message, CallbackQuery
+from django.utils import timezone
+from telebot.types import Message, CallbackQuery, InlineQuery
 from tgbot.models import TelegramUser
 from tgbot.models import Configuration
 from pathlib import Path
@@ -11,10 +12,12 @@ Path("logs").mkdir(parents=True, exist_ok=True)
 log_filename = Path("logs") / f"{Path(__file__).stem}.log"
 logger.add(str(log_filename), rotation="10 MB", level="INFO")
 
-def sync_user_data(update: Message | CallbackQuery | TelegramUser) -> tuple[TelegramUser, bool] | None:
+def sync_user_data(update: Message | CallbackQuery | InlineQuery | TelegramUser) -> tuple[TelegramUser, bool] | None:
     """
     Синхронизирует поля TelegramUser (first_name, last_name, username, can_publish_tasks)
-    на основании приходящего Message или CallbackQuery.
+    на основании приходящего Message, CallbackQuery или InlineQuery.
+    У inline-запросов и кнопок под inline-сообщениями нет чата —
+    данные берутся из отправителя (from_user).
     Возвращает кортеж (user, created) или None, если не удалось получить chat_id
     или если это групповой чат.
     """
@@ -22,10 +25,9 @@ def sync_user_data(update: Message | CallbackQuery | TelegramUser) -> tuple[Tele
     if isinstance(update, Message):
         chat = update.chat
     elif isinstance(update, CallbackQuery):
-        if not update.message:
-            logger.error("sync_user_data: у CallbackQuery нет message")
-            return None
-        chat = update.message.chat
+        chat = update.message.chat if update.message else update.from_user
+    elif isinstance(update, InlineQuery):
+        chat = update.from_user
     elif isinstance(update, TelegramUser):
         from tgbot.dispatcher import bot
         chat = bot.get_chat(update.chat_id)
@@ -37,7 +39,7 @@ def sync_user_data(update: Message | CallbackQuery | TelegramUser) -> tuple[Tele
     is_group = is_group_chat(update)
 
     chat_id = chat.id
-    first_name = chat.first_name or chat.title or ""
+    first_name = chat.first_name or getattr(chat, "title", None) or ""
     # 3) Получаем или создаем пользователя
     user, created = TelegramUser.objects.get_or_create(
         chat_id=chat_id,
@@ -51,6 +53,28 @@ def sync_user_data(update: Message | CallbackQuery | TelegramUser) -> tuple[Tele
     )
 
     # 4) При необходимости обновляем изменившиеся поля
+    changed = apply_chat_profile(user, chat)
+    if isinstance(update, TelegramUser):
+        user.profile_synced_at = timezone.now()
+        TelegramUser.objects.filter(pk=user.pk).update(profile_synced_at=user.profile_synced_at)
+
+    if changed:
+        try:
+            user.save()
+            logger.info("sync_user_data: Updated TelegramUser %s", user.chat_id)
+        except Exception as e:
+            logger.error("sync_user_data: Failed to save TelegramUser %s: %s", user.chat_id, e)
+    else:
+        logger.info("sync_user_data: No changes for TelegramUser %s", user.chat_id)
+
+    return user, created
+
+def apply_chat_profile(user: TelegramUser, chat) -> bool:
+    """
+    Переносит имя и username из chat (Chat или User Telegram) в user без сохранения.
+    Возвращает True, если что-то изменилось.
+    """
+    first_name = chat.first_name or getattr(chat, "title", None) or ""
     changed = False
     if user.first_name != (first_name):
         user.first_name = first_name
@@ -63,24 +87,19 @@ def sync_user_data(update: Message | CallbackQuery | TelegramUser) -> tuple[Tele
         changed = True
 
     if changed:
-        try:
-            user.save()
-            logger.info("sync_user_data: Updated TelegramUser %s", user.chat_id)
-        except Exception as e:
-            logger.error("sync_user_data: Failed to save TelegramUser %s: %s", user.chat_id, e)
-    else:
-        logger.info("sync_user_data: No changes for TelegramUser %s", user.chat_id)
-
-    return user, created
+        # после смены профиля упоминание может заработать или перестать — проверим заново
+        user.mention_state = TelegramUser.MentionState.UNKNOWN
+        user.mention_checked_at = None
+    return changed
 
-def is_group_chat(obj: Message | CallbackQuery) -> bool:
+def is_group_chat(obj: Message | CallbackQuery | InlineQuery) -> bool:
     # достаём объект chat
     if isinstance(obj, Message):
         chat = obj.chat
-    elif isinstance(obj, CallbackQuery):
-        # у callback всегда есть .message
+    elif isinstance(obj, CallbackQuery) and obj.message:
         chat = obj.message.chat
     else:
+        # inline-запрос и кнопка под inline-сообщением всегда от конкретного пользователя
         return False
 
     return chat.type in ('group', 'supergroup')
\ No newline at end of file
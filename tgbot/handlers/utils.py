@@ -1,5 +1,9 @@
 import re
+import time
 import urllib.parse
+from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from telebot.types import CallbackQuery, MessageEntity
 
 from tgbot.dispatcher import bot
@@ -73,37 +77,19 @@ def get_task_from_call(call: CallbackQuery, task_id: int) -> Task | None:
 def delete_all_task_related(task: Task):
     """
     Удаляет все сообщения, связанные с заявкой:
-      - удаляет сами сообщения в Telegram,
-      - удаляет записи SentMessage из БД для:
-        * task.sent_messages
-        * всех f.sent_messages в task.files
-        * всех resp.sent_messages в task.responses
+      - записывает в очередь исходящих операций удаление самих сообщений в Telegram,
+      - удаляет записи SentMessage заявки (текст, файлы и отклики) из БД.
+    Сообщения в Telegram удаляются после фиксации транзакции,
+    поэтому при вызове из pre_delete API не вызывается под блокировкой БД.
     """
-    for sent in task.sent_messages.all():
-        try:
-            bot.delete_message(chat_id=sent.telegram_user.chat_id, message_id=sent.message_id)
-        except Exception as e:
-            logger.error(f"Не удалось удалить сообщение {sent.message_id} у {sent.telegram_user}: {e}")
-
-    for f in task.files.all():
-        for sent in f.sent_messages.all():
-            try:
-                bot.delete_message(chat_id=sent.telegram_user.chat_id, message_id=sent.message_id)
-            except Exception as e:
-                logger.error(f"Не удалось удалить сообщение файла {sent.message_id}: {e}")
-
-    for resp in task.responses.all():
-        for sent in resp.sent_messages.all():
-            try:
-                bot.delete_message(chat_id=sent.telegram_user.chat_id, message_id=sent.message_id)
-            except Exception as e:
-                logger.error(f"Не удалось удалить сообщение отклика {sent.message_id}: {e}")
-
-    task.sent_messages.all().delete()
-    for f in task.files.all():
-        f.sent_messages.all().delete()
-    for resp in task.responses.all():
-        resp.sent_messages.all().delete()
+    from tgbot.logics.outbox import deliver_on_commit, record_delete_messages
+
+    with transaction.atomic():
+        sent_messages = SentMessage.objects.filter(task=task)
+        outbox_ids = record_delete_messages(sent_messages.select_related("telegram_user"))
+        sent_messages.delete()
+
+    deliver_on_commit(outbox_ids)
 
 def get_task_for_creator(call: CallbackQuery, task_id: int) -> Task | None:
     """Получает объект Task по task_id и chat_id создателя."""
@@ -169,6 +155,7 @@ def handle_task_close(call: CallbackQuery):
 
     # 1) Ставим статус CLOSED
     task.stage = Task.Stage.CLOSED
+    task.closed_at = timezone.now()
     task.save()
 
     # 2) Готовим тексты
@@ -212,11 +199,22 @@ def handle_task_repeat(call: CallbackQuery):
     if not task:
         return
 
-    delete_all_task_related(task)
-    task.responses.all().delete()
+    if refuse_unmentionable(user, callback=call):
+        return
 
-    task.stage = Task.Stage.CREATED
-    task.save()
+    # Очистка, смена статуса и новая рассылка фиксируются одной транзакцией
+    with transaction.atomic():
+        delete_all_task_related(task)
+        task.responses.all().delete()
+
+        task.stage = Task.Stage.CREATED
+        task.closed_at = None
+        task.save()
+
+        enqueue_task_broadcast(
+            task=task,
+            reply_markup=payment_types_keyboard(task)
+        )
 
     send_task_message(
         recipient=user, 
@@ -226,10 +224,7 @@ def handle_task_repeat(call: CallbackQuery):
         reply_markup=dispather_task_keyboard(task=task),
     )
 
-    if broadcast_send_task_to_users(
-        task=task,
-        reply_markup=payment_types_keyboard(task)
-    ) != Constants.USER_MENTION_PROBLEM:
+    if deliver_task_broadcast(task) != Constants.USER_MENTION_PROBLEM:
         bot.answer_callback_query(call.id, Messages.TASK_REPEATED)
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CallbackData.PAYMENT_SELECT}?"))
@@ -237,7 +232,11 @@ def handle_payment_select(call: CallbackQuery):
     """
     Обработчик кнопок выбора типа оплаты, с упоминанием мастера.
     Приоритет: @username, если нет — text_mention, с фоллбеком на приватность.
+    Загрузка задания, проверки и создание отклика выполняются в одной транзакции,
+    повторный отклик отсекает уникальное ограничение (task, telegram_user).
     """
+    started = time.perf_counter()
+
     # 1. Получаем мастера и проверяем права
     master = get_user_from_call(call)
     if not master or not ensure_publish_permission(master, call):
@@ -251,46 +250,47 @@ def handle_payment_select(call: CallbackQuery):
     if payment_id is None or task_id is None:
         return
 
-    # 3. Загружаем объекты PaymentType и Task
-    try:
-        payment_type = PaymentTypeModel.objects.get(id=payment_id)
-    except PaymentTypeModel.DoesNotExist:
-        bot.answer_callback_query(call.id, Messages.PAYMENT_NOT_FOUND_ERROR)
+    if refuse_unmentionable(master, callback=call):
         return
 
+    # 3. Одна транзакция: тип оплаты, задание с диспетчером, проверки, отклик
+    #    и уже загруженные отклики для отрисовки текстов. Telegram API — после неё.
+    error = None
     try:
-        task = Task.objects.get(id=task_id)
-    except Task.DoesNotExist:
-        bot.answer_callback_query(call.id, Messages.TASK_NOT_FOUND_ERROR)
-        return
-
-    if master == task.creator:
-        bot.answer_callback_query(call.id, Messages.DISPATCHER_CANNOT_RESPOND_TO_HIS_REQUEST)
+        with transaction.atomic():
+            payment_type = PaymentTypeModel.objects.filter(id=payment_id).first()
+            task = Task.objects.select_related('creator').filter(id=task_id).first()
+            if payment_type is None:
+                error = Messages.PAYMENT_NOT_FOUND_ERROR
+            elif task is None:
+                error = Messages.TASK_NOT_FOUND_ERROR
+            elif task.creator_id == master.id:
+                error = Messages.DISPATCHER_CANNOT_RESPOND_TO_HIS_REQUEST
+            else:
+                response = Response.objects.create(
+                    task=task,
+                    telegram_user=master,
+                    payment_type=payment_type
+                )
+                prefetch_related_objects([task], Task.responses_prefetch())
+                has_task_message = task.message_ledger.filter(
+                    telegram_user=master, kind=SentMessage.Kind.TASK
+                ).exists()
+    except IntegrityError:
+        error = Messages.USER_CANNOT_RESPOND_TWICE
+
+    if error:
+        bot.answer_callback_query(call.id, error)
         return
 
-    if task.responses.filter(telegram_user=master).exists():
-        bot.answer_callback_query(call.id, Messages.USER_CANNOT_RESPOND_TWICE)
-        return
-
-    if not task.sent_messages.filter(telegram_user=master).exists():
+    # 4. Мастер откликнулся из inline-поиска — присылаем ему саму заявку
+    if not has_task_message:
         send_task_to_user(
             task=task,
             master=master,
             reply_markup=payment_types_keyboard(task=task)
         )
 
-    last_disp = (
-        task.sent_messages
-            .filter(telegram_user=task.creator)
-            .order_by("created_at")
-            .last()
-    )
-    response = Response.objects.create(
-        task=task,
-        telegram_user=master,
-        payment_type=payment_type
-    )
-
     sent = update_dipsather_task_text(
         task=task,
         response=response,
@@ -300,11 +300,15 @@ def handle_payment_select(call: CallbackQuery):
 
     if sent and sent != Constants.USER_MENTION_PROBLEM:
         bot.answer_callback_query(call.id, Messages.RESPONSE_SENT)
+        answered = time.perf_counter() - started
 
         broadcast_edit_master_task_message(
             task=task,
         )
-    
+        logger.info(
+            f"handle_payment_select: отклик {response.id} мастера {master.chat_id} на задание {task.id}: "
+            f"ответ на нажатие через {answered:.3f} с, всего {time.perf_counter() - started:.3f} с"
+        )
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CallbackData.RESPONSE_CANCEL}?"))
@@ -313,7 +317,7 @@ def handle_response_cancel(call: CallbackQuery):
     Обработчик нажатия кнопки "Отменить" в master_response_cancel_keyboard.
     
     При нажатии:
-      1. Удаляются все сообщения из response.sent_messages (удаляются уведомления, отправленные создателю заявки).
+      1. Удаляются все сообщения из response.message_ledger (удаляются уведомления, отправленные создателю заявки).
       2. Объект Response удаляется.
       3. Выполняется изменение диспетчерского сообщения для мастера, которое теперь содержит текст:
          "*Ваш отклик удалён*\n\n{task.task_text}"
@@ -333,7 +337,7 @@ def handle_response_cancel(call: CallbackQuery):
     master = response_obj.telegram_user
     task = response_obj.task
     
-    for sent in response_obj.sent_messages.all():
+    for sent in response_obj.message_ledger.all():
         try:
             bot.delete_message(task.creator.chat_id, sent.message_id)
         except Exception as e:
@@ -350,3 +354,172 @@ def handle_response_cancel(call: CallbackQuery):
     )
 
     bot.answer_callback_query(call.id, Messages.RESPONSE_CANCELED)
+
+
+def get_tag_from_call(call: CallbackQuery, params: dict) -> Tag | None:
+    """Получает объект Tag по tag_id из параметров callback."""
+    tag_id = extract_int_param(call, params, CallbackData.TAG_ID, Messages.MISSING_TAG_ID_ERROR)
+    if tag_id is None:
+        return None
+    try:
+        return Tag.objects.get(id=tag_id)
+    except Tag.DoesNotExist:
+        bot.answer_callback_query(call.id, Messages.TAG_NOT_FOUND_ERROR)
+        return None
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CallbackData.TAG_TOGGLE}?"))
+def handle_task_tag_toggle(call: CallbackQuery):
+    """
+    Обработчик кнопок тэгов заявки, пока она ожидает публикации:
+      - добавляет или убирает тэг,
+      - обновляет клавиатуру диспетчера.
+    """
+    user = get_user_from_call(call)
+    if not user or not ensure_publish_permission(user, call):
+        return
+
+    params = extract_query_params(call)
+    task_id = extract_int_param(call, params, CallbackData.TASK_ID, Messages.MISSING_TASK_ID_ERROR)
+    if task_id is None:
+        return
+
+    task = get_task_for_creator(call, task_id)
+    if not task:
+        return
+
+    if task.stage != Task.Stage.PENDING_TAG:
+        bot.answer_callback_query(call.id, Messages.TASK_ALREADY_PUBLISHED)
+        return
+
+    tag = get_tag_from_call(call, params)
+    if not tag:
+        return
+
+    from tgbot.logics.tags import toggle_task_tag
+    selected = toggle_task_tag(task, tag)
+
+    try:
+        bot.edit_message_reply_markup(
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=task_tags_keyboard(task=task)
+        )
+    except Exception as e:
+        logger.error(f"handle_task_tag_toggle: не удалось обновить клавиатуру задачи {task.id}: {e}")
+
+    bot.answer_callback_query(call.id, Messages.TAG_ADDED if selected else Messages.TAG_REMOVED)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CallbackData.CLOSE_TAG_TOGGLES}?"))
+def handle_task_publish(call: CallbackQuery):
+    """
+    Обработчик кнопки "Опубликовать":
+      - переводит заявку из ожидания тэгов в созданные,
+      - рассылает её мастерам, подписанным на выбранные тэги.
+    """
+    user = get_user_from_call(call)
+    if not user or not ensure_publish_permission(user, call):
+        return
+
+    params = extract_query_params(call)
+    task_id = extract_int_param(call, params, CallbackData.TASK_ID, Messages.MISSING_TASK_ID_ERROR)
+    if task_id is None:
+        return
+
+    task = get_task_for_creator(call, task_id)
+    if not task:
+        return
+
+    if refuse_unmentionable(user, callback=call):
+        return
+
+    # Смена статуса и запись рассылки фиксируются одной транзакцией,
+    # повторное нажатие не разошлёт заявку второй раз
+    with transaction.atomic():
+        updated = Task.objects.filter(id=task.id, stage=Task.Stage.PENDING_TAG).update(stage=Task.Stage.CREATED)
+        if updated:
+            task.stage = Task.Stage.CREATED
+            enqueue_task_broadcast(
+                task=task,
+                reply_markup=payment_types_keyboard(task)
+            )
+
+    if not updated:
+        bot.answer_callback_query(call.id, Messages.TASK_ALREADY_PUBLISHED)
+        return
+
+    edit_task_message(
+        recipient=user,
+        task=task,
+        new_text=task.dispather_task_text,
+        new_reply_markup=dispather_task_keyboard(task=task)
+    )
+
+    if deliver_task_broadcast(task) != Constants.USER_MENTION_PROBLEM:
+        bot.answer_callback_query(call.id, Messages.TASK_PUBLISHED)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CallbackData.TAG_SELECT}?"))
+def handle_master_tag_select(call: CallbackQuery):
+    """
+    Обработчик кнопок подписки мастера на тэги (/tags):
+      - подписывает на тэг или отписывает,
+      - обновляет клавиатуру.
+    """
+    user = get_user_from_call(call)
+    if not user:
+        return
+
+    params = extract_query_params(call)
+    tag = get_tag_from_call(call, params)
+    if not tag:
+        return
+
+    from tgbot.logics.tags import toggle_user_tag
+    subscribed = toggle_user_tag(user, tag)
+
+    try:
+        bot.edit_message_reply_markup(
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=master_tags_keyboard(user=user)
+        )
+    except Exception as e:
+        logger.error(f"handle_master_tag_select: не удалось обновить клавиатуру тэгов {user.chat_id}: {e}")
+
+    bot.answer_callback_query(call.id, Messages.TAG_SUBSCRIBED if subscribed else Messages.TAG_UNSUBSCRIBED)
+
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CallbackData.TASK_EXPAND}?"))
+def handle_task_expand(call: CallbackQuery):
+    """
+    Обработчик кнопок номеров заявок в сводке:
+    присылает мастеру полную заявку с кнопками выбора типа оплаты.
+    """
+    master = get_user_from_call(call)
+    if not master:
+        return
+
+    params = extract_query_params(call)
+    task_id = extract_int_param(call, params, CallbackData.TASK_ID, Messages.MISSING_TASK_ID_ERROR)
+    if task_id is None:
+        return
+
+    task = Task.objects.filter(id=task_id, stage=Task.Stage.CREATED).select_related("creator").first()
+    if not task:
+        bot.answer_callback_query(call.id, Messages.TASK_NOT_AVAILABLE)
+        return
+
+    if task.message_ledger.filter(telegram_user=master, kind=SentMessage.Kind.TASK).exists():
+        bot.answer_callback_query(call.id, Messages.TASK_ALREADY_SENT)
+        return
+
+    sent = send_task_to_user(
+        task=task,
+        master=master,
+        reply_markup=payment_types_keyboard(task=task)
+    )
+    if sent and sent != Constants.USER_MENTION_PROBLEM:
+        bot.answer_callback_query(call.id, Messages.TASK_EXPANDED)
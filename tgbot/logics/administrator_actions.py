@@ -11,24 +11,29 @@ Path("logs").mkdir(parents=True, exist_ok=True)
 log_filename = Path("logs") / f"{Path(__file__).stem}.log"
 logger.add(str(log_filename), rotation="10 MB", level="INFO")
 
-def mass_mailing(admin: TelegramUser, users:list[TelegramUser]=None, text = None, ):
-    msg = ""
-    if text is not None and admin is not None:
-        msg = f"{text}\n\n{admin.admin_signature or 'Администратор'}"
-    else:
+def mailing_text(admin: TelegramUser, text=None) -> str | None:
+    """Текст рассылки с подписью администратора или None, если нет текста или отправителя"""
+    if text is None or admin is None:
         return None
-    
+    return f"{text}\n\n{admin.admin_signature or 'Администратор'}"
+
+
+def mass_mailing(admin: TelegramUser, users=None, text = None, ):
+    """
+    Отправляет рассылку сразу, в текущем потоке. users — queryset или список
+    пользователей, по умолчанию все незаблокированные. Из админки рассылка
+    запускается фоновой задачей (BackgroundJob) с той же логикой.
+    """
+    from django.db.models import QuerySet
+    from tgbot.logics.mailing import campaign_summary, create_campaign, deliver_campaign
+
+    if mailing_text(admin, text) is None:
+        return None
+
     if users is None:
         users = TelegramUser.objects.exclude(blocked=True)
-    total_users = len(users)
-
-    num = 0
-    for user in users:
-        try:
-            bot.send_message(user.chat_id, msg)
-            num += 1
-        except Exception as e:
-            logger.error(f"mass_mailing: Failed to send message to {user.chat_id}: {e}")
-
-    final_text = f"Рассылка закончена\nКоличество обработанных пользователей:\n{total_users} из {total_users}\nУспешно отправлено: {num}\nОшибок отправки: {total_users - num}"
-    return final_text
\ No newline at end of file
+    elif not isinstance(users, QuerySet):
+        users = TelegramUser.objects.filter(pk__in=[user.pk for user in users])
+
+    campaign = deliver_campaign(create_campaign(admin, text, users))
+    return campaign_summary(campaign)
\ No newline at end of file
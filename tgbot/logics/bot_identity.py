@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from typing import Iterable, Optional
+
+import telebot
+from django.core.cache import cache
+
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+class BotIdentity:
+    """Результат get_me() для токена: бот или ошибка запроса"""
+
+    def __init__(
+        self,
+        username: str = "",
+        first_name: str = "",
+        bot_id: Optional[int] = None,
+        error: str = "",
+        expires_at: Optional[float] = None,
+    ):
+        self.username = username
+        self.first_name = first_name
+        self.bot_id = bot_id
+        self.error = error
+        if expires_at is None:
+            ttl = Constants.BOT_IDENTITY_ERROR_TTL if error else Constants.BOT_IDENTITY_TTL
+            # время по часам системы: запись читают другие процессы
+            expires_at = time.time() + ttl
+        self.expires_at = expires_at
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= time.time()
+
+
+# токены, для которых get_me уже выполняется в фоне этим процессом
+_pending_lock = threading.Lock()
+_pending: set[str] = set()
+
+
+def _cache_key(token: str) -> str:
+    # сам токен в ключ (и имя файла кэша) не попадает
+    return f"bot_identity:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def refresh_identity(token: str) -> BotIdentity:
+    """
+    Запрашивает get_me() у Telegram и кладёт результат в общий кэш Django:
+    его видят и процесс бота, и все воркеры админки
+    """
+    try:
+        user = telebot.TeleBot(token).get_me()
+        identity = BotIdentity(username=user.username or "", first_name=user.first_name, bot_id=user.id)
+    except Exception as e:
+        logger.warning(f"refresh_identity: get_me для бота {token.split(':')[0]} не выполнен: {e}")
+        identity = BotIdentity(error=str(e))
+    cache.set(_cache_key(token), vars(identity), Constants.BOT_IDENTITY_KEEP)
+    return identity
+
+
+def _refresh_worker(tokens: list[str]):
+    for token in tokens:
+        try:
+            refresh_identity(token)
+        finally:
+            with _pending_lock:
+                _pending.discard(token)
+
+
+def refresh_in_background(tokens: Iterable[str]) -> None:
+    """Обновляет кэш для tokens в фоновом потоке; уже обновляемые токены пропускаются"""
+    with _pending_lock:
+        tokens = [token for token in dict.fromkeys(tokens) if token and token not in _pending]
+        _pending.update(tokens)
+    if tokens:
+        threading.Thread(target=_refresh_worker, args=(tokens,), name="bot-identity", daemon=True).start()
+
+
+def cached_identity(token: str) -> Optional[BotIdentity]:
+    """
+    Данные бота из кэша без обращения к Telegram. Отсутствующая или устаревшая
+    запись обновляется в фоне; пока её нет, возвращается None, а устаревшая
+    отдаётся как есть до окончания обновления.
+    """
+    data = cache.get(_cache_key(token))
+    identity = BotIdentity(**data) if data else None
+    if identity is None or identity.expired:
+        refresh_in_background([token])
+    return identity
+
+
+def forget_identity(token: str) -> None:
+    cache.delete(_cache_key(token))
+
+
+def warm_up_identities() -> None:
+    """
+    Заполняет кэш для всех токенов из базы (при запуске бота). Кэш общий,
+    поэтому админка в другом процессе сразу показывает ссылки на ботов.
+    """
+    from tgbot.models import TelegramBotToken
+
+    refresh_in_background(TelegramBotToken.objects.values_list("token", flat=True))
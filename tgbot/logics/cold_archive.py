@@ -0,0 +1,187 @@
+import fcntl
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from tgbot.models import ArchivedTask, Configuration, SentMessage, Task, TelegramUser
+from tgbot.logics.constants import Constants
+from tgbot.logics.random_numbers import random_number_list
+from tgbot.logics.retention import expired_closed_tasks
+from tgbot.logics.stats import rollups_paused
+
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+def _archive_dir() -> Path:
+    return Path(settings.TASK_ARCHIVE_DIR)
+
+
+def _partition(task: Task) -> str:
+    """Файл архива по месяцу создания заявки: 2025-03.jsonl.gz"""
+    return f"{task.created_at:%Y-%m}.jsonl.gz"
+
+
+def _user_data(user: Optional[TelegramUser]) -> Optional[dict]:
+    if user is None:
+        return None
+    return {
+        "chat_id": user.chat_id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "username": user.username,
+    }
+
+
+def _task_record(task: Task) -> dict:
+    """Заявка с откликами, файлами и тэгами в виде одной записи архива"""
+    return {
+        "id": task.id,
+        "number": random_number_list.get(task.id),
+        "title": task.title,
+        "description": task.description,
+        "stage": task.stage,
+        "creator": _user_data(task.creator),
+        "creator_message_id_to_reply": task.creator_message_id_to_reply,
+        "created_at": task.created_at,
+        "closed_at": task.closed_at,
+        "tags": [tag.name for tag in task.tags.all()],
+        "responses": [
+            {
+                "id": response.id,
+                "master": _user_data(response.telegram_user),
+                "payment_type": response.payment_type.name if response.payment_type else None,
+                "created_at": response.created_at,
+            }
+            for response in task.responses.all()
+        ],
+        "files": [
+            {
+                "id": file.id,
+                "file_id": file.file_id,
+                "file_type": file.file_type,
+                "source_message_id": file.source_message_id,
+                "created_at": file.created_at,
+            }
+            for file in task.files.all()
+        ],
+    }
+
+
+def _append_member(path: Path, records: Iterable[dict]) -> int:
+    """
+    Дописывает записи в конец файла отдельным gzip-блоком (файл остаётся
+    корректным gzip) и сбрасывает его на диск.
+    Возвращает смещение начала блока.
+    """
+    payload = "".join(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n" for record in records)
+    with open(path, "ab") as f:
+        # два архиватора не должны перемешать блоки в одном файле
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            offset = f.seek(0, io.SEEK_END)
+            with gzip.GzipFile(fileobj=f, mode="wb") as member:
+                member.write(payload.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return offset
+
+
+def archive_tasks_chunk(tasks: list[Task]) -> int:
+    """
+    Записывает заявки в файлы архива и только после этого удаляет их из базы
+    вместе с откликами и файлами. Сообщения в Telegram не трогаются:
+    записи о них удаляются до удаления заявок.
+    """
+    by_partition = {}
+    for task in tasks:
+        by_partition.setdefault(_partition(task), []).append(task)
+
+    _archive_dir().mkdir(parents=True, exist_ok=True)
+    index = []
+    for partition, partition_tasks in by_partition.items():
+        offset = _append_member(_archive_dir() / partition, (_task_record(task) for task in partition_tasks))
+        for task in partition_tasks:
+            index.append(ArchivedTask(
+                task_id=task.id,
+                number=random_number_list.get(task.id),
+                title=task.title,
+                creator_chat_id=task.creator.chat_id if task.creator_id else None,
+                responses_count=len(task.responses.all()),
+                created_at=task.created_at,
+                closed_at=task.closed_at,
+                partition=partition,
+                offset=offset,
+            ))
+
+    ids = [task.id for task in tasks]
+    # заявки уходят из базы, но не из статистики
+    with transaction.atomic(), rollups_paused():
+        # заявка могла попасть в архив при прерванном запуске — индекс указывает на последнюю копию
+        ArchivedTask.objects.filter(task_id__in=ids).delete()
+        ArchivedTask.objects.bulk_create(index)
+        SentMessage.objects.filter(task_id__in=ids).delete()
+        Task.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_old_tasks(days: Optional[int] = None, chunk_size: int = Constants.COLD_ARCHIVE_CHUNK_SIZE) -> int:
+    """
+    Переносит закрытые и архивные заявки старше days дней (по умолчанию —
+    Configuration.cold_archive_days) в файлы архива порциями по chunk_size.
+    Возвращает число перенесённых заявок.
+    """
+    days = Configuration.get_solo().cold_archive_days if days is None else days
+    if not days:
+        logger.info("archive_old_tasks: срок не задан, перенос в файловый архив выключен")
+        return 0
+
+    queryset = (
+        expired_closed_tasks(days, stages=(Task.Stage.CLOSED, Task.Stage.ARCHIVED))
+        .select_related("creator")
+        .prefetch_related("tags", "files", "responses__telegram_user", "responses__payment_type")
+        .order_by("id")
+    )
+    total = 0
+    while True:
+        tasks = list(queryset[:chunk_size])
+        if not tasks:
+            break
+        total += archive_tasks_chunk(tasks)
+
+    if total:
+        logger.info(f"archive_old_tasks: в файловый архив перенесено {total} заявок старше {days} дней")
+    return total
+
+
+def load_archived_task(entry: ArchivedTask) -> Optional[dict]:
+    """Читает запись заявки из файла архива, начиная с её gzip-блока"""
+    path = _archive_dir() / entry.partition
+    try:
+        with open(path, "rb") as f:
+            f.seek(entry.offset)
+            with gzip.GzipFile(fileobj=f, mode="rb") as member:
+                for line in member:
+                    record = json.loads(line)
+                    if record["id"] == entry.task_id:
+                        return record
+    except (OSError, ValueError) as e:
+        logger.error(f"load_archived_task: не удалось прочитать заявку {entry.task_id} из {path}: {e}")
+        return None
+    logger.error(f"load_archived_task: заявка {entry.task_id} не найдена в {path}")
+    return None
@@ -21,6 +21,8 @@ def init_bot_commands(bot):
         types.BotCommand(Commands.GENERAL_CHAT,  CommandsNames.GENERAL_CHAT),
         types.BotCommand(Commands.ADMIN, CommandsNames.ADMIN),
         types.BotCommand(Commands.TODAY, CommandsNames.TODAY),
+        types.BotCommand(Commands.TAGS, CommandsNames.TAGS),
+        types.BotCommand(Commands.DIGEST, CommandsNames.DIGEST),
     ]
 
     bot.set_my_commands(commands)
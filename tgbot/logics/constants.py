@@ -8,6 +8,7 @@ class CallbackData:
     TASK_CLOSE = "task_close"
     TASK_CANCEL = "task_cancel"
     TASK_REPEAT = "task_repeat"
+    TASK_EXPAND = "task_expand"
 
     RESPONSE_CANCEL = "response_cancel"
     RESPONSE_ID = "response_id"
@@ -21,11 +22,16 @@ class Commands:
     GENERAL_CHAT = "chat"
     ADMIN = "admin"
     TODAY = "today"
+    TAGS = "tags"
+    DIGEST = "digest"
 
 class ButtonNames:
     CLOSE = "Закрыть"
     CANCEL = "Отменить"
     REPEAT = "Повторить"
+    PUBLISH = "Опубликовать"
+    SELECTED_TAG = "✅ {name}"
+    DIGEST_TASK = "№{random_task_number}"
 
 class Urls:
     RULES = "https://telegra.ph/pravila-03-15-224"
@@ -37,6 +43,94 @@ class Constants:
     USER_MENTION_PROBLEM = "USER_MENTION_PROBLEM"
     RANDOM_LIST_SEED = 2649037
     NUMBER_LENGTH = 4
+    SEEN_UPDATES_LIMIT = 1000
+    CONFIG_WATCH_INTERVAL = 5
+
+    OUTBOX_BATCH_SIZE = 20
+    OUTBOX_MAX_ATTEMPTS = 3
+    # пауза перед повтором неудавшейся операции: удваивается с каждой попыткой
+    # до OUTBOX_RETRY_MAX_DELAY; ответ 429 задаёт паузу сам (retry_after), секунд
+    OUTBOX_RETRY_DELAY = 5
+    OUTBOX_RETRY_MAX_DELAY = 5 * 60
+    OUTBOX_STALE_SECONDS = 30
+    OUTBOX_POLL_INTERVAL = 5
+    OUTBOX_COMPACT_INTERVAL = 600
+    OUTBOX_RETENTION_HOURS = 1
+
+    # как часто планировщик обслуживания проверяет сроки задач, секунд
+    SCHEDULER_POLL_INTERVAL = 5
+
+    TAG_RECIPIENTS_TTL = 60
+
+    DIGEST_FLUSH_LIMIT = 1000
+    DIGEST_MAX_TASKS = 10
+    DIGEST_PREVIEW_LENGTH = 60
+    DIGEST_BUTTONS_IN_ROW = 3
+
+    INLINE_PAGE_SIZE = 20
+    INLINE_CACHE_TTL = 15
+    INLINE_CACHE_SIZE = 256
+    INLINE_CACHE_TIME = 10
+    INLINE_DESCRIPTION_LENGTH = 100
+
+    MENTION_STATE_TTL = 24 * 60 * 60
+    MENTION_STATE_REFRESH = 60 * 60
+
+    TASK_MEDIA_CACHE_SIZE = 128
+
+    DB_ANALYSIS_LIMIT = 1000
+    DB_VACUUM_PAGES = 1000
+    DB_VACUUM_PAUSE = 0.2
+
+    RETENTION_CHUNK_SIZE = 500
+    RETENTION_PAUSE = 0.1
+    COLD_ARCHIVE_CHUNK_SIZE = 100
+
+    STATS_RECONCILE_DAYS = 2
+    STATS_RECONCILE_INTERVAL = 60 * 60
+
+    # Начиная с какого числа строк (по статистике ANALYZE) список в админке
+    # показывает оценку вместо точного COUNT(*)
+    ADMIN_ESTIMATED_COUNT_THRESHOLD = 10_000
+
+    # Строк за один запрос при выгрузке в CSV/JSONL
+    EXPORT_CHUNK_SIZE = 2000
+
+    # Фоновые задачи админки
+    JOB_WORKERS = 2
+    JOB_POLL_INTERVAL = 2
+    # задача без обновления дольше этого считается брошенной воркером;
+    # работающий воркер отмечает задачу каждые JOB_HEARTBEAT_INTERVAL секунд
+    JOB_STALE_SECONDS = 10 * 60
+    JOB_HEARTBEAT_INTERVAL = 60
+    # сколько последних ошибок хранится в задаче
+    JOB_MAX_ERRORS = 100
+    # как часто страница прогресса обновляется, секунд
+    JOB_PROGRESS_REFRESH = 2
+
+    # Рассылки: получателей за один запрос и общий предел скорости всех рассылок,
+    # сообщений в секунду — ниже предела очереди бота, чтобы оставалось место
+    # для ответов пользователям
+    MAILING_CHUNK_SIZE = 200
+    MAILING_RATE = 10
+
+    # Обновление профилей пользователей из Telegram: профиль, обновлённый
+    # за последние сутки, повторно не запрашивается; get_chat выполняется
+    # в нескольких потоках не чаще PROFILE_REFRESH_RATE запросов в секунду
+    PROFILE_REFRESH_TTL = 24 * 60 * 60
+    PROFILE_REFRESH_WORKERS = 4
+    PROFILE_REFRESH_RATE = 20
+    PROFILE_REFRESH_CHUNK = 200
+    # час (местное время), начиная с которого ставится ночное обновление
+    PROFILE_REFRESH_HOUR = 3
+    # как часто планировщик проверяет, пора ли ставить ночное обновление, секунд
+    PROFILE_REFRESH_CHECK_INTERVAL = 10 * 60
+
+    # Кэш get_me для токенов ботов: сколько секунд ответ и ошибка запроса считаются
+    # свежими и сколько устаревший ответ ещё показывается, пока обновляется в фоне
+    BOT_IDENTITY_TTL = 6 * 60 * 60
+    BOT_IDENTITY_ERROR_TTL = 60
+    BOT_IDENTITY_KEEP = 7 * 24 * 60 * 60
 
 class Messages:
     WELCOME_MESSAGE = f"Для добавления напишите [Администратору]({Urls.SUPPORT})\nПосле добавления введите /start"
@@ -54,6 +148,24 @@ class Messages:
     TASK_CLOSED_TASK_TEXT = "*Заявка закрыта*\n\n{task_text}"
     TASK_REPEATED = "Заявка выложена повторно."
     TASK_REPEATED_TASK_TEXT = "*Заявка выложена повторно*:\n{task_text}"
+    TASK_CHOOSE_TAGS_TASK_TEXT = "{task_text}\n*Выберите тэги заявки и нажмите «Опубликовать».* Без тэгов заявка уйдёт всем мастерам."
+    TASK_PUBLISHED = "Заявка опубликована."
+    TASK_ALREADY_PUBLISHED = "Заявка уже опубликована."
+    TAG_ADDED = "Тэг добавлен"
+    TAG_REMOVED = "Тэг убран"
+    MASTER_TAGS = "Выберите тэги, по которым хотите получать заявки.\nЕсли ничего не выбрано, приходят все заявки."
+    NO_TAGS = "Тэги пока не настроены, вам приходят все заявки."
+    TAG_SUBSCRIBED = "Вы подписаны на тэг"
+    TAG_UNSUBSCRIBED = "Вы отписаны от тэга"
+    DIGEST_HEADER = "Новые заявки ({count}):"
+    DIGEST_LINE = "№{random_task_number}: {preview}"
+    DIGEST_FOOTER = "Нажмите на номер, чтобы открыть заявку."
+    DIGEST_MODE_ON = "Режим сводки включён: новые заявки будут приходить одним сообщением."
+    DIGEST_MODE_OFF = "Режим сводки выключен: каждая заявка будет приходить отдельным сообщением."
+    TASK_EXPANDED = "Заявка отправлена"
+    TASK_ALREADY_SENT = "Заявка уже есть в чате"
+    TASK_NOT_AVAILABLE = "Заявка уже закрыта или отменена"
+    INLINE_TASK_TITLE = "Заявка №{random_task_number}"
     RESPONSE_SENT = "Ваш отклик отправлен"
     RESPONSE_SENT_TASK_TEXT = "*Ваш отклик отправлен*\n\n{task_text}"
     RESPONSE_CANCELED = "Ваш отклик удалён."
@@ -70,6 +182,7 @@ class Messages:
     USER_MENTION_PROBLEM = """⚠️ Не удалось создать упоминание c вашим именем.
 Пожалуйста, включите пересылку сообщений от бота:
 Настройки → Конфиденциальность → Пересылка сообщений"""
+    USER_MENTION_PROBLEM_SHORT = "Не удалось упомянуть вас по имени."
     USER_BLOCKED = "❌ Вы заблокированы и не можете пользоваться ботом."
     GROUP_BLOCKED = "❌ Эта группа заблокирована и вы не можете пользоваться в ней этим ботом."
 
@@ -86,10 +199,14 @@ class Messages:
     PAYMENT_NOT_FOUND_ERROR = "Ошибка: выбранный тип оплаты не найден."
     MISSING_RESPONSE_ID_ERROR = "Ошибка: отсутствует response_id."
     RESPONSE_NOT_FOUND_ERROR = "Ошибка: отклик не найден."
+    MISSING_TAG_ID_ERROR = "Ошибка: отсутствует tag_id."
+    TAG_NOT_FOUND_ERROR = "Ошибка: тэг не найден."
 
 class CommandsNames:
     START = "Старт бота и проверка доступа к публикации заданий"
     RULES = "Правила использования"
     GENERAL_CHAT = "Общий чат"
     ADMIN = "Контакт администратора"
-    TODAY = "Заявки за день"
\ No newline at end of file
+    TODAY = "Заявки за день"
+    TAGS = "Тэги заявок"
+    DIGEST = "Заявки сводкой"
\ No newline at end of file
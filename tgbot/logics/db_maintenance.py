@@ -0,0 +1,207 @@
+import time
+from typing import Optional
+
+from django.db import connection
+
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+# PRAGMA auto_vacuum: 0 — NONE, 1 — FULL, 2 — INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _pragma(name: str, argument=None):
+    """Выполняет PRAGMA и возвращает все строки результата"""
+    sql = f"PRAGMA {name}" if argument is None else f"PRAGMA {name}({argument})"
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+def _pragma_value(name: str):
+    return _pragma(name)[0][0]
+
+
+def analyze(analysis_limit: int = Constants.DB_ANALYSIS_LIMIT) -> float:
+    """
+    Обновляет статистику планировщика (sqlite_stat1).
+    analysis_limit ограничивает число просматриваемых строк индекса,
+    чтобы ANALYZE большой таблицы не держал блокировку на запись долго.
+    Возвращает длительность в секундах.
+    """
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA analysis_limit={int(analysis_limit)}")
+        cursor.execute("ANALYZE")
+    elapsed = time.perf_counter() - started
+    logger.info(f"analyze: статистика обновлена за {elapsed:.2f} с (analysis_limit={analysis_limit})")
+    return elapsed
+
+
+def incremental_vacuum(
+    pages_per_step: int = Constants.DB_VACUUM_PAGES,
+    pause: float = Constants.DB_VACUUM_PAUSE,
+) -> Optional[int]:
+    """
+    Возвращает свободные страницы файлу порциями по pages_per_step страниц:
+    каждая порция — отдельная короткая транзакция, между ними пауза,
+    чтобы бот успевал писать.
+    Возвращает число освобождённых страниц или None, если auto_vacuum
+    не INCREMENTAL (его включает enable_incremental_vacuum).
+    """
+    if _pragma_value("auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+        logger.warning("incremental_vacuum: auto_vacuum не INCREMENTAL, пропускаем")
+        return None
+
+    freed = 0
+    while True:
+        before = _pragma_value("freelist_count")
+        if not before:
+            break
+        # модуль sqlite3 делает у PRAGMA без столбцов результата один шаг,
+        # а incremental_vacuum освобождает по странице за шаг — executescript
+        # выполняет оператор до конца
+        connection.ensure_connection()
+        connection.connection.executescript(f"PRAGMA incremental_vacuum({int(pages_per_step)});")
+        after = _pragma_value("freelist_count")
+        if after >= before:
+            break
+        freed += before - after
+        if after:
+            time.sleep(pause)
+
+    logger.info(f"incremental_vacuum: освобождено {freed} страниц")
+    return freed
+
+
+def enable_incremental_vacuum() -> None:
+    """
+    Переводит существующий файл в режим auto_vacuum=INCREMENTAL.
+    Требует полного VACUUM: файл переписывается целиком под эксклюзивной
+    блокировкой, поэтому запускать при остановленном боте.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+    logger.info("enable_incremental_vacuum: auto_vacuum=INCREMENTAL, выполнен VACUUM")
+
+
+def check_integrity(full: bool = False) -> list[str]:
+    """
+    quick_check (по умолчанию) или полный integrity_check.
+    Возвращает список найденных проблем, пустой — если файл в порядке.
+    """
+    rows = _pragma("integrity_check" if full else "quick_check")
+    problems = [row[0] for row in rows if row[0] != "ok"]
+    if problems:
+        logger.error(f"check_integrity: найдено проблем: {len(problems)}: {problems[:10]}")
+    else:
+        logger.info(f"check_integrity: {'integrity_check' if full else 'quick_check'} — ok")
+    return problems
+
+
+def wal_checkpoint(mode: str = "PASSIVE") -> tuple[int, int, int]:
+    """
+    Переносит WAL в основной файл.
+    PASSIVE не ждёт читателей и писателей; TRUNCATE ждёт их (в пределах
+    busy_timeout) и обнуляет файл -wal.
+    Возвращает (busy, страниц в WAL, перенесено страниц).
+    """
+    busy, log_pages, checkpointed = _pragma("wal_checkpoint", mode)[0]
+    logger.info(f"wal_checkpoint({mode}): busy={busy}, в WAL {log_pages}, перенесено {checkpointed}")
+    return busy, log_pages, checkpointed
+
+
+def database_summary() -> dict:
+    """Размер файла, страницы и режимы журнала/очистки"""
+    page_size = _pragma_value("page_size")
+    page_count = _pragma_value("page_count")
+    freelist_count = _pragma_value("freelist_count")
+    return {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+        "size": page_size * page_count,
+        "free": page_size * freelist_count,
+        "journal_mode": _pragma_value("journal_mode"),
+        "auto_vacuum": _pragma_value("auto_vacuum"),
+    }
+
+
+def _object_sizes() -> Optional[dict]:
+    """Байты по таблицам и индексам из dbstat или None, если SQLite собран без него"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+            return dict(cursor.fetchall())
+    except Exception as e:
+        logger.info(f"_object_sizes: dbstat недоступен ({e}), размеры объектов не считаются")
+        return None
+
+
+def table_row_estimate(table: str) -> Optional[int]:
+    """
+    Оценка числа строк таблицы из sqlite_stat1 (её заполняет ANALYZE) без
+    просмотра таблицы. None — статистики по таблице нет.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            rows = cursor.fetchall()
+    except Exception:
+        # sqlite_stat1 появляется после первого ANALYZE
+        return None
+    # первое число stat — строк в таблице или индексе; частичные индексы меньше таблицы
+    estimates = [int(stat.split()[0]) for stat, in rows if stat and stat.split()[0].isdigit()]
+    return max(estimates) if estimates else None
+
+
+def table_report() -> list[dict]:
+    """
+    Таблицы с числом строк, размером и их индексы с размером.
+    Размеры — из виртуальной таблицы dbstat; если её нет, size равен None.
+    """
+    sizes = _object_sizes()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, tbl_name, type FROM sqlite_master "
+            "WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%' ORDER BY tbl_name, type DESC, name"
+        )
+        objects = cursor.fetchall()
+
+    tables = {}
+    for name, table_name, object_type in objects:
+        if object_type == "table":
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM "{name}"')
+                rows = cursor.fetchone()[0]
+            tables[name] = {
+                "name": name,
+                "rows": rows,
+                "size": sizes.get(name) if sizes is not None else None,
+                "indexes": [],
+            }
+        elif table_name in tables:
+            tables[table_name]["indexes"].append({
+                "name": name,
+                "size": sizes.get(name) if sizes is not None else None,
+            })
+
+    # автоиндексы (UNIQUE, PRIMARY KEY) не видны по имени выше, но есть в dbstat
+    if sizes is not None:
+        for name, size in sizes.items():
+            if name.startswith("sqlite_autoindex_"):
+                table_name = name[len("sqlite_autoindex_"):].rsplit("_", 1)[0]
+                if table_name in tables:
+                    tables[table_name]["indexes"].append({"name": name, "size": size})
+
+    return sorted(tables.values(), key=lambda table: (table["size"] or 0, table["rows"]), reverse=True)
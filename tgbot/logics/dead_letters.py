@@ -0,0 +1,135 @@
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from tgbot.models import DeadLetter, OutboxMessage, Task, TelegramUser
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+def record_dead_letter(
+    operation: str,
+    error: Exception,
+    telegram_user: Optional[TelegramUser] = None,
+    task: Optional[Task] = None,
+    chat_id: Optional[int] = None,
+    message_id: Optional[int] = None,
+    payload: Optional[dict] = None,
+    attempts: int = 1,
+) -> Optional[DeadLetter]:
+    """
+    Сохраняет неудавшуюся операцию вместе с параметрами и классом ошибки.
+    Повторная ошибка той же операции (ещё не отправленной повторно)
+    не создаёт новую запись, а увеличивает счётчик попыток.
+    Никогда не выбрасывает исключений — ошибка записи только логируется.
+    """
+    if chat_id is None and telegram_user is not None:
+        chat_id = telegram_user.chat_id
+    payload = payload or {}
+
+    try:
+        existing = DeadLetter.objects.filter(
+            operation=operation,
+            chat_id=chat_id,
+            task=task,
+            message_id=message_id,
+            replayed_at__isnull=True,
+        )
+        if operation == OutboxMessage.Operation.SEND_TEXT:
+            existing = existing.filter(payload=payload)
+
+        updated = existing.update(
+            attempts=F("attempts") + 1,
+            error_class=type(error).__name__,
+            error_message=str(error),
+            payload=payload,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            return existing.first()
+
+        return DeadLetter.objects.create(
+            operation=operation,
+            task=task,
+            telegram_user=telegram_user,
+            chat_id=chat_id,
+            message_id=message_id,
+            payload=payload,
+            error_class=type(error).__name__,
+            error_message=str(error),
+            attempts=attempts,
+        )
+    except Exception as e:
+        logger.error(f"record_dead_letter: не удалось сохранить операцию {operation} для {chat_id}: {e}")
+        return None
+
+
+def _to_outbox(letter: DeadLetter) -> Optional[OutboxMessage]:
+    """Превращает запись в операцию очереди или возвращает None, если повторять нечего"""
+    if letter.operation in (
+        OutboxMessage.Operation.SEND_TASK,
+        OutboxMessage.Operation.EDIT_TASK,
+        OutboxMessage.Operation.DIGEST_TASK,
+    ):
+        if letter.task_id is None or letter.telegram_user_id is None:
+            return None
+        return OutboxMessage(
+            operation=letter.operation,
+            task_id=letter.task_id,
+            telegram_user_id=letter.telegram_user_id,
+            payload=letter.payload,
+        )
+    if letter.operation == OutboxMessage.Operation.DELETE_MESSAGE:
+        if letter.chat_id is None or letter.message_id is None:
+            return None
+        return OutboxMessage(
+            operation=letter.operation,
+            chat_id=letter.chat_id,
+            message_id=letter.message_id,
+        )
+    if letter.operation == OutboxMessage.Operation.SEND_TEXT:
+        if letter.chat_id is None or not letter.payload.get("text"):
+            return None
+        return OutboxMessage(
+            operation=letter.operation,
+            telegram_user_id=letter.telegram_user_id,
+            chat_id=letter.chat_id,
+            payload=letter.payload,
+        )
+    return None
+
+
+def replay_dead_letters(queryset: QuerySet) -> tuple[list[int], int]:
+    """
+    Ставит неотправленные операции обратно в очередь исходящих операций,
+    которая выполняет их с общим ограничением скорости бота.
+    Возвращает (id созданных операций очереди, число пропущенных записей).
+    """
+    outbox_rows = []
+    replayed_ids = []
+    skipped = 0
+
+    for letter in queryset.filter(replayed_at__isnull=True).iterator():
+        row = _to_outbox(letter)
+        if row is None:
+            skipped += 1
+            continue
+        outbox_rows.append(row)
+        replayed_ids.append(letter.id)
+
+    with transaction.atomic():
+        OutboxMessage.objects.bulk_create(outbox_rows, batch_size=500)
+        DeadLetter.objects.filter(id__in=replayed_ids).update(replayed_at=timezone.now())
+
+    logger.info(f"replay_dead_letters: в очередь поставлено {len(outbox_rows)}, пропущено {skipped}")
+    return [row.id for row in outbox_rows], skipped
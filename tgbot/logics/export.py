@@ -0,0 +1,191 @@
+import csv
+import datetime
+import json
+from typing import Callable, Iterable, Iterator
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from tgbot.models import Response, SentMessage, Task, TelegramUser
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+FORMATS = ("csv", "jsonl")
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+class Export:
+    """Столбцы выгрузки модели и связи, которые подгружаются вместе с порцией"""
+
+    def __init__(self, model, columns: Iterable[tuple[str, Callable]], select_related=(), prefetch_related=()):
+        self.model = model
+        self.columns = tuple(columns)
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+
+    @property
+    def header(self) -> list[str]:
+        return [name for name, _ in self.columns]
+
+    def row(self, obj) -> list:
+        return [_plain(getter(obj)) for _, getter in self.columns]
+
+
+def _plain(value):
+    """Значение для CSV/JSON: даты — ISO 8601 в местном часовом поясе"""
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _user_columns(prefix: str, attribute: str) -> list[tuple[str, Callable]]:
+    def get(obj):
+        return getattr(obj, attribute)
+    return [
+        (f"{prefix}_chat_id", lambda obj: get(obj).chat_id if get(obj) else None),
+        (f"{prefix}_username", lambda obj: get(obj).username if get(obj) else None),
+    ]
+
+
+EXPORTS = {
+    "task": Export(
+        Task,
+        [
+            ("id", lambda task: task.id),
+            ("number", lambda task: task.random_task_number),
+            ("title", lambda task: task.title),
+            ("description", lambda task: task.description),
+            ("stage", lambda task: task.stage),
+            *_user_columns("creator", "creator"),
+            ("tags", lambda task: ", ".join(tag.name for tag in task.tags.all())),
+            ("created_at", lambda task: task.created_at),
+            ("closed_at", lambda task: task.closed_at),
+        ],
+        select_related=("creator",),
+        prefetch_related=("tags",),
+    ),
+    "response": Export(
+        Response,
+        [
+            ("id", lambda response: response.id),
+            ("task_id", lambda response: response.task_id),
+            ("task_number", lambda response: response.task.random_task_number),
+            *_user_columns("master", "telegram_user"),
+            ("payment_type", lambda response: response.payment_type.name if response.payment_type else None),
+            ("created_at", lambda response: response.created_at),
+        ],
+        select_related=("task", "telegram_user", "payment_type"),
+    ),
+    "telegramuser": Export(
+        TelegramUser,
+        [
+            ("id", lambda user: user.id),
+            ("chat_id", lambda user: user.chat_id),
+            ("first_name", lambda user: user.first_name),
+            ("last_name", lambda user: user.last_name),
+            ("username", lambda user: user.username),
+            ("is_group", lambda user: user.is_group),
+            ("can_publish_tasks", lambda user: user.can_publish_tasks),
+            ("blocked", lambda user: user.blocked),
+            ("bot_was_blocked", lambda user: user.bot_was_blocked),
+            ("is_admin", lambda user: user.is_admin),
+            ("digest_mode", lambda user: user.digest_mode),
+            ("mention_state", lambda user: user.mention_state),
+            ("tags", lambda user: ", ".join(tag.name for tag in user.tags.all())),
+            ("created_at", lambda user: user.created_at),
+        ],
+        prefetch_related=("tags",),
+    ),
+    "sentmessage": Export(
+        SentMessage,
+        [
+            ("id", lambda message: message.id),
+            ("message_id", lambda message: message.message_id),
+            ("kind", lambda message: message.kind),
+            *_user_columns("recipient", "telegram_user"),
+            ("task_id", lambda message: message.task_id),
+            ("file_id", lambda message: message.file_id),
+            ("response_id", lambda message: message.response_id),
+            ("created_at", lambda message: message.created_at),
+        ],
+        select_related=("telegram_user",),
+    ),
+}
+
+
+def export_for_model(model) -> Export:
+    for export in EXPORTS.values():
+        if export.model is model:
+            return export
+    raise KeyError(f"Нет выгрузки для {model.__name__}")
+
+
+def iter_objects(queryset: QuerySet, export: Export, chunk_size: int = Constants.EXPORT_CHUNK_SIZE) -> Iterator:
+    """
+    Объекты queryset порциями по chunk_size в порядке id.
+    Каждая порция — отдельный короткий запрос по id > последнего выгруженного:
+    ни вся выборка, ни открытое на всё время выгрузки чтение не держатся,
+    поэтому WAL успевает переноситься в файл, а память не растёт.
+    """
+    queryset = queryset.order_by("pk").select_related(*export.select_related)
+    if export.prefetch_related:
+        queryset = queryset.prefetch_related(*export.prefetch_related)
+
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        objects = list(chunk[:chunk_size])
+        if not objects:
+            return
+        yield from objects
+        last_pk = objects[-1].pk
+
+
+class _Echo:
+    """Буфер для csv.writer, который просто возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(
+    queryset: QuerySet,
+    fmt: str = "csv",
+    chunk_size: int = Constants.EXPORT_CHUNK_SIZE,
+) -> Iterator[str]:
+    """Строки выгрузки queryset в формате csv (с заголовком) или jsonl"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    export = export_for_model(queryset.model)
+
+    rows = 0
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(export.header)
+        for obj in iter_objects(queryset, export, chunk_size):
+            yield writer.writerow(export.row(obj))
+            rows += 1
+    else:
+        for obj in iter_objects(queryset, export, chunk_size):
+            yield json.dumps(dict(zip(export.header, export.row(obj))), ensure_ascii=False) + "\n"
+            rows += 1
+    logger.info(f"export_lines: {queryset.model.__name__} выгружено строк: {rows} ({fmt})")
+
+
+def export_filename(model, fmt: str) -> str:
+    return f"{model._meta.model_name}-{timezone.localtime():%Y%m%d-%H%M%S}.{fmt}"
@@ -0,0 +1,254 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.utils import timezone
+
+from tgbot.models import BackgroundJob, TelegramUser
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+# Ключи payload, которые стираются, когда задача завершена
+SECRET_PAYLOAD_KEYS = ("password",)
+
+_handlers: dict[str, Callable] = {}
+
+
+def job_handler(kind: str):
+    """Регистрирует обработчик задач типа kind: handler(job, progress) -> текст результата"""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+class JobProgress:
+    """
+    Счётчики задачи. Сохраняются после каждого элемента: это и прогресс
+    для страницы админки, и место, с которого задача продолжится после перезапуска.
+    """
+
+    def __init__(self, job: BackgroundJob):
+        self.job = job
+
+    @property
+    def start(self) -> int:
+        """Сколько элементов обработано до этого запуска"""
+        return self.job.processed
+
+    def ok(self, count: int = 1) -> None:
+        self.job.done += count
+        self._save()
+
+    def error(self, message: str) -> None:
+        self.job.failed += 1
+        errors = (self.job.errors.splitlines() + [message])[-Constants.JOB_MAX_ERRORS:]
+        self.job.errors = "\n".join(errors)
+        self._save("errors")
+
+    def _save(self, *fields) -> None:
+        self.job.save(update_fields=["done", "failed", "updated_at", *fields])
+
+
+def enqueue(kind: str, payload: dict = None, total: int = 0, created_by: str = "") -> BackgroundJob:
+    job = BackgroundJob.objects.create(kind=kind, payload=payload or {}, total=total, created_by=created_by)
+    logger.info(f"enqueue: {job} поставлена в очередь ({total} элементов)")
+    return job
+
+
+def claim_job(worker: str) -> Optional[BackgroundJob]:
+    """Берёт самую старую задачу из очереди; два воркера одну задачу не получат"""
+    while True:
+        job = (
+            BackgroundJob.objects
+            .filter(status=BackgroundJob.Status.PENDING)
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = BackgroundJob.objects.filter(pk=job.pk, status=BackgroundJob.Status.PENDING).update(
+            status=BackgroundJob.Status.RUNNING,
+            worker=worker,
+            started_at=job.started_at or now,
+            updated_at=now,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def _heartbeat(job: BackgroundJob, stop: threading.Event):
+    """
+    Пока задача выполняется, обновляет её updated_at: долгий шаг без
+    прогресса (один большой элемент, SSH-команда) не выглядит брошенным
+    """
+    from django.db import connection
+
+    try:
+        while not stop.wait(Constants.JOB_HEARTBEAT_INTERVAL):
+            BackgroundJob.objects.filter(
+                pk=job.pk, status=BackgroundJob.Status.RUNNING, worker=job.worker
+            ).update(updated_at=timezone.now())
+    except Exception as e:
+        logger.exception(f"_heartbeat: {job}: {e}")
+    finally:
+        connection.close()
+
+
+def run_job(job: BackgroundJob) -> BackgroundJob:
+    """Выполняет задачу обработчиком её типа и сохраняет итог"""
+    progress = JobProgress(job)
+    logger.info(f"run_job: {job} начата с элемента {progress.start} из {job.total}")
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(job, stop_heartbeat), name=f"job-{job.pk}-heartbeat", daemon=True
+    )
+    heartbeat.start()
+    try:
+        handler = _handlers.get(job.kind)
+        if handler is None:
+            raise ValueError(f"Неизвестный тип задачи: {job.kind}")
+        result = handler(job, progress)
+        job.status = BackgroundJob.Status.DONE
+        job.result = result or f"Выполнено: {job.done}, ошибок: {job.failed}"
+    except Exception as e:
+        logger.exception(f"run_job: {job} завершилась ошибкой: {e}")
+        job.status = BackgroundJob.Status.FAILED
+        job.result = f"{e.__class__.__name__}: {e}"
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+    for key in SECRET_PAYLOAD_KEYS:
+        job.payload.pop(key, None)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "payload", "finished_at", "updated_at"])
+    logger.info(f"run_job: {job}: {job.result}")
+    return job
+
+
+def recover_jobs() -> int:
+    """
+    Возвращает в очередь задачи, воркер которых перестал отмечаться:
+    пока процесс воркера жив, _heartbeat обновляет задачу даже на долгом шаге
+    """
+    stale = timezone.now() - timedelta(seconds=Constants.JOB_STALE_SECONDS)
+    count = BackgroundJob.objects.filter(status=BackgroundJob.Status.RUNNING, updated_at__lt=stale).update(
+        status=BackgroundJob.Status.PENDING, worker=""
+    )
+    if count:
+        logger.warning(f"recover_jobs: возвращено в очередь брошенных задач: {count}")
+    return count
+
+
+def release_jobs(worker_prefix: str) -> int:
+    """Возвращает в очередь задачи воркеров процесса, который останавливается"""
+    return BackgroundJob.objects.filter(
+        status=BackgroundJob.Status.RUNNING, worker__startswith=worker_prefix
+    ).update(status=BackgroundJob.Status.PENDING, worker="")
+
+
+def worker_prefix() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:"
+
+
+def run_job_worker(stop: threading.Event = None):
+    """Цикл воркера: берёт задачи из очереди по одной, пока не установлен stop"""
+    worker = f"{worker_prefix()}{threading.current_thread().name}"
+    while stop is None or not stop.is_set():
+        try:
+            recover_jobs()
+            job = claim_job(worker)
+            if job is not None:
+                run_job(job)
+                continue
+        except Exception as e:
+            logger.exception(f"run_job_worker: ошибка воркера {worker}: {e}")
+        time.sleep(Constants.JOB_POLL_INTERVAL)
+
+
+@job_handler(BackgroundJob.Kind.REFRESH_USERS)
+def refresh_users(job: BackgroundJob, progress: JobProgress) -> str:
+    """
+    Обновляет профили выбранных в админке пользователей (payload user_ids)
+    или всех устаревших (payload stale — ночное обновление).
+    """
+    from tgbot.logics.profile_refresh import refresh_profiles, stale_users
+
+    if job.payload.get("stale"):
+        # обновлённые профили перестают быть устаревшими, поэтому
+        # после перезапуска задача сама продолжается с оставшихся
+        refresh_profiles(stale_users(TelegramUser.objects.all()), force=True, progress=progress)
+        return f"Обновлено профилей: {job.done} из {job.total}, ошибок: {job.failed}."
+
+    user_ids = job.payload.get("user_ids", [])
+    for position in range(progress.start, len(user_ids), Constants.PROFILE_REFRESH_CHUNK):
+        chunk = user_ids[position:position + Constants.PROFILE_REFRESH_CHUNK]
+        queryset = TelegramUser.objects.filter(pk__in=chunk)
+        existing = set(queryset.values_list("pk", flat=True))
+        for user_id in chunk:
+            if user_id not in existing:
+                progress.error(f"{user_id}: пользователь удалён")
+        refresh_profiles(queryset, progress=progress)
+    return f"Успешно обновлено данных для {job.done} из {job.total} пользователя(ей)."
+
+
+@job_handler(BackgroundJob.Kind.MASS_MAILING)
+def mass_mailing_job(job: BackgroundJob, progress: JobProgress) -> str:
+    from tgbot.logics.mailing import campaign_summary, deliver_campaign, reclaim_campaign
+    from tgbot.models import MailingCampaign
+
+    # после перезапуска рассылка сама продолжается с неотправленных получателей
+    campaign = MailingCampaign.objects.select_related("sender").get(pk=job.payload["campaign_id"])
+    other_jobs = BackgroundJob.objects.filter(
+        kind=BackgroundJob.Kind.MASS_MAILING,
+        status=BackgroundJob.Status.RUNNING,
+        payload__campaign_id=campaign.pk,
+    ).exclude(pk=job.pk)
+    if campaign.status == MailingCampaign.Status.RUNNING and not other_jobs.exists():
+        # рассылку отправляла эта же задача до остановки воркера
+        reclaim_campaign(campaign)
+    campaign = deliver_campaign(campaign, progress)
+    return campaign_summary(campaign)
+
+
+@job_handler(BackgroundJob.Kind.SYNC_SSH_KEYS)
+def sync_ssh_keys_job(job: BackgroundJob, progress: JobProgress) -> str:
+    from tgbot.managers.ssh_manager import sync_keys
+    from tgbot.models import Server
+
+    sync_keys()
+    progress.ok()
+    return f"SSH ключи синхронизированы для сервера {Server.get_solo().ip}."
+
+
+@job_handler(BackgroundJob.Kind.RESET_PASSWORD)
+def reset_password_job(job: BackgroundJob, progress: JobProgress) -> str:
+    from tgbot.managers.ssh_manager import SSHAccessManager
+    from tgbot.models import Server
+
+    server = Server.get_solo()
+    user = job.payload["user"]
+    SSHAccessManager().set_auth_methods(
+        server.password_auth,
+        server.pubkey_auth,
+        server.permit_root_login,
+        server.permit_empty_passwords,
+        (user, job.payload["password"]),
+    )
+    progress.ok()
+    return f"Пароль для пользователя {user} сброшен."
@@ -60,4 +60,60 @@ def master_response_cancel_keyboard(response: Response):
     )
     keyboard.append([cancel_button])
     markup = InlineKeyboardMarkup(keyboard)
+    return markup
+
+def _tag_buttons(selected_ids: set, callback_data) -> list:
+    keyboard = []
+    row = []
+    for tag in Tag.objects.all():
+        name = ButtonNames.SELECTED_TAG.format(name=tag.name) if tag.id in selected_ids else tag.name
+        row.append(InlineKeyboardButton(name, callback_data=callback_data(tag)))
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+    return keyboard
+
+def task_tags_keyboard(task: Task):
+    selected_ids = set(task.tags.values_list("id", flat=True))
+    keyboard = _tag_buttons(
+        selected_ids,
+        lambda tag: f"{CallbackData.TAG_TOGGLE}?{CallbackData.TAG_ID}={tag.id}&{CallbackData.TASK_ID}={task.id}"
+    )
+    cancel_button = InlineKeyboardButton(
+        ButtonNames.CANCEL,
+        callback_data=f"{CallbackData.TASK_CANCEL}?{CallbackData.TASK_ID}={task.id}"
+    )
+    publish_button = InlineKeyboardButton(
+        ButtonNames.PUBLISH,
+        callback_data=f"{CallbackData.CLOSE_TAG_TOGGLES}?{CallbackData.TASK_ID}={task.id}"
+    )
+    keyboard.append([cancel_button, publish_button])
+    markup = InlineKeyboardMarkup(keyboard)
+    return markup
+
+def master_tags_keyboard(user: TelegramUser):
+    selected_ids = set(user.tags.values_list("id", flat=True))
+    keyboard = _tag_buttons(
+        selected_ids,
+        lambda tag: f"{CallbackData.TAG_SELECT}?{CallbackData.TAG_ID}={tag.id}"
+    )
+    markup = InlineKeyboardMarkup(keyboard)
+    return markup
+
+def digest_keyboard(tasks: list):
+    keyboard = []
+    row = []
+    for task in tasks:
+        row.append(InlineKeyboardButton(
+            ButtonNames.DIGEST_TASK.format(random_task_number=task.random_task_number),
+            callback_data=f"{CallbackData.TASK_EXPAND}?{CallbackData.TASK_ID}={task.id}"
+        ))
+        if len(row) == Constants.DIGEST_BUTTONS_IN_ROW:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+    markup = InlineKeyboardMarkup(keyboard)
     return markup
\ No newline at end of file
@@ -0,0 +1,221 @@
+import time
+from typing import Iterator, Optional
+
+from django.db.models import Count, QuerySet
+from django.utils import timezone
+
+from tgbot.models import MailingCampaign, MailingRecipient, OutboxMessage, TelegramUser
+from tgbot.logics.constants import Constants
+from tgbot.logics.rate_limit import RateLimiter, retry_after
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+# общий для всех рассылок процесса: две одновременные рассылки делят один предел
+_limiter = RateLimiter(Constants.MAILING_RATE)
+
+
+def _id_chunks(users: QuerySet) -> Iterator[list[int]]:
+    """id пользователей порциями по Constants.MAILING_CHUNK_SIZE в порядке id"""
+    ids = users.order_by("pk").values_list("pk", flat=True)
+    last_id = None
+    while True:
+        chunk = list((ids if last_id is None else ids.filter(pk__gt=last_id))[:Constants.MAILING_CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def create_campaign(sender: TelegramUser, text: str, users: QuerySet, created_by: str = "") -> MailingCampaign:
+    """
+    Создаёт рассылку и записывает получателей порциями: пользователи
+    в память целиком не загружаются, каждая порция — короткая транзакция.
+    """
+    campaign = MailingCampaign.objects.create(sender=sender, text=text, created_by=created_by)
+    for chunk in _id_chunks(users):
+        MailingRecipient.objects.bulk_create(
+            [MailingRecipient(campaign=campaign, telegram_user_id=user_id) for user_id in chunk],
+            ignore_conflicts=True,
+        )
+    campaign.recipients_total = campaign.recipients.count()
+    campaign.save(update_fields=["recipients_total", "updated_at"])
+    logger.info(f"create_campaign: {campaign}, получателей: {campaign.recipients_total}")
+    return campaign
+
+
+def _update_counters(campaign: MailingCampaign) -> None:
+    counts = dict(
+        campaign.recipients.values("status").annotate(total=Count("id")).values_list("status", "total")
+    )
+    campaign.sent = counts.get(MailingRecipient.Status.SENT, 0)
+    campaign.failed = counts.get(MailingRecipient.Status.FAILED, 0)
+    campaign.skipped = counts.get(MailingRecipient.Status.SKIPPED, 0)
+    campaign.save(update_fields=["sent", "failed", "skipped", "updated_at"])
+
+
+def _finish(recipient: MailingRecipient, status: str, error: str = "", message_id: Optional[int] = None) -> None:
+    recipient.status = status
+    recipient.error = error
+    recipient.message_id = message_id
+    recipient.save(update_fields=["status", "error", "message_id", "updated_at"])
+
+
+def _claim(recipient: MailingRecipient) -> bool:
+    """Отмечает получателя как отправляемого; False — его уже взяла другая задача"""
+    return bool(
+        MailingRecipient.objects.filter(pk=recipient.pk, status=MailingRecipient.Status.PENDING)
+        .update(status=MailingRecipient.Status.SENDING, updated_at=timezone.now())
+    )
+
+
+def _deliver(recipient: MailingRecipient, message: str, progress=None) -> None:
+    """Отправляет сообщение одному получателю и сохраняет результат"""
+    from tgbot.dispatcher import bot
+    from tgbot.logics.dead_letters import record_dead_letter
+
+    if not _claim(recipient):
+        return
+
+    user = recipient.telegram_user
+    if user.blocked or user.bot_was_blocked:
+        reason = "заблокирован администратором" if user.blocked else "заблокировал бота"
+        _finish(recipient, MailingRecipient.Status.SKIPPED, reason)
+        if progress:
+            progress.error(f"{user.chat_id}: пропущен — {reason}")
+        return
+
+    while True:
+        _limiter.wait()
+        try:
+            sent = bot.send_message(user.chat_id, message)
+            break
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is not None:
+                # Telegram просит подождать — тот же получатель повторяется после паузы
+                logger.warning(f"_deliver: превышен лимит Telegram, пауза {delay} с")
+                time.sleep(delay)
+                continue
+            error = e
+        logger.error(f"mass_mailing: Failed to send message to {user.chat_id}: {error}")
+        record_dead_letter(
+            operation=OutboxMessage.Operation.SEND_TEXT,
+            error=error,
+            telegram_user=user,
+            payload={"text": message},
+        )
+        _finish(recipient, MailingRecipient.Status.FAILED, f"{type(error).__name__}: {error}")
+        if progress:
+            progress.error(f"{user.chat_id}: {error}")
+        return
+
+    if sent is None:
+        # бот заблокирован — признак у пользователя уже выставлен
+        _finish(recipient, MailingRecipient.Status.SKIPPED, "заблокировал бота")
+        if progress:
+            progress.error(f"{user.chat_id}: пропущен — заблокировал бота")
+        return
+    _finish(recipient, MailingRecipient.Status.SENT, message_id=sent.message_id)
+    if progress:
+        progress.ok()
+
+
+def reclaim_campaign(campaign: MailingCampaign) -> bool:
+    """
+    Возвращает в очередь рассылку, задача которой прервалась вместе с воркером:
+    статус «Отправляется» и отмеченные получатели остались от прерванного запуска.
+    Сообщение отмеченному получателю могло уйти — он получит его ещё раз.
+    """
+    if not MailingCampaign.objects.filter(pk=campaign.pk, status=MailingCampaign.Status.RUNNING).update(
+        status=MailingCampaign.Status.PENDING, updated_at=timezone.now()
+    ):
+        return False
+    count = campaign.recipients.filter(status=MailingRecipient.Status.SENDING).update(
+        status=MailingRecipient.Status.PENDING
+    )
+    logger.warning(f"reclaim_campaign: рассылка #{campaign.pk} продолжается после сбоя, повторно: {count}")
+    return True
+
+
+def deliver_campaign(campaign: MailingCampaign, progress=None) -> MailingCampaign:
+    """
+    Отправляет рассылку ещё не обработанным получателям порциями в порядке id.
+    Состояние каждого получателя сохраняется сразу, поэтому после перезапуска
+    рассылка продолжается с того же места. Остановленная из админки рассылка
+    прерывается после текущей порции.
+    Начинается только рассылка в очереди: остановленную до начала или уже
+    отправляемую другой задачей рассылка не трогает. Каждый получатель
+    отмечается перед отправкой, поэтому две задачи одной рассылки
+    не отправят ему сообщение дважды.
+    progress — JobProgress фоновой задачи, если рассылка выполняется в ней.
+    """
+    from tgbot.logics.administrator_actions import mailing_text
+
+    message = mailing_text(campaign.sender, campaign.text)
+    if message is None:
+        raise ValueError("Не удалось отправить сообщения: нет отправителя или текста")
+
+    now = timezone.now()
+    started = MailingCampaign.objects.filter(pk=campaign.pk, status=MailingCampaign.Status.PENDING).update(
+        status=MailingCampaign.Status.RUNNING, updated_at=now
+    )
+    if not started:
+        campaign.refresh_from_db()
+        logger.info(f"deliver_campaign: {campaign} не начата — она не в очереди")
+        return campaign
+
+    campaign.status = MailingCampaign.Status.RUNNING
+    campaign.started_at = campaign.started_at or now
+    campaign.finished_at = None
+    campaign.save(update_fields=["started_at", "finished_at", "updated_at"])
+
+    last_id = 0
+    cancelled = False
+    while True:
+        status = MailingCampaign.objects.filter(pk=campaign.pk).values_list("status", flat=True).first()
+        if status != MailingCampaign.Status.RUNNING:
+            campaign.status = status
+            cancelled = True
+            break
+        chunk = list(
+            campaign.recipients
+            .filter(status=MailingRecipient.Status.PENDING, id__gt=last_id)
+            .select_related("telegram_user")
+            .order_by("id")[:Constants.MAILING_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for recipient in chunk:
+            _deliver(recipient, message, progress)
+        last_id = chunk[-1].id
+        _update_counters(campaign)
+
+    _update_counters(campaign)
+    if not cancelled:
+        campaign.status = MailingCampaign.Status.DONE
+        campaign.finished_at = timezone.now()
+        campaign.save(update_fields=["status", "finished_at", "updated_at"])
+    logger.info(
+        f"deliver_campaign: {campaign}: отправлено {campaign.sent}, ошибок {campaign.failed}, "
+        f"пропущено {campaign.skipped}, {campaign.throughput or 0} сообщений/мин"
+    )
+    return campaign
+
+
+def campaign_summary(campaign: MailingCampaign) -> str:
+    processed = campaign.sent + campaign.failed + campaign.skipped
+    return (
+        f"Рассылка закончена\nКоличество обработанных пользователей:\n{processed} из {campaign.recipients_total}\n"
+        f"Успешно отправлено: {campaign.sent}\nОшибок отправки: {campaign.failed}\n"
+        f"Пропущено (заблокированы): {campaign.skipped}\n"
+        f"Скорость: {campaign.throughput or 0} сообщений/мин"
+    )
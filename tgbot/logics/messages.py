@@ -1,10 +1,15 @@
 import time
 import re
+import threading
+from collections import OrderedDict
 from typing import Optional, Iterable, Union
 
+from django.db import transaction
+
 from tgbot.dispatcher import bot
 
 from tgbot.logics.keyboards import *
+from tgbot.logics.dead_letters import record_dead_letter
 from tgbot.logics.text_helper import escape_markdown, get_mention, safe_markdown_mention
 from tgbot.models import *
 from tgbot.logics.constants import *
@@ -31,6 +36,7 @@ def send_notification_with_mention_check(
 ):
     """
     Универсальная отправка упоминания actor с экранированием Markdown и логированием.
+    Ошибки отправки пробрасываются вызывающему коду, None — бот заблокирован получателем.
     """
     # 4) Отправка
     try:
@@ -41,10 +47,15 @@ def send_notification_with_mention_check(
             reply_to_message_id=reply_to_message_id,
             reply_markup=reply_markup
         )
-        logger.info(f"send_mention_notification: отправлено сообщение {sent.message_id} для chat_id={recipient_chat_id}")
     except Exception as e:
         logger.error(f"send_mention_notification: ошибка при send_message для chat_id={recipient_chat_id}: {e}")
+        raise
+
+    if sent is None:
+        # пользователь заблокировал бота — повторять отправку бессмысленно
+        logger.info(f"send_mention_notification: бот заблокирован пользователем chat_id={recipient_chat_id}")
         return None
+    logger.info(f"send_mention_notification: отправлено сообщение {sent.message_id} для chat_id={recipient_chat_id}")
 
     # 5) Фолбэк для неудачного text_mention
     has_mention = False
@@ -52,6 +63,10 @@ def send_notification_with_mention_check(
         if ent.type == "text_mention" and ent.user.id == actor.chat_id:
             has_mention = True
             break
+
+    if not actor.username:
+        # запоминаем результат, чтобы следующие рассылки не начинались зря
+        actor.remember_mention_state(has_mention)
     
     if not actor.username and not has_mention:
         try:
@@ -67,7 +82,7 @@ def send_notification_with_mention_check(
                 parse_mode="Markdown"
             )
             if callback:
-                bot.answer_callback_query(callback.id, "Не удалось упомянуть вас по имени.")
+                bot.answer_callback_query(callback.id, Messages.USER_MENTION_PROBLEM_SHORT)
             logger.info(f"send_mention_notification: отправлено уведомление о проблеме упоминания пользователю {actor.chat_id}")
             return Constants.USER_MENTION_PROBLEM
         except Exception as e:
@@ -75,6 +90,27 @@ def send_notification_with_mention_check(
 
     return sent
 
+def refuse_unmentionable(actor: TelegramUser, callback: Optional[CallbackQuery] = None) -> bool:
+    """
+    Проверка до отправки: если упомянуть actor заведомо не получится,
+    сразу объясняет ему причину и возвращает True — рассылку начинать не нужно.
+    """
+    if not actor.mention_is_broken():
+        return False
+
+    logger.info(f"refuse_unmentionable: упоминание {actor.chat_id} не работает, действие отклонено заранее")
+    try:
+        bot.send_message(
+            chat_id=actor.chat_id,
+            text=Messages.USER_MENTION_PROBLEM,
+            parse_mode="Markdown"
+        )
+        if callback:
+            bot.answer_callback_query(callback.id, Messages.USER_MENTION_PROBLEM_SHORT)
+    except Exception as e:
+        logger.warning(f"refuse_unmentionable: ошибка при уведомлении {actor.chat_id}: {e}")
+    return True
+
 def update_dipsather_task_text(
     task: Task,
     response: Optional[Response] = None,
@@ -103,11 +139,16 @@ def update_dipsather_task_text(
             if ent.type == "text_mention" and ent.user.id == actor.chat_id:
                 has_mention = True
                 break
+
+        if not actor.username:
+            actor.remember_mention_state(has_mention)
         
         if not actor.username and not has_mention:
             try:
                 logger.info(f"update_dipsather_task_text: удалено неудачное mention-сообщение {sent.message_id}")
                 response.delete()
+                # сбрасываем загруженные заранее отклики — удалённого в тексте быть не должно
+                task.refresh_from_db()
                 text = task.dispather_task_text
                 sent = edit_task_message(
                     recipient=task.creator,
@@ -121,7 +162,7 @@ def update_dipsather_task_text(
                     parse_mode="Markdown"
                 )
                 if callback:
-                    bot.answer_callback_query(callback.id, "Не удалось упомянуть вас по имени.")
+                    bot.answer_callback_query(callback.id, Messages.USER_MENTION_PROBLEM_SHORT)
                 logger.info(f"update_dipsather_task_text: отправлено уведомление о проблеме упоминания пользователю {actor.chat_id}")
                 return Constants.USER_MENTION_PROBLEM
             except Exception as e:
@@ -177,11 +218,100 @@ def send_welcome_message(created: bool, user: TelegramUser) -> None:
     except Exception as e:
         logger.error(f"Общая ошибка при отправке приветственного сообщения пользователю {user.chat_id}: {e}")
 
-def send_task_files(recipient: TelegramUser, task: Task, reply_to_message_id: Optional[int] = None) -> Optional[int]:
+# (id задачи, дата создания) → (файлы задачи, InputMedia для альбома или None)
+_task_media_cache = OrderedDict()
+_task_media_lock = threading.Lock()
+
+def _task_media(task: Task) -> tuple[list, Optional[list]]:
+    """
+    Файлы задачи и готовый список InputMedia для альбома из фото и видео.
+    Вложения задачи после создания не меняются, поэтому при рассылке
+    они загружаются один раз, а не для каждого мастера.
+    """
+    key = (task.id, task.created_at)
+    with _task_media_lock:
+        cached = _task_media_cache.get(key)
+        if cached is not None:
+            _task_media_cache.move_to_end(key)
+            return cached
+
+    files = list(task.files.order_by("id"))
+    media = None
+    if len(files) > 1 and all(f.file_type in ["photo", "video"] for f in files):
+        media = []
+        for f in files:
+            if f.file_type == "photo":
+                media.append(InputMediaPhoto(media=f.file_id))
+            elif f.file_type == "video":
+                media.append(InputMediaVideo(media=f.file_id))
+
+    with _task_media_lock:
+        _task_media_cache[key] = (files, media)
+        _task_media_cache.move_to_end(key)
+        while len(_task_media_cache) > Constants.TASK_MEDIA_CACHE_SIZE:
+            _task_media_cache.popitem(last=False)
+    return files, media
+
+def _record_file_messages(recipient: TelegramUser, files: list, message_ids: list[int]):
+    """Сохраняет отправленные сообщения файлов одним запросом"""
+    SentMessage.objects.bulk_create([
+        SentMessage(
+            message_id=message_id,
+            telegram_user=recipient,
+            kind=SentMessage.Kind.FILE,
+            task_id=f.task_id,
+            file=f,
+        )
+        for f, message_id in zip(files, message_ids)
+    ])
+
+def _copy_task_files(recipient: TelegramUser, task: Task, files: list) -> Optional[int]:
+    """
+    Копирует вложения из исходных сообщений диспетчера одним вызовом copyMessages.
+    Возвращает ID первого скопированного сообщения.
+    Если копирование невозможно, выбрасывает исключение — вызывающий отправит файлы обычным способом.
+    """
+    source_ids = [f.source_message_id for f in files]
+    if None in source_ids or len(set(source_ids)) != len(source_ids):
+        raise ValueError(f"у файлов задачи {task.id} нет исходных сообщений для копирования")
+
+    # copyMessages принимает id в порядке возрастания и возвращает копии в том же порядке
+    files = sorted(files, key=lambda f: f.source_message_id)
+    copied = bot.copy_messages(
+        recipient.chat_id,
+        task.creator.chat_id,
+        [f.source_message_id for f in files],
+        remove_caption=True,
+    )
+    if copied is None:
+        # бот заблокирован получателем
+        return None
+    if len(copied) != len(files):
+        # по ответу не понять, какие вложения не скопировались, — журнал нельзя
+        # сопоставить с файлами; убираем частичные копии и отправляем файлы заново
+        for msg in copied:
+            try:
+                bot.delete_message(recipient.chat_id, msg.message_id)
+            except Exception as e:
+                logger.warning(f"copy_messages: не удалось удалить копию {msg.message_id} у {recipient.chat_id}: {e}")
+        raise ValueError(f"скопировано {len(copied)} из {len(files)} вложений задачи {task.id}")
+
+    _record_file_messages(recipient, files, [msg.message_id for msg in copied])
+    return copied[0].message_id if copied else None
+
+def send_task_files(
+    recipient: TelegramUser,
+    task: Task,
+    reply_to_message_id: Optional[int] = None,
+    configuration: Optional[Configuration] = None,
+) -> Optional[int]:
     """
     Отправляет файлы, прикреплённые к заданию, универсально для диспетчера и мастера.
     Возвращает ID первого отправленного сообщения (для возможности отправки ответа),
     если файлы отправлены, иначе возвращает None.
+    Если в конфигурации включено копирование вложений, файлы копируются
+    из сообщений диспетчера одним вызовом на чат.
+    configuration — уже загруженная конфигурация, чтобы рассылка не читала её для каждого мастера.
     
     Учтите лимиты Telegram по размеру файлов:
       - Отправляемые файлы (без локального сервера Bot API): до 50 МБ.
@@ -189,31 +319,27 @@ def send_task_files(recipient: TelegramUser, task: Task, reply_to_message_id: Op
       - Принимаемые файлы (без локального сервера Bot API): до 20 МБ.
       - Лимит загрузки файлов с локальным сервером Bot API: до 2000 МБ.
     """
-    files_qs = list(task.files.all())
+    files_qs, media = _task_media(task)
     if not files_qs:
         return None
 
     first_msg_id = None
     chat_id = recipient.chat_id
 
-    if len(files_qs) > 1 and all(f.file_type in ["photo", "video"] for f in files_qs):
-        media = []
-        for f in files_qs:
-            if f.file_type == "photo":
-                media.append(InputMediaPhoto(media=f.file_id))
-            elif f.file_type == "video":
-                media.append(InputMediaVideo(media=f.file_id))
+    # copyMessages не умеет отвечать на сообщение, поэтому копируем только без reply
+    configuration = configuration or Configuration.get_solo()
+    if reply_to_message_id is None and configuration.copy_task_media:
+        try:
+            return _copy_task_files(recipient, task, files_qs)
+        except Exception as e:
+            logger.warning(f"Не удалось скопировать вложения задачи {task.id} для {chat_id}, отправляем файлы: {e}")
+
+    if media:
         try:
             msgs = bot.send_media_group(chat_id, media=media, reply_to_message_id=reply_to_message_id)
             if msgs:
                 first_msg_id = msgs[0].message_id
-                for f, msg in zip(files_qs, msgs):
-                    sent = SentMessage.objects.create(
-                        message_id=msg.message_id,
-                        telegram_user=recipient
-                    )
-                    f.sent_messages.add(sent)
-                    f.save()
+                _record_file_messages(recipient, files_qs, [msg.message_id for msg in msgs])
         except Exception as e:
             logger.error(f"Ошибка при отправке media group: {e}")
     else:
@@ -229,12 +355,7 @@ def send_task_files(recipient: TelegramUser, task: Task, reply_to_message_id: Op
                     msg = bot.send_message(chat_id, "Неподдерживаемый тип файла", reply_to_message_id=reply_to_message_id, parse_mode="Markdown")
                 if idx == 0:
                     first_msg_id = msg.message_id
-                sent = SentMessage.objects.create(
-                    message_id=msg.message_id,
-                    telegram_user=recipient
-                )
-                f.sent_messages.add(sent)
-                f.save()
+                _record_file_messages(recipient, [f], [msg.message_id])
             except Exception as e:
                 logger.error(f"Ошибка при отправке файла {f.file_id} (тип {f.file_type}): {e}")
     return first_msg_id
@@ -276,9 +397,7 @@ def send_task_message(
         return
 
     try:
-        sent = SentMessage.objects.create(message_id=text_msg.message_id, telegram_user=recipient)
-        task.sent_messages.add(sent)
-        task.save()
+        sent = SentMessage.objects.create(message_id=text_msg.message_id, telegram_user=recipient, task=task)
         logger.info(f"send_task_message: сохранён SentMessage {sent.id} для задачи {task.id}")
     except Exception as e:
         logger.error(f"send_task_message: ошибка при сохранении SentMessage для задачи {task.id}: {e}")
@@ -293,7 +412,7 @@ def edit_task_message(
     """
     Редактирует последнее сообщение по задаче с экранированием и логированием.
     """
-    sent: SentMessage = task.sent_messages.filter(telegram_user=recipient).order_by("created_at").last()
+    sent: SentMessage = task.message_ledger.filter(telegram_user=recipient, kind=SentMessage.Kind.TASK).order_by("created_at").last()
     if not sent:
         logger.error(f"edit_task_message: нет сообщения для редактирования у {recipient.chat_id} (задача {task.id})")
         return
@@ -317,10 +436,8 @@ def edit_task_message(
                 parse_mode="Markdown",
                 reply_markup=new_reply_markup
             )
-            new_sent = SentMessage.objects.create(message_id=new_msg.message_id, telegram_user=recipient)
-            task.sent_messages.add(new_sent)
+            SentMessage.objects.create(message_id=new_msg.message_id, telegram_user=recipient, task=task)
             sent = new_msg
-            task.save()
             logger.info(f"edit_task_message: отправлено новое сообщение {new_msg.message_id} для задачи {task.id}")
         except Exception as ex:
             logger.error(f"edit_task_message: ошибка при отправке нового сообщения задачи {task.id}: {ex}")
@@ -329,7 +446,10 @@ def edit_task_message(
 def send_task_to_user(
     task: Task,
     master: TelegramUser,
-    reply_markup: Optional[InlineKeyboardMarkup] = None
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    text: Optional[str] = None,
+    configuration: Optional[Configuration] = None,
+    raise_errors: bool = False,
 ) -> Optional[SentMessage]:
     """
     Универсальная отправка задачи task одному мастеру master:
@@ -337,14 +457,17 @@ def send_task_to_user(
       2) Формирует текст с упоминанием диспетчера.
       3) Посылает сообщение через send_notification_with_mention_check.
       4) Сохраняет SentMessage и возвращает его.
-    В случае ошибки — логирует и возвращает None.
+    text и configuration — посчитанные один раз на всю рассылку текст задачи и конфигурация.
+    В случае ошибки — логирует, сохраняет операцию в неотправленные и возвращает None.
+    raise_errors — пробросить ошибку вызывающему коду: очередь исходящих операций
+    сама повторяет отправку и сохраняет её в неотправленные, когда попытки исчерпаны.
     """
     try:
         # 1. Отправляем файлы
-        first_msg_id = send_task_files(master, task)
+        first_msg_id = send_task_files(master, task, configuration=configuration)
 
         # 2. Шаблон текста
-        text_template = task.master_task_text_with_dispather_mention
+        text_template = text if text is not None else task.master_task_text_with_dispather_mention
 
         # 3. Отправляем сообщение с упоминанием диспетчера
         sent = send_notification_with_mention_check(
@@ -362,43 +485,85 @@ def send_task_to_user(
         # 4. Сохраняем в базе
         sm = SentMessage.objects.create(
             message_id=sent.message_id,
-            telegram_user=master
+            telegram_user=master,
+            task=task
         )
-        task.sent_messages.add(sm)
-        task.save()
         logger.info(f"send_task_to_user: задача {task.id} отправлена мастеру {master.chat_id}")
         return sm
 
     except Exception as e:
         logger.error(f"send_task_to_user: исключение при отправке задачи {task.id} мастеру {master.chat_id}: {e}")
+        if raise_errors:
+            raise
+        record_dead_letter(
+            operation=OutboxMessage.Operation.SEND_TASK,
+            error=e,
+            telegram_user=master,
+            task=task,
+            payload={"reply_markup": reply_markup.to_json() if reply_markup else None},
+        )
         return None
 
+def enqueue_task_broadcast(
+    task: Task,
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+) -> int:
+    """
+    Записывает в очередь исходящих операций отправку задачи мастерам,
+    подписанным на её тэги (заявке без тэгов — всем мастерам).
+    Мастерам в режиме сводки задача уйдёт в ближайшей сводке.
+    При выключенной в конфигурации рассылке ничего не записывает.
+    Вызывается в той же транзакции, в которой создаётся или изменяется задача.
+    """
+    from tgbot.logics.outbox import record_send_task
+    from tgbot.logics.tags import task_recipient_ids
+
+    if not Configuration.get_solo().push_new_tasks:
+        # мастера находят заявки сами через inline-режим
+        return 0
+
+    digest_ids = set(
+        TelegramUser.objects.filter(digest_mode=True).values_list("id", flat=True)
+    )
+    return record_send_task(task, task_recipient_ids(task), reply_markup, digest_ids=digest_ids)
+
+def deliver_task_broadcast(task: Task):
+    """
+    Выполняет записанную рассылку задачи.
+    Возвращает Constants.USER_MENTION_PROBLEM, если рассылка была прервана.
+    """
+    from tgbot.logics.outbox import deliver_outbox
+    return deliver_outbox(
+        task.outbox_messages.filter(operation=OutboxMessage.Operation.SEND_TASK)
+    )
+
 def broadcast_send_task_to_users(
     task: Task,
     reply_markup: Optional[InlineKeyboardMarkup] = None
 ):
-    dispatcher = task.creator
-    masters = TelegramUser.objects.exclude(
-        chat_id=dispatcher.chat_id
-    ).exclude(blocked=True)
-
-    for master in masters:
-        if send_task_to_user(task, master, reply_markup) == Constants.USER_MENTION_PROBLEM:
-            from tgbot.handlers.utils import delete_all_task_related
-            delete_all_task_related(task)
-            task.delete()
-            return Constants.USER_MENTION_PROBLEM
+    if task.creator.mention_is_broken():
+        logger.info(f"broadcast_send_task_to_users: упоминание диспетчера задачи {task.id} не работает, рассылка не начата")
+        return Constants.USER_MENTION_PROBLEM
+    with transaction.atomic():
+        enqueue_task_broadcast(task, reply_markup)
+    return deliver_task_broadcast(task)
 
 def edit_master_task_message(
     recipient: TelegramUser,
     task: Task,
     new_text: str,
     new_reply_markup: Optional[InlineKeyboardMarkup] = None,
+    task_message: Optional[SentMessage] = None,
+    configuration: Optional[Configuration] = None,
 ) -> None:
-
-    sent: SentMessage = (
-        task.sent_messages
-            .filter(telegram_user=recipient)
+    """
+    Редактирует сообщение задачи у мастера, а если не получается — отправляет задачу заново.
+    task_message — последнее сообщение задачи у мастера, если рассылка уже загрузила его
+    вместе с остальными; configuration — уже загруженная конфигурация.
+    """
+    sent: SentMessage = task_message or (
+        task.message_ledger
+            .filter(telegram_user=recipient, kind=SentMessage.Kind.TASK)
             .order_by("created_at")
             .last()
     )
@@ -414,23 +579,22 @@ def edit_master_task_message(
             parse_mode="Markdown",
             reply_markup=new_reply_markup
         )
-        logger.info(f"edit_master_task_message: отредактировано сообщение {sent}")
+        logger.info(f"edit_master_task_message: отредактировано сообщение {sent.message_id} у {recipient.chat_id}")
         return
     except Exception as e:
-        logger.warning(f"edit_master_task_message: не удалось отредактировать {sent}: {e}")
+        logger.warning(f"edit_master_task_message: не удалось отредактировать {sent.message_id} у {recipient.chat_id}: {e}")
 
     try:
         sent.delete()
-        bot.delete_message(chat_id=recipient, message_id=sent.message_id)
-        logger.info(f"edit_master_task_message: удалено старое сообщение {sent}")
+        bot.delete_message(chat_id=recipient.chat_id, message_id=sent.message_id)
+        logger.info(f"edit_master_task_message: удалено старое сообщение {sent.message_id} у {recipient.chat_id}")
     except Exception as e:
-        logger.warning(f"edit_master_task_message: не удалось удалить {sent}: {e}")
+        logger.warning(f"edit_master_task_message: не удалось удалить {sent.message_id} у {recipient.chat_id}: {e}")
 
-    files = task.files
-    for file in files:
-        msg = file.sent_messages.filter(telegram_user=recipient).order_by("created_at").last()
+    file_messages = task.message_ledger.filter(telegram_user=recipient, kind=SentMessage.Kind.FILE)
+    for msg in file_messages:
         try:
-            bot.delete_message(chat_id=recipient, message_id=msg.message_id)
+            bot.delete_message(chat_id=recipient.chat_id, message_id=msg.message_id)
             msg.delete()
             logger.info(f"edit_master_task_message: удалено старое сообщение {msg}")
         except Exception as e:
@@ -439,29 +603,38 @@ def edit_master_task_message(
     
     logger.info(f"edit_master_task_message: вызвана edit_master_task_message для сообщения {sent.message_id}")
 
-    first_msg_id = send_task_files(recipient, task)
+    try:
+        first_msg_id = send_task_files(recipient, task, configuration=configuration)
 
-    text_msg = send_notification_with_mention_check(
-        recipient_chat_id=recipient.chat_id,
-        actor=task.creator,
-        text_template=new_text,
-        reply_to_message_id=first_msg_id,
-        reply_markup=new_reply_markup
-    )
+        text_msg = send_notification_with_mention_check(
+            recipient_chat_id=recipient.chat_id,
+            actor=task.creator,
+            text_template=new_text,
+            reply_to_message_id=first_msg_id,
+            reply_markup=new_reply_markup
+        )
+    except Exception as e:
+        logger.error(f"edit_master_task_message: не удалось заново отправить задачу {task.id} мастеру {recipient.chat_id}: {e}")
+        record_dead_letter(
+            operation=OutboxMessage.Operation.EDIT_TASK,
+            error=e,
+            telegram_user=recipient,
+            task=task,
+            payload={"text": new_text, "reply_markup": new_reply_markup.to_json() if new_reply_markup else None},
+        )
+        return
 
     if text_msg == Constants.USER_MENTION_PROBLEM:
         logger.error(f"send_mention_notification не удалось создать упоминание пользователя, рассылка прекращена")
         return
 
     if text_msg:
-        sent = SentMessage.objects.create(
+        SentMessage.objects.create(
             message_id=text_msg.message_id,
-            telegram_user=recipient
+            telegram_user=recipient,
+            task=task
         )
 
-        task.sent_messages.add(sent)
-        task.save()
-
         logger.info(f"Задача {task.id} заново отправлена мастеру после ошибки {recipient.chat_id}")
 
 def broadcast_edit_master_task_message(
@@ -485,43 +658,57 @@ def broadcast_edit_master_task_message(
         for item in exclude:
             exclude_ids.add(item.chat_id if isinstance(item, TelegramUser) else int(item))
 
-    # Фильтруем мастеров
+    # Мастера, у которых есть сообщение по задаче, — одним запросом, только нужные столбцы
     masters = (
         TelegramUser.objects
+        .filter(id__in=task.message_ledger.filter(kind=SentMessage.Kind.TASK).values("telegram_user_id"))
         .exclude(chat_id__in=exclude_ids)
         .exclude(blocked=True)
+        .values("id", "chat_id")
     )
 
-    for master in masters:
+    # Отклики по мастерам — одним запросом, при нескольких берётся последний
+    responses = {
+        response.telegram_user_id: response
+        for response in task._responses_for_text()
+    }
+
+    # Общие для всех мастеров текст и клавиатура считаются один раз
+    master_text = task.master_task_text_with_dispather_mention
+    payment_markup = None
+
+    edits = []
+    for master in masters.iterator():
         try:
-            has_response = task.responses.filter(telegram_user=master).exists()
+            response = responses.get(master["id"])
 
             # для каждого мастера заводим свои локальные переменные
-            if has_response:
-                # берём последний отклик мастера
-                response = task.responses.filter(telegram_user=master).last()
-
+            if response is not None:
                 # если не передан общий new_text — используем специальный текст для откликнувшихся
                 text_to_send = new_text if new_text is not None else Messages.RESPONSE_SENT_TASK_TEXT.format(
-                    task_text=task.master_task_text_with_dispather_mention
+                    task_text=master_text
                 )
                 # если не передана общая клавиатура — ставим кнопку отмены отклика
                 markup_to_send = new_reply_markup if new_reply_markup is not None else master_response_cancel_keyboard(response=response)
             else:
                 # мастер ещё не откликался
-                text_to_send = new_text if new_text is not None else task.master_task_text_with_dispather_mention
-                markup_to_send = new_reply_markup if new_reply_markup is not None else payment_types_keyboard(task=task)
+                text_to_send = new_text if new_text is not None else master_text
+                if new_reply_markup is None and payment_markup is None:
+                    payment_markup = payment_types_keyboard(task=task)
+                markup_to_send = new_reply_markup if new_reply_markup is not None else payment_markup
 
             if task.stage == task.Stage.CLOSED:
                 markup_to_send = new_reply_markup if new_reply_markup else None
                 text_to_send = new_text if new_text else Messages.TASK_CLOSED + "\n\n" + text_to_send
 
-            edit_master_task_message(
-                recipient=master,
-                task=task,
-                new_text=text_to_send,
-                new_reply_markup=markup_to_send
-            )
-            logger.info(f"broadcast_edit: отредактировано сообщение задачи {task.id} у мастера {master.chat_id}")
+            edits.append((master["id"], text_to_send, markup_to_send))
         except Exception as e:
-            logger.error(f"broadcast_edit: не удалось отредактировать сообщение задачи {task.id} у {master.chat_id}: {e}")
\ No newline at end of file
+            logger.error(f"broadcast_edit: не удалось подготовить сообщение задачи {task.id} для {master['chat_id']}: {e}")
+
+    # Правки записываются в очередь и выполняются пачками
+    from tgbot.logics.outbox import deliver_outbox, record_edit_task
+    record_edit_task(task, edits)
+    deliver_outbox(
+        task.outbox_messages.filter(operation=OutboxMessage.Operation.EDIT_TASK)
+    )
+    logger.info(f"broadcast_edit: обработаны правки задачи {task.id} для {len(edits)} мастеров")
\ No newline at end of file
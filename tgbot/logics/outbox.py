@@ -0,0 +1,496 @@
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import Container, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from telebot.types import InlineKeyboardMarkup
+
+from tgbot.models import Configuration, OutboxMessage, SentMessage, Task
+from tgbot.logics.constants import Constants, Messages
+from tgbot.logics.rate_limit import retry_after
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+class OutboxDeliveryError(Exception):
+    """Операция из очереди не была выполнена и будет повторена"""
+
+
+def _dump_markup(reply_markup: Optional[InlineKeyboardMarkup]) -> Optional[str]:
+    return reply_markup.to_json() if reply_markup else None
+
+
+def _load_markup(payload: dict) -> Optional[InlineKeyboardMarkup]:
+    markup = payload.get("reply_markup")
+    return InlineKeyboardMarkup.de_json(markup) if markup else None
+
+
+def record_send_task(
+    task: Task,
+    recipient_ids: Iterable[int],
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    digest_ids: Container[int] = (),
+) -> int:
+    """
+    Записывает в очередь отправку задачи каждому получателю.
+    Получателям из digest_ids задача попадёт в ближайшую сводку.
+    Вызывается внутри транзакции, в которой изменяется сама задача.
+    Возвращает количество записанных операций.
+    """
+    payload = {"reply_markup": _dump_markup(reply_markup)}
+    rows = [
+        OutboxMessage(
+            operation=(
+                OutboxMessage.Operation.DIGEST_TASK if user_id in digest_ids
+                else OutboxMessage.Operation.SEND_TASK
+            ),
+            task=task,
+            telegram_user_id=user_id,
+            payload=payload,
+        )
+        for user_id in recipient_ids
+    ]
+    OutboxMessage.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def record_edit_task(
+    task: Task,
+    edits: Iterable[tuple[int, str, Optional[InlineKeyboardMarkup]]],
+) -> int:
+    """
+    Записывает в очередь редактирование сообщений задачи.
+    edits — последовательность (id пользователя, текст, клавиатура).
+    Ещё не выполненные правки тех же сообщений заменяются новыми.
+    """
+    rows = [
+        OutboxMessage(
+            operation=OutboxMessage.Operation.EDIT_TASK,
+            task=task,
+            telegram_user_id=user_id,
+            payload={"text": text, "reply_markup": _dump_markup(reply_markup)},
+        )
+        for user_id, text, reply_markup in edits
+    ]
+    if not rows:
+        return 0
+
+    with transaction.atomic():
+        # Старые правки этих сообщений потеряли смысл — их перекроет новая
+        OutboxMessage.objects.filter(
+            task=task,
+            operation=OutboxMessage.Operation.EDIT_TASK,
+            status=OutboxMessage.Status.PENDING,
+            telegram_user_id__in=[row.telegram_user_id for row in rows],
+        ).update(status=OutboxMessage.Status.DONE, error="superseded", updated_at=timezone.now())
+        OutboxMessage.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def record_delete_messages(sent_messages: Iterable[SentMessage]) -> list[int]:
+    """
+    Записывает в очередь удаление сообщений в Telegram.
+    Операции не привязаны к задаче, чтобы пережить её удаление.
+    Возвращает id созданных операций.
+    """
+    rows = [
+        OutboxMessage(
+            operation=OutboxMessage.Operation.DELETE_MESSAGE,
+            chat_id=sent.telegram_user.chat_id,
+            message_id=sent.message_id,
+        )
+        for sent in sent_messages
+        if sent.telegram_user_id
+    ]
+    OutboxMessage.objects.bulk_create(rows, batch_size=500)
+    return [row.id for row in rows]
+
+
+def _due() -> Q:
+    """Ожидающие операции, время повтора которых наступило или которые ещё не откладывались"""
+    return Q(status=OutboxMessage.Status.PENDING) & (
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now())
+    )
+
+
+def _claim(queryset: QuerySet, limit: int) -> list[OutboxMessage]:
+    """
+    Атомарно забирает пачку ожидающих операций, чтобы два обработчика
+    не выполнили одну и ту же операцию. Отложенные до следующей попытки
+    операции пропускаются.
+    """
+    ids = list(
+        queryset.filter(_due())
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    batch_id = uuid.uuid4().hex
+    OutboxMessage.objects.filter(id__in=ids, status=OutboxMessage.Status.PENDING).update(
+        status=OutboxMessage.Status.PROCESSING,
+        batch_id=batch_id,
+        attempts=F("attempts") + 1,
+        updated_at=timezone.now(),
+    )
+    return list(
+        OutboxMessage.objects.filter(batch_id=batch_id)
+        .select_related("task", "task__creator", "telegram_user")
+        .order_by("id")
+    )
+
+
+# Операции, которые доставляют мастеру саму заявку
+_TASK_DELIVERY = (OutboxMessage.Operation.SEND_TASK, OutboxMessage.Operation.DIGEST_TASK)
+
+
+def _delivered_pairs(batch: list[OutboxMessage]) -> set[tuple[int, int]]:
+    """
+    Пары (задача, пользователь) из пачки, которым задача уже доставлена.
+    Один запрос на пачку вместо проверки каждой операции отдельно.
+    """
+    rows = [row for row in batch if row.operation in _TASK_DELIVERY]
+    if not rows:
+        return set()
+    task_ids = {row.task_id for row in rows}
+    user_ids = {row.telegram_user_id for row in rows}
+    return set(
+        SentMessage.objects
+        .filter(task_id__in=task_ids, telegram_user_id__in=user_ids, kind=SentMessage.Kind.TASK)
+        .values_list("task_id", "telegram_user_id")
+    )
+
+
+def _task_messages(batch: list[OutboxMessage]) -> dict[tuple[int, int], SentMessage]:
+    """
+    Последнее сообщение задачи у каждого мастера для правок из пачки —
+    один запрос на пачку вместо поиска сообщения для каждого мастера.
+    """
+    rows = [row for row in batch if row.operation == OutboxMessage.Operation.EDIT_TASK]
+    if not rows:
+        return {}
+    messages = (
+        SentMessage.objects
+        .filter(
+            task_id__in={row.task_id for row in rows},
+            telegram_user_id__in={row.telegram_user_id for row in rows},
+            kind=SentMessage.Kind.TASK,
+        )
+        .order_by("created_at", "id")
+    )
+    # при нескольких сообщениях остаётся последнее
+    return {(message.task_id, message.telegram_user_id): message for message in messages}
+
+
+class _BatchContext:
+    """Данные, общие для всех операций пачки: загружаются один раз на пачку"""
+
+    def __init__(self, batch: list[OutboxMessage]):
+        self.configuration = Configuration.get_solo()
+        self.delivered = _delivered_pairs(batch)
+        self.task_messages = _task_messages(batch)
+        self._master_texts = {}
+
+    def master_text(self, task: Task) -> str:
+        """Текст задачи для мастеров считается один раз для всех её операций в пачке"""
+        if task.id not in self._master_texts:
+            self._master_texts[task.id] = task.master_task_text_with_dispather_mention
+        return self._master_texts[task.id]
+
+
+def _execute(row: OutboxMessage, context: _BatchContext):
+    """Выполняет одну операцию. Возвращает Constants.USER_MENTION_PROBLEM или None."""
+    from tgbot.dispatcher import bot
+    from tgbot.logics.messages import edit_master_task_message, send_task_to_user
+
+    if row.operation in _TASK_DELIVERY:
+        # Повтор после перезапуска: задача уже доставлена этому мастеру
+        if (row.task_id, row.telegram_user_id) in context.delivered:
+            return None
+        result = send_task_to_user(
+            task=row.task,
+            master=row.telegram_user,
+            reply_markup=_load_markup(row.payload),
+            text=context.master_text(row.task),
+            configuration=context.configuration,
+            raise_errors=True,
+        )
+        if result == Constants.USER_MENTION_PROBLEM:
+            return result
+        if result is None:
+            # бот заблокирован мастером — повторять бессмысленно
+            raise OutboxDeliveryError(f"задача {row.task_id} не доставлена {row.telegram_user.chat_id}: бот заблокирован")
+
+    elif row.operation == OutboxMessage.Operation.EDIT_TASK:
+        task_message = context.task_messages.get((row.task_id, row.telegram_user_id))
+        if task_message is None:
+            logger.error(f"outbox: для задачи {row.task_id} нет сообщений у {row.telegram_user.chat_id}")
+            return None
+        edit_master_task_message(
+            recipient=row.telegram_user,
+            task=row.task,
+            new_text=row.payload.get("text"),
+            new_reply_markup=_load_markup(row.payload),
+            task_message=task_message,
+            configuration=context.configuration,
+        )
+
+    elif row.operation == OutboxMessage.Operation.DELETE_MESSAGE:
+        bot.delete_message(chat_id=row.chat_id, message_id=row.message_id)
+
+    elif row.operation == OutboxMessage.Operation.SEND_TEXT:
+        sent = bot.send_message(
+            row.chat_id,
+            row.payload["text"],
+            parse_mode=row.payload.get("parse_mode"),
+        )
+        if sent is None:
+            raise OutboxDeliveryError(f"сообщение не доставлено {row.chat_id}: бот заблокирован")
+
+    return None
+
+
+def _record_failed(row: OutboxMessage, error: Exception):
+    """Переносит исчерпавшую попытки операцию в хранилище неотправленных"""
+    from tgbot.logics.dead_letters import record_dead_letter
+    record_dead_letter(
+        operation=row.operation,
+        error=error,
+        telegram_user=row.telegram_user,
+        task=row.task,
+        chat_id=row.chat_id,
+        message_id=row.message_id,
+        payload=row.payload,
+        attempts=row.attempts,
+    )
+
+
+def _retry_delay(row: OutboxMessage, error: Exception) -> int:
+    """
+    Пауза перед следующей попыткой, секунд: сколько просит Telegram (429)
+    или экспоненциально растущая с числом попыток
+    """
+    delay = retry_after(error)
+    if delay is not None:
+        return delay
+    return min(Constants.OUTBOX_RETRY_DELAY * 2 ** max(row.attempts - 1, 0), Constants.OUTBOX_RETRY_MAX_DELAY)
+
+
+def _mark_failed(row: OutboxMessage, error: Exception):
+    """
+    Откладывает операцию до следующей попытки или, если повторять бессмысленно
+    либо попытки исчерпаны, помечает её неудавшейся.
+    """
+    if isinstance(error, OutboxDeliveryError):
+        # пользователь заблокировал бота — повторять бессмысленно
+        row.error = str(error)
+        row.status = OutboxMessage.Status.FAILED
+    else:
+        row.error = f"{type(error).__name__}: {error}"
+        if row.attempts >= Constants.OUTBOX_MAX_ATTEMPTS:
+            row.status = OutboxMessage.Status.FAILED
+            _record_failed(row, error)
+        else:
+            row.status = OutboxMessage.Status.PENDING
+            row.next_attempt_at = timezone.now() + timedelta(seconds=_retry_delay(row, error))
+    logger.error(f"outbox: операция {row.pk} ({row.operation}) не выполнена: {error}")
+
+
+def _abort_task_broadcast(task: Task):
+    """Отменяет рассылку задачи, если не удалось упомянуть диспетчера"""
+    from tgbot.handlers.utils import delete_all_task_related
+    logger.error(f"outbox: не удалось упомянуть диспетчера задачи {task.id}, рассылка прекращена")
+    delete_all_task_related(task)
+    task.delete()
+
+
+def deliver_outbox(queryset: Optional[QuerySet] = None, limit: Optional[int] = None):
+    """
+    Выполняет ожидающие операции из queryset (по умолчанию — все) пачками.
+    Конфигурация, тексты задач и сообщения для правок загружаются один раз
+    на пачку, результат операций сохраняется одним bulk_update на пачку.
+    Возвращает Constants.USER_MENTION_PROBLEM, если рассылка задачи была прервана.
+    """
+    from tgbot.dispatcher import bot
+
+    queryset = queryset if queryset is not None else OutboxMessage.objects.all()
+    processed = 0
+
+    while limit is None or processed < limit:
+        batch_size = Constants.OUTBOX_BATCH_SIZE if limit is None else min(Constants.OUTBOX_BATCH_SIZE, limit - processed)
+        batch = _claim(queryset, batch_size)
+        if not batch:
+            break
+
+        context = _BatchContext(batch)
+        aborted_task = None
+        with bot.deferred_unblock():
+            for row in batch:
+                if aborted_task is not None and row.task_id == aborted_task.id:
+                    # задача удалена вместе со своими операциями
+                    continue
+                try:
+                    if _execute(row, context) == Constants.USER_MENTION_PROBLEM:
+                        aborted_task = row.task
+                        continue
+                    row.status = OutboxMessage.Status.DONE
+                    row.error = ""
+                except Exception as e:
+                    _mark_failed(row, e)
+                row.updated_at = timezone.now()
+
+        OutboxMessage.objects.bulk_update(
+            [row for row in batch if aborted_task is None or row.task_id != aborted_task.id],
+            ["status", "error", "next_attempt_at", "updated_at"],
+        )
+        processed += len(batch)
+
+        if aborted_task is not None:
+            _abort_task_broadcast(aborted_task)
+            return Constants.USER_MENTION_PROBLEM
+
+    return None
+
+
+def _digest_text(tasks: list[Task]) -> str:
+    lines = [Messages.DIGEST_HEADER.format(count=len(tasks))]
+    for task in tasks:
+        preview = " ".join(task.description.split())
+        if len(preview) > Constants.DIGEST_PREVIEW_LENGTH:
+            preview = preview[:Constants.DIGEST_PREVIEW_LENGTH - 1] + "…"
+        lines.append(Messages.DIGEST_LINE.format(random_task_number=task.random_task_number, preview=preview))
+    lines.append("")
+    lines.append(Messages.DIGEST_FOOTER)
+    return "\n".join(lines)
+
+
+def flush_digests() -> int:
+    """
+    Отправляет мастерам в режиме сводки накопленные заявки: одно сообщение
+    на мастера (по Constants.DIGEST_MAX_TASKS заявок) с кнопками открытия заявок.
+    Закрытые, удалённые и уже доставленные заявки в сводку не попадают.
+    Возвращает количество отправленных сообщений.
+    """
+    from tgbot.dispatcher import bot
+    from tgbot.logics.keyboards import digest_keyboard
+
+    batch = _claim(
+        OutboxMessage.objects.filter(operation=OutboxMessage.Operation.DIGEST_TASK),
+        Constants.DIGEST_FLUSH_LIMIT,
+    )
+    if not batch:
+        return 0
+
+    delivered = _delivered_pairs(batch)
+    by_user = defaultdict(list)
+    for row in batch:
+        row.updated_at = timezone.now()
+        if row.task.stage != Task.Stage.CREATED or (row.task_id, row.telegram_user_id) in delivered:
+            row.status = OutboxMessage.Status.DONE
+            row.error = "skipped"
+            continue
+        by_user[row.telegram_user_id].append(row)
+
+    sent_count = 0
+    for rows in by_user.values():
+        user = rows[0].telegram_user
+        for start in range(0, len(rows), Constants.DIGEST_MAX_TASKS):
+            chunk = rows[start:start + Constants.DIGEST_MAX_TASKS]
+            tasks = [row.task for row in chunk]
+            try:
+                sent = bot.send_message(
+                    user.chat_id,
+                    _digest_text(tasks),
+                    reply_markup=digest_keyboard(tasks),
+                )
+                if sent is None:
+                    raise OutboxDeliveryError(f"сводка не доставлена {user.chat_id}: бот заблокирован")
+                for row in chunk:
+                    row.status = OutboxMessage.Status.DONE
+                    row.error = ""
+                sent_count += 1
+            except Exception as e:
+                for row in chunk:
+                    _mark_failed(row, e)
+
+    OutboxMessage.objects.bulk_update(batch, ["status", "error", "next_attempt_at", "updated_at"])
+    if sent_count:
+        logger.info(f"outbox: отправлено {sent_count} сводок ({len(batch)} заявок)")
+    return sent_count
+
+
+def deliver_on_commit(ids: list[int]):
+    """Выполняет операции после фиксации текущей транзакции"""
+    if ids:
+        transaction.on_commit(lambda: deliver_outbox(OutboxMessage.objects.filter(id__in=ids)))
+
+
+def recover_outbox() -> int:
+    """
+    Возвращает в очередь операции, прерванные остановкой процесса.
+    Вызывается один раз при запуске бота.
+    """
+    count = OutboxMessage.objects.filter(status=OutboxMessage.Status.PROCESSING).update(
+        status=OutboxMessage.Status.PENDING,
+        updated_at=timezone.now() - timedelta(seconds=Constants.OUTBOX_STALE_SECONDS),
+    )
+    if count:
+        logger.info(f"outbox: возвращено в очередь {count} прерванных операций")
+    return count
+
+
+def compact_outbox() -> int:
+    """Удаляет выполненные операции старше Constants.OUTBOX_RETENTION_HOURS"""
+    threshold = timezone.now() - timedelta(hours=Constants.OUTBOX_RETENTION_HOURS)
+    total = 0
+    while True:
+        ids = list(
+            OutboxMessage.objects.filter(status=OutboxMessage.Status.DONE, updated_at__lt=threshold)
+            .values_list("id", flat=True)[:1000]
+        )
+        if not ids:
+            break
+        total += OutboxMessage.objects.filter(id__in=ids).delete()[0]
+    if total:
+        logger.info(f"outbox: удалено {total} выполненных операций")
+    return total
+
+
+def run_outbox_dispatcher():
+    """
+    Фоновый разбор очереди: дорабатывает операции, оставшиеся после
+    перезапуска или не выполненные сразу. Свежие операции не трогает —
+    их выполняет обработчик, который их записал. Сводки, сжатие очереди
+    и сверку статистики выполняет планировщик (tgbot.logics.scheduler).
+    """
+    recover_outbox()
+
+    while True:
+        processed = False
+        try:
+            stale = timezone.now() - timedelta(seconds=Constants.OUTBOX_STALE_SECONDS)
+            # заявки в сводку копятся до следующей отправки сводок
+            queryset = OutboxMessage.objects.filter(updated_at__lt=stale).exclude(
+                operation=OutboxMessage.Operation.DIGEST_TASK
+            )
+            processed = queryset.filter(_due()).exists()
+            if processed:
+                deliver_outbox(queryset, limit=Constants.OUTBOX_BATCH_SIZE)
+        except Exception as e:
+            logger.exception(f"outbox: ошибка фонового разбора очереди: {e}")
+
+        if not processed:
+            time.sleep(Constants.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,139 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from tgbot.models import BackgroundJob, TelegramUser
+from tgbot.logics.constants import Constants
+from tgbot.logics.rate_limit import RateLimiter, retry_after
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+# Поля, которые обновление профиля может изменить
+PROFILE_FIELDS = (
+    "first_name",
+    "last_name",
+    "username",
+    "mention_state",
+    "mention_checked_at",
+    "profile_synced_at",
+)
+
+# общий для всех обновлений процесса: админка, ночное обновление и команда делят один предел
+_limiter = RateLimiter(Constants.PROFILE_REFRESH_RATE)
+
+
+def stale_users(queryset: QuerySet, force: bool = False) -> QuerySet:
+    """Пользователи, профиль которых не обновлялся дольше Constants.PROFILE_REFRESH_TTL"""
+    if force:
+        return queryset
+    threshold = timezone.now() - timedelta(seconds=Constants.PROFILE_REFRESH_TTL)
+    return queryset.filter(Q(profile_synced_at__isnull=True) | Q(profile_synced_at__lt=threshold))
+
+
+def _get_chat(user: TelegramUser):
+    """
+    Запрашивает чат пользователя у Telegram в рабочем потоке.
+    Возвращает (user, chat, None) или (user, None, ошибка); к базе не обращается.
+    """
+    from tgbot.dispatcher import bot
+
+    while True:
+        _limiter.wait()
+        try:
+            return user, bot.get_chat(user.chat_id), None
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is None:
+                return user, None, e
+            logger.warning(f"_get_chat: превышен лимит Telegram, пауза {delay} с")
+            time.sleep(delay)
+
+
+def refresh_profiles(
+    queryset: QuerySet,
+    force: bool = False,
+    progress=None,
+    workers: int = Constants.PROFILE_REFRESH_WORKERS,
+) -> dict:
+    """
+    Обновляет профили пользователей queryset из Telegram.
+    Пользователи, обновлённые за последние Constants.PROFILE_REFRESH_TTL секунд,
+    пропускаются (если не force). get_chat выполняется параллельно в workers
+    потоках в пределах Constants.PROFILE_REFRESH_RATE запросов в секунду,
+    изменения каждой порции сохраняются одним bulk_update.
+    progress — JobProgress фоновой задачи; пропущенные учитываются как выполненные.
+    Возвращает счётчики refreshed, changed, skipped, failed.
+    """
+    from tgbot.handlers.user_helper import apply_chat_profile
+
+    stats = {"refreshed": 0, "changed": 0, "skipped": 0, "failed": 0}
+    total = queryset.count()
+    users = stale_users(queryset, force).order_by("pk")
+
+    last_pk = None
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="profile-refresh") as pool:
+        while True:
+            chunk = list((users if last_pk is None else users.filter(pk__gt=last_pk))[:Constants.PROFILE_REFRESH_CHUNK])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            now = timezone.now()
+            updated = []
+            for user, chat, error in pool.map(_get_chat, chunk):
+                if error is not None:
+                    stats["failed"] += 1
+                    logger.error(f"refresh_profiles: не удалось получить чат {user.chat_id}: {error}")
+                    if progress:
+                        progress.error(f"{user.chat_id}: {error}")
+                    continue
+                if apply_chat_profile(user, chat):
+                    stats["changed"] += 1
+                user.profile_synced_at = now
+                updated.append(user)
+
+            TelegramUser.objects.bulk_update(updated, PROFILE_FIELDS)
+            stats["refreshed"] += len(updated)
+            if progress and updated:
+                progress.ok(len(updated))
+
+    stats["skipped"] = total - stats["refreshed"] - stats["failed"]
+    if progress and stats["skipped"] > 0:
+        progress.ok(stats["skipped"])
+    logger.info(
+        f"refresh_profiles: обновлено {stats['refreshed']} (изменилось {stats['changed']}), "
+        f"пропущено {stats['skipped']}, ошибок {stats['failed']}"
+    )
+    return stats
+
+
+def schedule_profile_refresh() -> Optional[BackgroundJob]:
+    """
+    Раз в сутки, начиная с Constants.PROFILE_REFRESH_HOUR по местному времени,
+    ставит в очередь задачу обновления устаревших профилей.
+    Повторно за тот же день задача не ставится, даже после перезапуска бота.
+    """
+    from tgbot.logics.jobs import enqueue
+
+    now = timezone.localtime()
+    if now.hour < Constants.PROFILE_REFRESH_HOUR:
+        return None
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if BackgroundJob.objects.filter(
+        kind=BackgroundJob.Kind.REFRESH_USERS, payload__stale=True, created_at__gte=today
+    ).exists():
+        return None
+    total = stale_users(TelegramUser.objects.all()).count()
+    return enqueue(BackgroundJob.Kind.REFRESH_USERS, payload={"stale": True}, total=total, created_by="расписание")
@@ -8,9 +8,16 @@ class RandomNumberList:
         self.numbers = list(range(1, self.max_value + 1))
         random.seed(seed)
         random.shuffle(self.numbers)
+        self._indexes = None
 
     def get(self, i: int) -> int:
         index = i % self.max_value
         return self.numbers[index]
+
+    def index_of(self, number: int) -> int | None:
+        """Остаток id по модулю max_value, которому соответствует номер, или None"""
+        if self._indexes is None:
+            self._indexes = {value: index for index, value in enumerate(self.numbers)}
+        return self._indexes.get(number)
     
 random_number_list = RandomNumberList(Constants.NUMBER_LENGTH, Constants.RANDOM_LIST_SEED)
\ No newline at end of file
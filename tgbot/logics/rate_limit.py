@@ -0,0 +1,29 @@
+import threading
+import time
+from typing import Optional
+
+from telebot.apihelper import ApiTelegramException
+
+
+class RateLimiter:
+    """Не больше rate вызовов wait() в секунду на все потоки процесса"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            slot = max(self._next, time.monotonic())
+            self._next = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def retry_after(error: Exception) -> Optional[int]:
+    """Сколько секунд Telegram просит подождать (ответ 429) или None для других ошибок"""
+    if isinstance(error, ApiTelegramException) and error.error_code == 429:
+        return (error.result_json or {}).get("parameters", {}).get("retry_after", 1)
+    return None
@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tgbot.models import Configuration, SentMessage, Task
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+def expired_closed_tasks(days: int, stages=(Task.Stage.CLOSED,)):
+    """
+    Закрытые (по умолчанию) заявки старше days дней.
+    У заявок, закрытых до появления closed_at, возраст считается от created_at.
+    """
+    threshold = timezone.now() - timedelta(days=days)
+    return Task.objects.filter(stage__in=stages).filter(
+        Q(closed_at__lt=threshold) | Q(closed_at__isnull=True, created_at__lt=threshold)
+    )
+
+
+def archive_closed_tasks(
+    days: int,
+    chunk_size: int = Constants.RETENTION_CHUNK_SIZE,
+    pause: float = Constants.RETENTION_PAUSE,
+) -> int:
+    """
+    Переводит закрытые заявки старше days дней в архив порциями по chunk_size,
+    каждая порция — отдельная короткая транзакция.
+    Возвращает число архивированных заявок.
+    """
+    archived = 0
+    while True:
+        ids = list(expired_closed_tasks(days).order_by("id").values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            break
+        archived += Task.objects.filter(id__in=ids, stage=Task.Stage.CLOSED).update(stage=Task.Stage.ARCHIVED)
+        time.sleep(pause)
+
+    if archived:
+        logger.info(f"archive_closed_tasks: в архив переведено {archived} заявок старше {days} дней")
+    return archived
+
+
+def prune_archived_sent_messages(
+    delete_messages: bool = False,
+    chunk_size: int = Constants.RETENTION_CHUNK_SIZE,
+    pause: float = Constants.RETENTION_PAUSE,
+) -> tuple[int, int]:
+    """
+    Удаляет записи SentMessage архивных заявок порциями по chunk_size.
+    При delete_messages в той же транзакции удаление самих сообщений
+    записывается в очередь исходящих операций — её выполняет запущенный бот
+    пачками с общим ограничением скорости.
+    Возвращает (удалено записей, поставлено удалений в очередь).
+    """
+    from tgbot.logics.outbox import record_delete_messages
+
+    pruned = 0
+    queued = 0
+    ledger = SentMessage.objects.filter(task__stage=Task.Stage.ARCHIVED)
+    while True:
+        rows = list(ledger.select_related("telegram_user").order_by("id")[:chunk_size])
+        if not rows:
+            break
+        with transaction.atomic():
+            if delete_messages:
+                queued += len(record_delete_messages(rows))
+            pruned += SentMessage.objects.filter(id__in=[row.id for row in rows]).delete()[0]
+        time.sleep(pause)
+
+    if pruned:
+        logger.info(f"prune_archived_sent_messages: удалено {pruned} записей, удалений в очереди {queued}")
+    return pruned, queued
+
+
+def apply_retention(
+    days: Optional[int] = None,
+    delete_messages: Optional[bool] = None,
+    chunk_size: int = Constants.RETENTION_CHUNK_SIZE,
+) -> dict:
+    """
+    Политика хранения: архивирует закрытые заявки старше срока
+    и чистит журнал отправленных сообщений архивных заявок.
+    Без аргументов срок и удаление сообщений берутся из Configuration.
+    """
+    config = Configuration.get_solo()
+    days = config.task_retention_days if days is None else days
+    delete_messages = config.delete_archived_messages if delete_messages is None else delete_messages
+
+    if not days:
+        logger.info("apply_retention: срок хранения не задан, архивация выключена")
+        return {"archived": 0, "pruned": 0, "queued": 0}
+
+    archived = archive_closed_tasks(days, chunk_size=chunk_size)
+    pruned, queued = prune_archived_sent_messages(delete_messages, chunk_size=chunk_size)
+    return {"archived": archived, "pruned": pruned, "queued": queued}
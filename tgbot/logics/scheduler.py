@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Callable, Union
+
+from tgbot.models import Configuration
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+
+class PeriodicTask:
+    """
+    Периодическое обслуживание: func выполняется раз в interval секунд
+    (число или функция, которая его возвращает — например, из настроек).
+    run_at_start — выполнить сразу при запуске, а не через первый интервал.
+    """
+
+    def __init__(self, name: str, func: Callable, interval: Union[int, Callable[[], int]], run_at_start=True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.last_run = 0.0 if run_at_start else time.monotonic()
+
+    def is_due(self, now: float) -> bool:
+        interval = self.interval() if callable(self.interval) else self.interval
+        return now - self.last_run > interval
+
+    def run_if_due(self):
+        """
+        Выполняет задачу, если подошёл её срок. Ошибка не мешает остальным
+        задачам, а сама задача повторяется через обычный интервал.
+        """
+        now = time.monotonic()
+        try:
+            if not self.is_due(now):
+                return
+            self.func()
+        except Exception as e:
+            logger.exception(f"scheduler: ошибка задачи «{self.name}»: {e}")
+        self.last_run = now
+
+
+def _digest_interval() -> int:
+    return Configuration.get_solo().digest_interval
+
+
+def _reconcile_stats():
+    from tgbot.logics.stats import reconcile_recent
+    reconcile_recent()
+
+
+def default_tasks() -> list[PeriodicTask]:
+    from tgbot.logics.outbox import compact_outbox, flush_digests
+    from tgbot.logics.profile_refresh import schedule_profile_refresh
+
+    return [
+        # заявки в сводку копятся до первой отправки сводок
+        PeriodicTask("сводки заявок", flush_digests, _digest_interval, run_at_start=False),
+        PeriodicTask("сжатие очереди", compact_outbox, Constants.OUTBOX_COMPACT_INTERVAL),
+        PeriodicTask("сверка статистики", _reconcile_stats, Constants.STATS_RECONCILE_INTERVAL),
+        # сама задача обновления выполняется воркером фоновых задач
+        PeriodicTask("ночное обновление профилей", schedule_profile_refresh, Constants.PROFILE_REFRESH_CHECK_INTERVAL),
+    ]
+
+
+def run_scheduler(stop: threading.Event = None, tasks: list[PeriodicTask] = None):
+    """
+    Цикл обслуживания в отдельном потоке: сводки, сжатие очереди, сверка
+    статистики, постановка ночного обновления профилей. Долгая или упавшая
+    задача не задерживает доставку очереди и не мешает остальным задачам.
+    """
+    tasks = default_tasks() if tasks is None else tasks
+    while stop is None or not stop.is_set():
+        for task in tasks:
+            task.run_if_due()
+        time.sleep(Constants.SCHEDULER_POLL_INTERVAL)
@@ -0,0 +1,191 @@
+import datetime
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from tgbot.models import (
+    Configuration,
+    DailyMasterActivity,
+    DailyPaymentStats,
+    DailyStats,
+    Response,
+    Task,
+)
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+# Стадии, в которых заявка считается закрытой
+CLOSED_STAGES = (Task.Stage.CLOSED, Task.Stage.ARCHIVED)
+
+_state = threading.local()
+
+
+@contextmanager
+def rollups_paused():
+    """
+    Отключает обновление сводок в текущем потоке — для удаления данных,
+    которые должны остаться в статистике (перенос в файловый архив).
+    """
+    previous = getattr(_state, "paused", False)
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = previous
+
+
+def rollups_enabled() -> bool:
+    return not getattr(_state, "paused", False)
+
+
+def local_date(value: Optional[datetime.datetime]) -> Optional[datetime.date]:
+    return timezone.localdate(value) if value else None
+
+
+def _day_bounds(date: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    start = timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+    return start, start + timedelta(days=1)
+
+
+def bump_daily(date: datetime.date, **deltas) -> None:
+    """Атомарно прибавляет deltas к счётчикам DailyStats за дату"""
+    DailyStats.objects.get_or_create(date=date)
+    DailyStats.objects.filter(date=date).update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def record_task_created(task: Task, delta: int = 1) -> None:
+    bump_daily(local_date(task.created_at), tasks_created=delta)
+
+
+def record_task_closed(closed_at: datetime.datetime, delta: int = 1) -> None:
+    bump_daily(local_date(closed_at), tasks_closed=delta)
+
+
+def record_response(response: Response, delta: int = 1) -> None:
+    """Учитывает появление (delta=1) или удаление (delta=-1) отклика"""
+    date = local_date(response.created_at)
+    payments = DailyPaymentStats.objects.filter(date=date, payment_type_id=response.payment_type_id)
+    activities = DailyMasterActivity.objects.filter(date=date, telegram_user_id=response.telegram_user_id)
+
+    if delta > 0:
+        DailyPaymentStats.objects.get_or_create(date=date, payment_type_id=response.payment_type_id)
+        payments.update(responses=F("responses") + delta)
+        _, created = DailyMasterActivity.objects.get_or_create(date=date, telegram_user_id=response.telegram_user_id)
+        activities.update(responses=F("responses") + delta)
+        bump_daily(date, responses=delta, unique_masters=1 if created else 0)
+        return
+
+    activity = activities.first()
+    if activity is None:
+        # отклик появился до начала ведения сводок — в них его нет
+        return
+    payments.update(responses=F("responses") + delta)
+    if activity.responses + delta <= 0:
+        activity.delete()
+        bump_daily(date, responses=delta, unique_masters=-1)
+    else:
+        activities.update(responses=F("responses") + delta)
+        bump_daily(date, responses=delta)
+
+
+def today_tasks_created() -> int:
+    """Заявок за сегодня — одна строка сводки, без подсчёта по таблице заявок"""
+    count = (
+        DailyStats.objects
+        .filter(date=timezone.localdate())
+        .values_list("tasks_created", flat=True)
+        .first()
+    )
+    return count or 0
+
+
+def _count_by_day(queryset, field: str, *group_by) -> dict:
+    rows = (
+        queryset
+        .annotate(day=TruncDate(field, tzinfo=timezone.get_current_timezone()))
+        .values("day", *group_by)
+        .annotate(total=Count("id"))
+    )
+    return {tuple(row[key] for key in ("day", *group_by)): row["total"] for row in rows}
+
+
+def reconcile(start: datetime.date, end: Optional[datetime.date] = None) -> int:
+    """
+    Пересчитывает сводки за даты start..end (включительно) по таблицам
+    заявок и откликов и заменяет ими накопленные сигналами значения.
+    Даты, данные за которые уже перенесены в файловый архив, не пересчитываются.
+    Возвращает число пересчитанных дней.
+    """
+    end = end or timezone.localdate()
+    archive_days = Configuration.get_solo().cold_archive_days
+    if archive_days:
+        earliest = timezone.localdate() - timedelta(days=archive_days - 1)
+        if start < earliest:
+            logger.warning(f"reconcile: данные до {earliest} в файловом архиве, сверка начинается с этой даты")
+            start = earliest
+    if start > end:
+        return 0
+
+    range_start, _ = _day_bounds(start)
+    _, range_end = _day_bounds(end)
+
+    # чтение и замена в одной транзакции: отклики, пришедшие во время сверки, не теряются
+    with transaction.atomic():
+        created = _count_by_day(Task.objects.filter(created_at__gte=range_start, created_at__lt=range_end), "created_at")
+        closed = _count_by_day(
+            Task.objects.filter(stage__in=CLOSED_STAGES, closed_at__gte=range_start, closed_at__lt=range_end),
+            "closed_at",
+        )
+        responses = Response.objects.filter(created_at__gte=range_start, created_at__lt=range_end)
+        by_payment = _count_by_day(responses, "created_at", "payment_type_id")
+        by_master = _count_by_day(responses, "created_at", "telegram_user_id")
+
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        now = timezone.now()
+        daily = []
+        for day in days:
+            masters = [count for (date, _), count in by_master.items() if date == day]
+            daily.append(DailyStats(
+                date=day,
+                tasks_created=created.get((day,), 0),
+                tasks_closed=closed.get((day,), 0),
+                responses=sum(masters),
+                unique_masters=len(masters),
+                reconciled_at=now,
+            ))
+
+        DailyStats.objects.filter(date__range=(start, end)).delete()
+        DailyPaymentStats.objects.filter(date__range=(start, end)).delete()
+        DailyMasterActivity.objects.filter(date__range=(start, end)).delete()
+        DailyStats.objects.bulk_create(daily)
+        DailyPaymentStats.objects.bulk_create(
+            DailyPaymentStats(date=day, payment_type_id=payment_type_id, responses=count)
+            for (day, payment_type_id), count in by_payment.items()
+        )
+        DailyMasterActivity.objects.bulk_create(
+            DailyMasterActivity(date=day, telegram_user_id=user_id, responses=count)
+            for (day, user_id), count in by_master.items()
+        )
+
+    logger.info(f"reconcile: сводки за {start}..{end} сверены ({len(days)} дн.)")
+    return len(days)
+
+
+def reconcile_recent(days: int = Constants.STATS_RECONCILE_DAYS) -> int:
+    """Сверяет сводки за последние days дней, включая сегодня"""
+    return reconcile(timezone.localdate() - timedelta(days=days - 1))
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable
+
+from tgbot.models import Tag, Task, TelegramUser
+from tgbot.logics.constants import Constants
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+# Заранее посчитанные получатели: id тэга → id подписанных мастеров,
+# плюс мастера без подписок, которым приходят все заявки
+_recipients_lock = threading.Lock()
+_recipients = {
+    "expires_at": 0.0,
+    "by_tag": {},
+    "unsubscribed": frozenset(),
+}
+
+
+def invalidate_recipient_cache():
+    """Сбрасывает посчитанных получателей, следующая рассылка пересчитает их"""
+    with _recipients_lock:
+        _recipients["expires_at"] = 0.0
+
+
+def _build_recipient_sets():
+    by_tag = defaultdict(set)
+    subscriptions = (
+        TelegramUser.tags.through.objects
+        .filter(telegramuser__blocked=False)
+        .values_list("tag_id", "telegramuser_id")
+    )
+    for tag_id, user_id in subscriptions.iterator():
+        by_tag[tag_id].add(user_id)
+
+    unsubscribed = (
+        TelegramUser.objects
+        .filter(blocked=False, tags__isnull=True)
+        .values_list("id", flat=True)
+    )
+    return {tag_id: frozenset(ids) for tag_id, ids in by_tag.items()}, frozenset(unsubscribed)
+
+
+def _recipient_sets():
+    """
+    Возвращает (получатели по тэгам, мастера без подписок).
+    Пересчитывается не чаще раза в Constants.TAG_RECIPIENTS_TTL секунд:
+    подписки меняются из админки в другом процессе, где сброс кэша сюда не доходит.
+    """
+    with _recipients_lock:
+        if _recipients["expires_at"] > time.monotonic():
+            return _recipients["by_tag"], _recipients["unsubscribed"]
+
+        by_tag, unsubscribed = _build_recipient_sets()
+        _recipients["by_tag"] = by_tag
+        _recipients["unsubscribed"] = unsubscribed
+        _recipients["expires_at"] = time.monotonic() + Constants.TAG_RECIPIENTS_TTL
+        logger.info(f"tags: пересчитаны получатели для {len(by_tag)} тэгов, без подписок {len(unsubscribed)}")
+        return by_tag, unsubscribed
+
+
+def task_recipient_ids(task: Task) -> Iterable[int]:
+    """
+    id мастеров, которым нужно разослать задачу.
+    Заявка без тэгов уходит всем, с тэгами — подписанным хотя бы на один из них
+    и мастерам без подписок.
+    """
+    tag_ids = list(task.tags.values_list("id", flat=True))
+    if not tag_ids:
+        return (
+            TelegramUser.objects
+            .exclude(chat_id=task.creator.chat_id)
+            .exclude(blocked=True)
+            .values_list("id", flat=True)
+            .iterator()
+        )
+
+    by_tag, unsubscribed = _recipient_sets()
+    recipients = set(unsubscribed)
+    for tag_id in tag_ids:
+        recipients |= by_tag.get(tag_id, frozenset())
+    recipients.discard(task.creator_id)
+    return sorted(recipients)
+
+
+def toggle_task_tag(task: Task, tag: Tag) -> bool:
+    """Добавляет или убирает тэг заявки. Возвращает True, если тэг теперь выбран."""
+    if task.tags.filter(id=tag.id).exists():
+        task.tags.remove(tag)
+        return False
+    task.tags.add(tag)
+    return True
+
+
+def toggle_user_tag(user: TelegramUser, tag: Tag) -> bool:
+    """Подписывает мастера на тэг или отписывает. Возвращает True, если подписка есть."""
+    if user.tags.filter(id=tag.id).exists():
+        user.tags.remove(tag)
+        return False
+    user.tags.add(tag)
+    return True
@@ -0,0 +1,126 @@
+import re
+from typing import Optional
+
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+FTS_TABLE = "tgbot_task_fts"
+
+# Индекс с внешним содержимым: текст хранится только в tgbot_task,
+# триггеры поддерживают индекс при любых изменениях, в том числе queryset.update()
+_FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, description, content='tgbot_task', content_rowid='id', tokenize='unicode61')",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON tgbot_task BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON tgbot_task BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON tgbot_task BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+)
+
+_TRIGGERS = (f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au")
+
+# Вес совпадения в названии и в тексте заявки для bm25()
+_RANK_SQL = f"bm25({FTS_TABLE}, 2.0, 1.0)"
+
+# alias базы → доступен ли FTS5
+_available = {}
+
+
+def fts_available(using: str = "default") -> bool:
+    """SQLite собран с FTS5 и индекс заявок создан"""
+    if using not in _available:
+        connection = connections[using]
+        result = False
+        if connection.vendor == "sqlite":
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                    )
+                    result = cursor.fetchone() is not None
+            except Exception as e:
+                logger.warning(f"fts_available: не удалось проверить индекс: {e}")
+        _available[using] = result
+    return _available[using]
+
+
+def ensure_task_fts(using: str = "default") -> bool:
+    """
+    Создаёт FTS5-индекс заявок и триггеры, если их нет.
+    Пересоздание таблицы заявок миграцией удаляет её триггеры — тогда
+    они создаются заново, а индекс перестраивается по текущим данным.
+    Возвращает False, если SQLite собран без FTS5 (поиск остаётся на LIKE).
+    """
+    connection = connections[using]
+    _available.pop(using, None)
+    if connection.vendor != "sqlite":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)", list(_TRIGGERS)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        try:
+            for statement in _FTS_SCHEMA:
+                cursor.execute(statement)
+        except Exception as e:
+            logger.warning(f"ensure_task_fts: FTS5 недоступен, поиск заявок через LIKE: {e}")
+            return False
+
+        if existing != set(_TRIGGERS):
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            logger.info("ensure_task_fts: индекс полнотекстового поиска заявок перестроен")
+    return True
+
+
+def fts_query(term: str) -> Optional[str]:
+    """
+    Запрос FTS5 из введённой строки: каждое слово — префикс, все слова обязательны.
+    Слова берутся в кавычки, поэтому операторы FTS5 в запросе не срабатывают.
+    """
+    words = re.findall(r"\w+", term)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_tasks(queryset: QuerySet, term: str) -> Optional[QuerySet]:
+    """
+    Фильтрует заявки по полнотекстовому индексу и добавляет аннотацию
+    _fts_rank (меньше — релевантнее). None — FTS5 недоступен или в запросе
+    нет слов; тогда вызывающий ищет обычным LIKE.
+    """
+    query = fts_query(term)
+    if query is None or not fts_available(queryset.db):
+        return None
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (query,))
+    ).annotate(
+        _fts_rank=RawSQL(
+            f"SELECT {_RANK_SQL} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = tgbot_task.id",
+            (query,),
+        )
+    )
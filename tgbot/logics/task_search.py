@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models import F
+from telebot.types import InlineQueryResultArticle, InputTextMessageContent
+
+from tgbot.models import Task, TelegramUser
+from tgbot.logics.constants import Constants, Messages
+from tgbot.logics.keyboards import payment_types_keyboard
+from tgbot.logics.random_numbers import random_number_list
+
+from pathlib import Path
+from loguru import logger
+
+# Убедимся, что папка logs существует
+Path("logs").mkdir(parents=True, exist_ok=True)
+
+# Лог-файл будет называться так же, как модуль, например user_helper.py → logs/user_helper.log
+log_filename = Path("logs") / f"{Path(__file__).stem}.log"
+logger.add(str(log_filename), rotation="10 MB", level="INFO")
+
+# (id пользователя, запрос, offset) → (время устаревания, результаты, следующий offset)
+_results_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def invalidate_inline_cache():
+    """
+    Сбрасывает результаты inline-поиска: заявка появилась, изменилась или закрыта.
+    Правки из админки в другом процессе сюда не доходят — там результаты
+    устаревают через Constants.INLINE_CACHE_TTL секунд.
+    """
+    with _cache_lock:
+        _results_cache.clear()
+
+
+def open_tasks(user: TelegramUser, query: str = ""):
+    """
+    Открытые заявки, которые видит мастер: свежие первыми, без его собственных.
+    Запрос из NUMBER_LENGTH цифр ищет по номеру заявки, иначе — по тексту.
+    """
+    queryset = (
+        Task.objects
+        .filter(stage=Task.Stage.CREATED)
+        .exclude(creator=user)
+        .select_related("creator")
+        .order_by("-created_at", "-id")
+    )
+
+    query = query.strip().lstrip("№#").strip()
+    if query.isdigit() and len(query) == Constants.NUMBER_LENGTH:
+        index = random_number_list.index_of(int(query))
+        if index is None:
+            return queryset.none()
+        return queryset.annotate(
+            _number_index=F("id") % random_number_list.max_value
+        ).filter(_number_index=index)
+    if query:
+        return queryset.filter(description__icontains=query)
+    return queryset
+
+
+def _task_result(task: Task) -> InlineQueryResultArticle:
+    description = " ".join(task.description.split())
+    if len(description) > Constants.INLINE_DESCRIPTION_LENGTH:
+        description = description[:Constants.INLINE_DESCRIPTION_LENGTH - 1] + "…"
+    return InlineQueryResultArticle(
+        id=str(task.id),
+        title=Messages.INLINE_TASK_TITLE.format(random_task_number=task.random_task_number),
+        description=description,
+        input_message_content=InputTextMessageContent(
+            task.master_task_text_with_dispather_mention,
+            parse_mode="Markdown",
+        ),
+        reply_markup=payment_types_keyboard(task=task),
+    )
+
+
+def inline_task_results(user: TelegramUser, query: str, offset: int) -> tuple[list, str]:
+    """
+    Страница результатов inline-поиска и offset следующей страницы ("" — страниц больше нет).
+    Одинаковые запросы в течение Constants.INLINE_CACHE_TTL секунд не идут в БД.
+    """
+    key = (user.id, query, offset)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _results_cache.get(key)
+        if cached and cached[0] > now:
+            _results_cache.move_to_end(key)
+            return cached[1], cached[2]
+
+    # берём на одну заявку больше, чтобы узнать, есть ли следующая страница
+    tasks = list(open_tasks(user, query)[offset:offset + Constants.INLINE_PAGE_SIZE + 1])
+    next_offset = str(offset + Constants.INLINE_PAGE_SIZE) if len(tasks) > Constants.INLINE_PAGE_SIZE else ""
+    results = [_task_result(task) for task in tasks[:Constants.INLINE_PAGE_SIZE]]
+
+    with _cache_lock:
+        _results_cache[key] = (now + Constants.INLINE_CACHE_TTL, results, next_offset)
+        _results_cache.move_to_end(key)
+        while len(_results_cache) > Constants.INLINE_CACHE_SIZE:
+            _results_cache.popitem(last=False)
+
+    logger.info(f"inline_task_results: {user.chat_id} '{query}' offset={offset}: {len(results)} заявок")
+    return results, next_offset
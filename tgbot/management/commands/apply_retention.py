@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from tgbot.models import Configuration, SentMessage, Task
+from tgbot.logics.constants import Constants
+from tgbot.logics.retention import apply_retention, expired_closed_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит закрытые заявки старше срока хранения в архив и удаляет записи '
+        'об их сообщениях порциями, не удерживая долгой блокировки на запись. '
+        'По умолчанию срок и удаление сообщений в Telegram берутся из конфигурации.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Срок хранения закрытых заявок в днях')
+        messages = parser.add_mutually_exclusive_group()
+        messages.add_argument(
+            '--delete-messages',
+            action='store_true',
+            dest='delete_messages',
+            default=None,
+            help='Удалять сообщения архивных заявок в Telegram',
+        )
+        messages.add_argument(
+            '--keep-messages',
+            action='store_false',
+            dest='delete_messages',
+            help='Не удалять сообщения в Telegram, только записи о них',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=Constants.RETENTION_CHUNK_SIZE,
+            help='Сколько записей обрабатывать в одной транзакции',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет сделано')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            days = options['days']
+            if days is None:
+                days = Configuration.get_solo().task_retention_days
+            if not days:
+                self.stdout.write("Срок хранения не задан, архивация выключена")
+                return
+            tasks = expired_closed_tasks(days)
+            ledger = SentMessage.objects.filter(task__stage=Task.Stage.ARCHIVED)
+            self.stdout.write(
+                f"Будет архивировано заявок: {tasks.count()}, "
+                f"записей о сообщениях: {ledger.count() + SentMessage.objects.filter(task__in=tasks).count()}"
+            )
+            return
+
+        result = apply_retention(
+            days=options['days'],
+            delete_messages=options['delete_messages'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Архивировано заявок: {result['archived']}, удалено записей о сообщениях: {result['pruned']}, "
+            f"удалений сообщений в очереди: {result['queued']}"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tgbot.data_migrations import fill_sent_message_ledger, missing_sent_message_links
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что связи из старых таблиц Task/Files/Response.sent_messages перенесены '
+        'в журнал SentMessage. Только после успешной проверки старые поля sent_messages '
+        'можно удалять из моделей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fill',
+            action='store_true',
+            help='Сначала перенести оставшиеся связи (то же, что выполняется после migrate)',
+        )
+
+    def handle(self, *args, **options):
+        if options['fill']:
+            moved = fill_sent_message_ledger(connection)
+            self.stdout.write(f"Перенесено связей: {moved}")
+
+        missing = missing_sent_message_links(connection)
+        for table, count in missing.items():
+            self.stdout.write(f"{table}\tне перенесено: {count}")
+        if any(missing.values()):
+            raise CommandError("Перенос не завершён: старые поля sent_messages удалять нельзя")
+        self.stdout.write(self.style.SUCCESS("Все связи перенесены в журнал SentMessage"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from tgbot.models import Configuration, Task
+from tgbot.logics.cold_archive import archive_old_tasks
+from tgbot.logics.constants import Constants
+from tgbot.logics.retention import expired_closed_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит закрытые заявки старше заданного срока вместе с откликами и файлами '
+        'из базы в сжатые файлы архива по месяцам; в базе остаётся индекс для поиска '
+        'по ID и номеру заявки. Сообщения в Telegram не удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Переносить заявки, закрытые раньше стольких дней назад (по умолчанию — из конфигурации)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=Constants.COLD_ARCHIVE_CHUNK_SIZE,
+            help='Сколько заявок переносить за одну транзакцию',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, сколько заявок будет перенесено')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            days = options['days']
+            if days is None:
+                days = Configuration.get_solo().cold_archive_days
+            if not days:
+                self.stdout.write("Срок не задан, перенос в файловый архив выключен")
+                return
+            count = expired_closed_tasks(days, stages=(Task.Stage.CLOSED, Task.Stage.ARCHIVED)).count()
+            self.stdout.write(f"Будет перенесено заявок: {count}")
+            return
+
+        total = archive_old_tasks(days=options['days'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Перенесено в файловый архив заявок: {total}"))
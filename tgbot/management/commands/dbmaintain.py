@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tgbot.logics import db_maintenance
+from tgbot.logics.constants import Constants
+
+
+def _size(value) -> str:
+    if value is None:
+        return "—"
+    for unit in ("Б", "КБ", "МБ"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ГБ"
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание базы SQLite: ANALYZE, инкрементальная очистка свободных страниц, '
+        'проверка целостности, перенос WAL и отчёт о размерах таблиц и индексов. '
+        'Все шаги берут блокировку на запись ненадолго, запускать можно при работающем боте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-analyze', action='store_true', help='Не обновлять статистику планировщика')
+        parser.add_argument(
+            '--analysis-limit',
+            type=int,
+            default=Constants.DB_ANALYSIS_LIMIT,
+            help='PRAGMA analysis_limit для ANALYZE (0 — без ограничения)',
+        )
+        parser.add_argument('--skip-vacuum', action='store_true', help='Не освобождать свободные страницы')
+        parser.add_argument(
+            '--vacuum-pages',
+            type=int,
+            default=Constants.DB_VACUUM_PAGES,
+            help='Сколько страниц освобождать за один шаг incremental_vacuum',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum',
+            action='store_true',
+            help='Перевести файл в auto_vacuum=INCREMENTAL полным VACUUM (только при остановленном боте)',
+        )
+        parser.add_argument('--skip-check', action='store_true', help='Не проверять целостность')
+        parser.add_argument('--full-check', action='store_true', help='integrity_check вместо quick_check')
+        parser.add_argument(
+            '--checkpoint',
+            choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+            default='PASSIVE',
+            help='Режим wal_checkpoint (PASSIVE не ждёт бота)',
+        )
+        parser.add_argument('--report-only', action='store_true', help='Только показать размеры')
+
+    def handle(self, *args, **options):
+        before = db_maintenance.database_summary()
+
+        if not options['report_only']:
+            self._maintain(options)
+
+        self._report(before)
+
+    def _maintain(self, options):
+        if options['enable_incremental_vacuum']:
+            db_maintenance.enable_incremental_vacuum()
+            self.stdout.write("auto_vacuum=INCREMENTAL, выполнен VACUUM")
+
+        if not options['skip_analyze']:
+            elapsed = db_maintenance.analyze(options['analysis_limit'])
+            self.stdout.write(f"ANALYZE: {elapsed:.2f} с")
+
+        if not options['skip_vacuum']:
+            freed = db_maintenance.incremental_vacuum(options['vacuum_pages'])
+            if freed is None:
+                self.stdout.write(self.style.WARNING(
+                    "incremental_vacuum пропущен: auto_vacuum не INCREMENTAL "
+                    "(один раз запустите с --enable-incremental-vacuum при остановленном боте)"
+                ))
+            else:
+                self.stdout.write(f"incremental_vacuum: освобождено страниц: {freed}")
+
+        busy, log_pages, checkpointed = db_maintenance.wal_checkpoint(options['checkpoint'])
+        if log_pages < 0:
+            self.stdout.write("wal_checkpoint: база не в режиме WAL")
+        else:
+            self.stdout.write(f"wal_checkpoint({options['checkpoint']}): в WAL {log_pages}, перенесено {checkpointed}"
+                              + (", часть страниц занята" if busy else ""))
+
+        if not options['skip_check']:
+            problems = db_maintenance.check_integrity(full=options['full_check'])
+            if problems:
+                for problem in problems:
+                    self.stderr.write(problem)
+                raise CommandError(f"Проверка целостности: найдено проблем: {len(problems)}")
+            self.stdout.write(self.style.SUCCESS("Проверка целостности: ok"))
+
+    def _report(self, before):
+        after = db_maintenance.database_summary()
+        self.stdout.write("")
+        self.stdout.write(
+            f"Файл: {_size(after['size'])} (было {_size(before['size'])}), "
+            f"свободно {_size(after['free'])}, journal_mode={after['journal_mode']}, "
+            f"auto_vacuum={after['auto_vacuum']}"
+        )
+        self.stdout.write(f"{'Таблица / индекс':<64} {'Строк':>10} {'Размер':>10}")
+        for table in db_maintenance.table_report():
+            self.stdout.write(f"{table['name']:<64} {table['rows']:>10} {_size(table['size']):>10}")
+            for index in table['indexes']:
+                self.stdout.write(f"  {index['name']:<62} {'':>10} {_size(index['size']):>10}")
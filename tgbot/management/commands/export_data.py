@@ -0,0 +1,50 @@
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tgbot.logics.constants import Constants
+from tgbot.logics.export import EXPORTS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает заявки, отклики, пользователей или отправленные сообщения '
+        'в CSV или JSONL порциями, не загружая таблицу в память. '
+        'Бот при этом может продолжать работать.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(EXPORTS), help='Что выгрузить')
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, default='csv', help='Формат выгрузки')
+        parser.add_argument('--output', '-o', default='-', help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--since', help='Только записи, созданные с этой даты (ГГГГ-ММ-ДД)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=Constants.EXPORT_CHUNK_SIZE,
+            help='Строк за один запрос к базе',
+        )
+
+    def handle(self, *args, **options):
+        queryset = EXPORTS[options['model']].model.objects.all()
+        if options['since']:
+            try:
+                since = datetime.date.fromisoformat(options['since'])
+            except ValueError as e:
+                raise CommandError(f"Неверная дата: {e}")
+            start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+            queryset = queryset.filter(created_at__gte=start)
+
+        lines = export_lines(queryset, options['fmt'], options['chunk_size'])
+        if options['output'] == '-':
+            sys.stdout.writelines(lines)
+            return
+
+        rows = -1 if options['fmt'] == 'csv' else 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for line in lines:
+                output.write(line)
+                rows += 1
+        self.stdout.write(self.style.SUCCESS(f"Выгружено строк: {rows} → {options['output']}"))
@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tgbot.logics.constants import Constants
+from tgbot.logics.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает дневную статистику (заявки, отклики, мастера, типы оплаты) '
+        'по таблицам и исправляет значения, накопленные сигналами. '
+        'Запущенный бот делает это сам за последние дни раз в час.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=Constants.STATS_RECONCILE_DAYS,
+            help='Сверить последние N дней, включая сегодня',
+        )
+        parser.add_argument('--from', dest='date_from', help='Начальная дата (ГГГГ-ММ-ДД)')
+        parser.add_argument('--to', dest='date_to', help='Конечная дата (ГГГГ-ММ-ДД), по умолчанию сегодня')
+
+    def handle(self, *args, **options):
+        try:
+            date_to = datetime.date.fromisoformat(options['date_to']) if options['date_to'] else timezone.localdate()
+            if options['date_from']:
+                date_from = datetime.date.fromisoformat(options['date_from'])
+            else:
+                date_from = date_to - datetime.timedelta(days=options['days'] - 1)
+        except ValueError as e:
+            raise CommandError(f"Неверная дата: {e}")
+
+        days = reconcile(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"Сверено дней: {days}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from tgbot.logics.constants import Constants
+from tgbot.logics.profile_refresh import refresh_profiles, stale_users
+from tgbot.models import TelegramUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет имена и username пользователей из Telegram. '
+        'Профили, обновлённые за последние сутки, пропускаются. '
+        'Запущенный бот делает это сам каждую ночь.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Обновить и недавно обновлённые профили',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Обновить не больше указанного числа пользователей',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=Constants.PROFILE_REFRESH_WORKERS,
+            help='Число параллельных запросов к Telegram',
+        )
+
+    def handle(self, *args, **options):
+        queryset = TelegramUser.objects.all()
+        if options['limit'] is not None:
+            user_ids = stale_users(queryset, options['force']).order_by('pk').values_list('pk', flat=True)
+            queryset = TelegramUser.objects.filter(pk__in=list(user_ids[:options['limit']]))
+
+        stats = refresh_profiles(queryset, force=options['force'], workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Обновлено: {stats['refreshed']} (изменилось {stats['changed']}), "
+            f"пропущено: {stats['skipped']}, ошибок: {stats['failed']}"
+        ))
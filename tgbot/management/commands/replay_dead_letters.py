@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from tgbot.models import DeadLetter, OutboxMessage
+from tgbot.logics.dead_letters import replay_dead_letters
+
+
+class Command(BaseCommand):
+    help = (
+        'Повторно ставит неотправленные операции в очередь исходящих операций. '
+        'По умолчанию их выполнит запущенный бот с общим ограничением скорости.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--error-class',
+            action='append',
+            dest='error_classes',
+            default=[],
+            help='Повторять только операции с этим классом ошибки (можно указать несколько раз)',
+        )
+        parser.add_argument(
+            '--operation',
+            choices=OutboxMessage.Operation.values,
+            help='Повторять только операции этого типа',
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Максимальное количество операций')
+        parser.add_argument(
+            '--now',
+            action='store_true',
+            help='Выполнить операции сразу в этом процессе, не дожидаясь бота',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет повторено')
+
+    def handle(self, *args, **options):
+        queryset = DeadLetter.objects.filter(replayed_at__isnull=True).order_by('id')
+        if options['error_classes']:
+            queryset = queryset.filter(error_class__in=options['error_classes'])
+        if options['operation']:
+            queryset = queryset.filter(operation=options['operation'])
+        if options['limit']:
+            queryset = DeadLetter.objects.filter(id__in=list(queryset.values_list('id', flat=True)[:options['limit']]))
+
+        if options['dry_run']:
+            for letter in queryset.iterator():
+                self.stdout.write(f"{letter.id}\t{letter.operation}\t{letter.chat_id}\t{letter.error_class}\t{letter.attempts}")
+            self.stdout.write(f"Всего: {queryset.count()}")
+            return
+
+        outbox_ids, skipped = replay_dead_letters(queryset)
+        self.stdout.write(f"Поставлено в очередь: {len(outbox_ids)}, пропущено: {skipped}")
+
+        if options['now'] and outbox_ids:
+            from tgbot.logics.outbox import deliver_outbox
+            deliver_outbox(OutboxMessage.objects.filter(id__in=outbox_ids))
+            done = OutboxMessage.objects.filter(id__in=outbox_ids, status=OutboxMessage.Status.DONE).count()
+            self.stdout.write(self.style.SUCCESS(f"Выполнено: {done} из {len(outbox_ids)}"))
@@ -0,0 +1,41 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from tgbot.logics.constants import Constants
+from tgbot.logics.jobs import release_jobs, run_job_worker, worker_prefix
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи админки (обновление профилей, рассылки, SSH). '
+        'Запущенный бот выполняет их сам; команда нужна, чтобы разбирать очередь '
+        'отдельным процессом или когда бот остановлен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=Constants.JOB_WORKERS,
+            help='Число потоков-воркеров',
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=run_job_worker, args=(stop,), name=f"runjobs-{number + 1}", daemon=True)
+            for number in range(max(options['workers'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(f"Воркеров запущено: {len(threads)}. Остановка — Ctrl+C"))
+
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            stop.set()
+            # прерванные задачи сразу возвращаются в очередь и продолжатся с того же места
+            released = release_jobs(worker_prefix())
+            self.stdout.write(f"Остановлено, возвращено в очередь задач: {released}")
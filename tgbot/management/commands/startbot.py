@@ -9,8 +9,14 @@ from pathlib import Path
 
 from django.core.management.base import BaseCommand
 from tgbot import dispatcher
-from tgbot.models import Configuration
+from tgbot.dispatcher import SyncBot
+from tgbot.logics.bot_identity import warm_up_identities
+from tgbot.logics.commands import init_bot_commands
+from tgbot.logics.constants import Constants
 from tgbot.logics.info_for_admins import send_messege_to_admins
+from tgbot.logics.jobs import run_job_worker
+from tgbot.logics.outbox import run_outbox_dispatcher
+from tgbot.logics.scheduler import run_scheduler
 from loguru import logger
 
 # Создаём папку для логов
@@ -20,19 +26,79 @@ logger.add(str(log_filename), rotation="10 MB", level="INFO")
 
 _main_thread = None
 _test_thread = None
+_watch_thread = None
+_outbox_thread = None
+_scheduler_thread = None
+_job_threads = []
+
+MAIN_BOT = "main"
+TEST_BOT = "test"
+
+# Токены, на которые нужно переключить ботов после остановки их polling
+_pending_tokens = {}
+_pending_lock = threading.Lock()
+
+# Установлен, пока включён тестовый режим и тестовый бот должен отвечать
+_test_mode_enabled = threading.Event()
+
+
+def _schedule_token(name: str, bot: SyncBot, token: str):
+    """Запоминает новый токен и останавливает polling, чтобы поток бота его применил"""
+    with _pending_lock:
+        _pending_tokens[name] = token
+    bot.stop_polling()
+
+
+def _apply_pending_token(name: str, bot: SyncBot) -> bool:
+    """Переключает бота на отложенный токен, если он есть"""
+    with _pending_lock:
+        token = _pending_tokens.pop(name, None)
+    if token is None:
+        return False
+    bot.reload_token(token)
+    try:
+        init_bot_commands(bot)
+    except Exception as e:
+        logger.error(f"Не удалось установить команды бота {bot.bot_id}: {e}")
+    return True
+
+
+def _register_test_bot_handlers(test_bot: SyncBot):
+    """Тестовый бот отвечает всем сообщением о технических работах"""
+    @test_bot.message_handler(func=lambda m: True)
+    def handle_all_messages(message):  # noqa: F811
+        from tgbot.handlers.user_helper import is_group_chat
+        if is_group_chat(message):
+            return
+        test_bot.reply_to(
+            message,
+            "⚠️ *Технические работы*",
+            parse_mode="Markdown"
+        )
+
+
+def _create_test_bot(token: str) -> SyncBot:
+    test_bot = SyncBot(token)
+    init_bot_commands(test_bot)
+    _register_test_bot_handlers(test_bot)
+    logger.info("Тестовый бот создан")
+    return test_bot
+
 
 def _run_main_bot():
     """Цикл polling для основного бота"""
-    from tgbot.handlers import commands, message_handler, utils  # noqa: F401
+    from tgbot.handlers import commands, inline_query, message_handler, utils  # noqa: F401
 
     while True:
         try:
             logger.info('Основной бот polling запущен')
+            # Пропускаем накопившиеся апдейты только при самом первом запуске,
+            # дальше продолжаем с сохранённого в БД offset
             dispatcher.bot.polling(
                 none_stop=True,
                 interval=0,
                 timeout=20,
-                skip_pending=True
+                skip_pending=not dispatcher.bot.has_stored_offset
             )
         except Exception as e:
             logger.error(f"Ошибка в основном боте: {e}\n{traceback.format_exc()}")
@@ -41,72 +107,133 @@ def _run_main_bot():
             )
             dispatcher.bot.stop_polling()
             time.sleep(1)
+            _apply_pending_token(MAIN_BOT, dispatcher.bot)
             logger.info("Перезапуск основного бота...")
         else:
-            break
+            # polling остановлен для смены токена — продолжаем с новым
+            if not _apply_pending_token(MAIN_BOT, dispatcher.bot):
+                break
+            logger.info("Основной бот переключён на новый токен")
 
     logger.info("Поток основного бота завершён")
 
 
 def _run_test_bot():
     """Цикл polling для тестового бота (только в test_mode)"""
-    if dispatcher.test_bot is None:
-        logger.warning("Тестовый бот не инициализирован, поток завершён")
-        return
-
     while True:
+        # ждём включения тестового режима вместо опроса конфигурации
+        _test_mode_enabled.wait()
+        test_bot = dispatcher.test_bot
+        if test_bot is None:
+            _test_mode_enabled.clear()
+            continue
+        _apply_pending_token(TEST_BOT, test_bot)
+
         try:
-            if Configuration.get_solo().test_mode:
-                logger.info('Тестовый бот polling запущен')
-
-                @dispatcher.test_bot.message_handler(func=lambda m: True)
-                def handle_all_messages(message):  # noqa: F811
-                    from tgbot.handlers.user_helper import is_group_chat
-                    if is_group_chat(message):
-                        return
-                    dispatcher.test_bot.reply_to(
-                        message,
-                        "⚠️ *Технические работы*",
-                        parse_mode="Markdown"
-                    )
-
-                dispatcher.test_bot.polling(
-                    none_stop=True,
-                    interval=0,
-                    timeout=20,
-                    skip_pending=True
-                )
-            else:
-                time.sleep(1)
+            logger.info('Тестовый бот polling запущен')
+            test_bot.polling(
+                none_stop=True,
+                interval=0,
+                timeout=20,
+                skip_pending=True
+            )
         except Exception as e:
             logger.error(f"Ошибка в тестовом боте: {e}\n{traceback.format_exc()}")
-            dispatcher.test_bot.stop_polling()
+            test_bot.stop_polling()
             time.sleep(1)
             logger.info("Перезапуск тестового бота...")
         else:
-            break
+            logger.info("Тестовый бот polling остановлен")
+
+
+def _sync_test_mode(test_mode: bool):
+    """Запускает или останавливает polling тестового бота"""
+    if test_mode and dispatcher.test_bot is not None:
+        if not _test_mode_enabled.is_set():
+            logger.info("Тестовый режим включён")
+            _test_mode_enabled.set()
+    elif _test_mode_enabled.is_set():
+        logger.info("Тестовый режим выключен")
+        _test_mode_enabled.clear()
+        if dispatcher.test_bot is not None:
+            dispatcher.test_bot.stop_polling()
 
-    logger.info("Поток тестового бота завершён")
+
+def _watch_configuration():
+    """
+    Следит за изменениями конфигурации и токенов и переключает ботов на лету,
+    без перезапуска процесса: очередь исходящих сообщений дорабатывается,
+    обработчики и кэши сохраняются.
+    """
+    current = dispatcher.resolve_bot_tokens()
+    _sync_test_mode(current[2])
+
+    while True:
+        time.sleep(Constants.CONFIG_WATCH_INTERVAL)
+        try:
+            main_token, test_token, test_mode = dispatcher.resolve_bot_tokens()
+        except Exception as e:
+            logger.error(f"Не удалось прочитать конфигурацию ботов: {e}")
+            continue
+
+        if (main_token, test_token, test_mode) == current:
+            continue
+        logger.info("Конфигурация ботов изменилась, применяем без перезапуска")
+
+        if main_token != current[0]:
+            _schedule_token(MAIN_BOT, dispatcher.bot, main_token)
+
+        if test_token != current[1]:
+            if not test_token:
+                _sync_test_mode(False)
+            elif dispatcher.test_bot is None:
+                dispatcher.test_bot = _create_test_bot(test_token)
+            else:
+                _schedule_token(TEST_BOT, dispatcher.test_bot, test_token)
+
+        _sync_test_mode(test_mode and bool(test_token))
+        current = (main_token, test_token, test_mode)
 
 
 def start_bots():
     """Запустить или перезапустить оба бота"""
-    global _main_thread, _test_thread
+    global _main_thread, _test_thread, _watch_thread, _outbox_thread, _scheduler_thread, _job_threads
+
+    if dispatcher.test_bot is not None:
+        _register_test_bot_handlers(dispatcher.test_bot)
+    else:
+        logger.warning("Тестовый бот не инициализирован, будет создан при появлении токена")
+
+    # данные ботов для админки запрашиваются у Telegram один раз при запуске, в фоне
+    warm_up_identities()
 
     logger.info("Запуск потоков ботов")
     _main_thread = threading.Thread(target=_run_main_bot, daemon=True)
     _test_thread = threading.Thread(target=_run_test_bot, daemon=True)
+    _watch_thread = threading.Thread(target=_watch_configuration, daemon=True)
+    _outbox_thread = threading.Thread(target=run_outbox_dispatcher, daemon=True)
+    # сводки, сжатие очереди, сверка статистики и ночное обновление профилей —
+    # отдельно от доставки очереди
+    _scheduler_thread = threading.Thread(target=run_scheduler, name="scheduler", daemon=True)
+    # воркеры фоновых задач админки (рассылки, обновление профилей, SSH)
+    _job_threads = [
+        threading.Thread(target=run_job_worker, name=f"jobs-{number + 1}", daemon=True)
+        for number in range(Constants.JOB_WORKERS)
+    ]
     _main_thread.start()
     _test_thread.start()
+    _watch_thread.start()
+    _outbox_thread.start()
+    _scheduler_thread.start()
+    for thread in _job_threads:
+        thread.start()
 
 class Command(BaseCommand):
     help = 'Запускает два бота на платформе Telegram'
 
     def handle(self, *args, **options):
         start_bots()
-        # Блокируем основной процесс, пока потоки работают
-        global _main_thread, _test_thread
+        # Блокируем основной процесс, пока работает основной бот
+        global _main_thread
         if _main_thread:
             _main_thread.join()
-        if _test_thread:
-            _test_thread.join()
@@ -2,6 +2,7 @@ import json
 import os
 import uuid
 import re
+from datetime import timedelta
 from decimal import Decimal
 from django.db import models
 from django.db.models import F, QuerySet
@@ -38,6 +39,36 @@ class Configuration(SingletonModel):
         default=False,
         verbose_name='Автоматически разрешать пользователям давать и принимать заявки'
     )
+    copy_task_media = models.BooleanField(
+        default=False,
+        verbose_name='Копировать вложения заявок',
+        help_text='Вложения копируются из сообщений диспетчера одним вызовом на чат вместо отправки каждого файла'
+    )
+    push_new_tasks = models.BooleanField(
+        default=True,
+        verbose_name='Рассылать новые заявки мастерам',
+        help_text='Если выключено, мастера находят открытые заявки сами через inline-режим (@бот запрос)'
+    )
+    digest_interval = models.PositiveIntegerField(
+        default=60,
+        verbose_name='Интервал сводки заявок (сек)',
+        help_text='Как часто мастерам в режиме сводки отправляются накопленные заявки'
+    )
+    task_retention_days = models.PositiveIntegerField(
+        default=30,
+        verbose_name='Срок хранения закрытых заявок (дней)',
+        help_text='Закрытые раньше заявки переводятся в архив, записи об их сообщениях удаляются. 0 — не архивировать'
+    )
+    delete_archived_messages = models.BooleanField(
+        default=False,
+        verbose_name='Удалять сообщения архивных заявок в Telegram',
+        help_text='Сообщения удаляются через очередь исходящих операций с общим ограничением скорости бота'
+    )
+    cold_archive_days = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Перенос в файловый архив (дней)',
+        help_text='Закрытые раньше заявки с откликами и файлами переносятся из базы в сжатые файлы. 0 — не переносить'
+    )
 
     class Meta:
         verbose_name = 'Конфигурация'
@@ -71,6 +102,36 @@ class TelegramBotToken(models.Model):
         verbose_name_plural = 'Токены ботов'
 
 
+class BotUpdateOffset(models.Model):
+    """
+    Последний обработанный update_id для каждого бота.
+    Позволяет после перезапуска продолжить polling с того же места,
+    не пропуская и не обрабатывая повторно апдейты.
+    """
+    bot_id = models.BigIntegerField(unique=True, verbose_name='ID бота')
+    last_update_id = models.BigIntegerField(default=0, verbose_name='Последний обработанный update_id')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f"{self.bot_id}: {self.last_update_id}"
+
+    @staticmethod
+    def get_offset(bot_id: int) -> int | None:
+        obj = BotUpdateOffset.objects.filter(bot_id=bot_id).first()
+        return obj.last_update_id if obj else None
+
+    @staticmethod
+    def set_offset(bot_id: int, update_id: int):
+        BotUpdateOffset.objects.update_or_create(
+            bot_id=bot_id,
+            defaults={'last_update_id': update_id}
+        )
+
+    class Meta:
+        verbose_name = 'Смещение обновлений бота'
+        verbose_name_plural = 'Смещения обновлений ботов'
+
+
 class Server(SingletonModel):
     """
     Сингл модель для хранения параметров сервера.
@@ -116,8 +177,27 @@ class SSHKey(models.Model):
         verbose_name_plural = 'SSH ключи'
 
 
+class Tag(models.Model):
+    """Тэг (район, вид работ) для адресной рассылки заявок"""
+    name = models.CharField(max_length=50, unique=True, verbose_name='Название')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Тэг'
+        verbose_name_plural = 'Тэги'
+        ordering = ['name']
+
+
 class TelegramUser(models.Model):
     """Модель пользователя Telegram"""
+    class MentionState(models.TextChoices):
+        UNKNOWN = 'unknown', 'Не проверено'
+        OK = 'ok', 'Работает'
+        FAILED = 'failed', 'Не работает'
+
     chat_id = models.BigIntegerField(unique=True, verbose_name='Chat ID')
     first_name = models.CharField(max_length=255, blank=True, null=True, verbose_name='Имя')
     last_name = models.CharField(max_length=255, blank=True, null=True, verbose_name='Фамилия')
@@ -130,10 +210,34 @@ class TelegramUser(models.Model):
     send_admin_notifications = models.BooleanField(default=False, verbose_name='Оповещения об ошибках')
     is_admin = models.BooleanField(default=False, verbose_name='Администратор')
     admin_signature = models.CharField(max_length=255, blank=True, null=True, verbose_name='Подпись администратора', help_text='Если пользователь является администратором, эта подпись будет отображаться в сообщениях, отправляемых им.')
+    mention_state = models.CharField(
+        max_length=10,
+        choices=MentionState.choices,
+        default=MentionState.UNKNOWN,
+        verbose_name='Упоминание по имени',
+        help_text='Получается ли упомянуть пользователя без username (зависит от настроек приватности)'
+    )
+    mention_checked_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата проверки упоминания')
+    profile_synced_at = models.DateTimeField(null=True, blank=True, verbose_name='Профиль обновлён из Telegram')
+    digest_mode = models.BooleanField(
+        default=False,
+        verbose_name='Заявки сводкой',
+        help_text='Новые заявки приходят одним сообщением раз в интервал сводки, полная заявка — по кнопке'
+    )
+    tags = models.ManyToManyField(
+        Tag,
+        blank=True,
+        related_name='subscribers',
+        verbose_name='Подписки на тэги',
+        help_text='Заявки с выбранными тэгами. Если ничего не выбрано, приходят все заявки.'
+    )
     
     def __str__(self):
         return f"{self.first_name} {self.last_name or ''} (@{self.username})"
 
+    # поля, от которых зависят посчитанные получатели рассылки (tgbot/logics/tags.py)
+    RECIPIENT_FIELDS = ('blocked', 'bot_was_blocked')
+
     @staticmethod
     def get_user_by_chat_id(chat_id: int):
         try:
@@ -141,9 +245,54 @@ class TelegramUser(models.Model):
         except TelegramUser.DoesNotExist:
             return None
 
+    def mention_is_broken(self) -> bool:
+        """
+        Упоминание точно не сработает: username нет, а последняя проверка,
+        не старше Constants.MENTION_STATE_TTL, не удалась.
+        """
+        if self.username or self.mention_state != self.MentionState.FAILED or not self.mention_checked_at:
+            return False
+        return timezone.now() - self.mention_checked_at < timedelta(seconds=Constants.MENTION_STATE_TTL)
+
+    def remember_mention_state(self, works: bool):
+        """
+        Сохраняет результат проверки упоминания без сигналов сохранения пользователя.
+        При рассылке проверка повторяется на каждом мастере — неизменившийся
+        результат записывается не чаще раза в Constants.MENTION_STATE_REFRESH секунд.
+        """
+        state = self.MentionState.OK if works else self.MentionState.FAILED
+        now = timezone.now()
+        if (
+            state == self.mention_state
+            and self.mention_checked_at
+            and now - self.mention_checked_at < timedelta(seconds=Constants.MENTION_STATE_REFRESH)
+        ):
+            return
+        self.mention_state = state
+        self.mention_checked_at = now
+        TelegramUser.objects.filter(pk=self.pk).update(
+            mention_state=self.mention_state,
+            mention_checked_at=self.mention_checked_at,
+        )
+
     class Meta:
         verbose_name = 'Пользователь Telegram'
         verbose_name_plural = 'Пользователи Telegram'
+        indexes = [
+            # заблокированные — частичный индекс: SQLite сравнивает булево поле
+            # без "= 1", и обычный индекс по blocked планировщик не использует
+            models.Index(
+                fields=['blocked'],
+                condition=models.Q(blocked=True),
+                name='tguser_blocked_idx',
+            ),
+            # уведомления администраторам — частичный индекс только по тем, кто их получает
+            models.Index(
+                fields=['send_admin_notifications'],
+                condition=models.Q(send_admin_notifications=True),
+                name='tguser_admin_notify_idx',
+            ),
+        ]
 
 class PaymentTypeModel(models.Model):
     """Модель типа оплаты"""
@@ -159,10 +308,47 @@ class PaymentTypeModel(models.Model):
 
 
 class SentMessage(models.Model):
+    """
+    Журнал сообщений, отправленных ботом по заявкам.
+    Сообщение с текстом заявки, с её файлом или с откликом — одна строка,
+    все строки заявки находятся по task, поэтому поиск и очистка идут по индексу.
+    Строки заявки — task.message_ledger, файла — file.message_ledger,
+    отклика — response.message_ledger.
+    """
+    class Kind(models.TextChoices):
+        TASK = 'task', 'Заявка'
+        FILE = 'file', 'Файл'
+        RESPONSE = 'response', 'Отклик'
+
     message_id = models.IntegerField(verbose_name='ID сообщения')
     telegram_user = models.ForeignKey(
         'TelegramUser', on_delete=models.CASCADE, null=True, blank=True, verbose_name='Пользователь'
     )
+    kind = models.CharField(max_length=10, choices=Kind.choices, default=Kind.TASK, verbose_name='Тип')
+    task = models.ForeignKey(
+        'Task',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='message_ledger',
+        verbose_name='Задание'
+    )
+    file = models.ForeignKey(
+        'Files',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='message_ledger',
+        verbose_name='Файл'
+    )
+    response = models.ForeignKey(
+        'Response',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='message_ledger',
+        verbose_name='Отклик'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
 
     def __str__(self):
@@ -171,13 +357,19 @@ class SentMessage(models.Model):
     class Meta:
         verbose_name = 'Отправленное сообщение'
         verbose_name_plural = 'Отправленные сообщения'
+        indexes = [
+            models.Index(fields=['task', 'telegram_user', 'created_at'], name='sentmsg_task_user_created_idx'),
+            models.Index(fields=['telegram_user', 'message_id'], name='sentmsg_user_message_idx'),
+            models.Index(fields=['created_at'], name='sentmsg_created_idx'),
+        ]
 
 class Task(models.Model):
     """Модель задания"""
     class Stage(models.TextChoices):
-        #PENDING_TAG = 'pending_tag', 'В ожидании выбора тэга'
+        PENDING_TAG = 'pending_tag', 'В ожидании выбора тэга'
         CREATED = 'created', 'Создано'
         CLOSED = 'closed', 'Задание закрыто'
+        ARCHIVED = 'archived', 'В архиве'
     title = models.CharField(max_length=255, verbose_name='Название')
     description = models.TextField(verbose_name='Текст задания')
     creator = models.ForeignKey(
@@ -198,30 +390,74 @@ class Task(models.Model):
         verbose_name='Этап задания'
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    closed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата закрытия')
+    # Старая связь с отправленными сообщениями. Данные перенесены в журнал SentMessage
+    # (tgbot.data_migrations, после каждого migrate), код её не использует. Поле удаляется
+    # отдельным выпуском, когда manage.py check_sent_message_ledger подтвердит перенос.
     sent_messages = models.ManyToManyField(
         SentMessage,
         blank=True,
+        editable=False,
         related_name="tasks",
         verbose_name="Отправленные сообщения"
     )
+    tags = models.ManyToManyField(
+        Tag,
+        blank=True,
+        related_name='tasks',
+        verbose_name='Тэги',
+        help_text='Заявка рассылается только подписанным на эти тэги мастерам. Без тэгов — всем.'
+    )
 
     def __str__(self):
         return self.title
+
+    # поля, прежние значения которых нужны сигналам сводок (tgbot/signals.py)
+    STATS_FIELDS = ('stage', 'closed_at')
+    # поля, которые показывают результаты inline-поиска (tgbot/logics/task_search.py)
+    SEARCH_FIELDS = ('stage', 'title', 'description')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминает загруженные этап и дату закрытия: сохранение сравнивает с ними без SELECT"""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if all(name in loaded for name in cls.STATS_FIELDS):
+            instance._stats_loaded = {name: loaded[name] for name in cls.STATS_FIELDS}
+        return instance
     
     @property
     def random_task_number(self):
         number = random_number_list.get(self.id)
         return f"{number:0{Constants.NUMBER_LENGTH}}"
 
+    @staticmethod
+    def responses_prefetch():
+        """Prefetch откликов в том виде, в котором они нужны для текстов задания"""
+        return models.Prefetch(
+            'responses',
+            queryset=Response.objects.select_related('telegram_user', 'payment_type').order_by('id'),
+        )
+
+    def _responses_for_text(self):
+        """
+        Отклики вместе с мастерами и типами оплаты одним запросом.
+        Если отклики уже загружены через responses_prefetch(), запроса нет.
+        """
+        if 'responses' in getattr(self, '_prefetched_objects_cache', {}):
+            return list(self.responses.all())
+        return list(self.responses.select_related('telegram_user', 'payment_type').order_by('id'))
+
     @property
     def dispather_task_text(self):
         from tgbot.logics.text_helper import get_mention
         text = Messages.DISPATHER_TASK_TEXT.format(random_task_number=self.random_task_number, description=self.description)
 
-        if self.responses.all():
+        responses = self._responses_for_text()
+        if responses:
             text += Messages.RESPONSES
 
-        for response in self.responses.all():
+        for response in responses:
             actor = response.telegram_user
             mention = get_mention(actor)
 
@@ -236,10 +472,11 @@ class Task(models.Model):
         mention = get_mention(actor)
         text = Messages.MASTER_TASK_TEXT.format(random_task_number=self.random_task_number, mention=mention, description=self.description)
 
-        if self.responses.all():
+        responses = self._responses_for_text()
+        if responses:
             text += Messages.RESPONSES
 
-        for response in self.responses.all():
+        for response in responses:
             actor = response.telegram_user
             mention = get_mention(actor)
 
@@ -251,6 +488,17 @@ class Task(models.Model):
     class Meta:
         verbose_name = 'Задание'
         verbose_name_plural = 'Задания'
+        indexes = [
+            # поиск открытых заявок (inline-режим) — свежие первыми
+            models.Index(fields=['stage', '-created_at'], name='task_stage_created_idx'),
+            # /today и отчёты за период
+            models.Index(fields=['created_at'], name='task_created_idx'),
+            # заявки диспетчера, в том числе поиск по сообщению, на которое он ответил
+            models.Index(fields=['creator', 'created_at'], name='task_creator_created_idx'),
+            models.Index(fields=['creator', 'creator_message_id_to_reply'], name='task_creator_reply_idx'),
+            # отбор закрытых заявок для архивации
+            models.Index(fields=['stage', 'closed_at'], name='task_stage_closed_idx'),
+        ]
 
 
 class Files(models.Model):
@@ -263,9 +511,19 @@ class Files(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='files', verbose_name='Задание')
     file_id = models.CharField(max_length=255, verbose_name='ID файла')
     file_type = models.CharField(max_length=50, choices=FILE_TYPE_CHOICES, verbose_name='Тип файла')
+    source_message_id = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name='ID исходного сообщения',
+        help_text='Сообщение диспетчера с этим файлом, из которого файл копируется мастерам'
+    )
+    # Старая связь с отправленными сообщениями. Данные перенесены в журнал SentMessage
+    # (tgbot.data_migrations, после каждого migrate), код её не использует. Поле удаляется
+    # отдельным выпуском, когда manage.py check_sent_message_ledger подтвердит перенос.
     sent_messages = models.ManyToManyField(
         SentMessage,
         blank=True,
+        editable=False,
         related_name="file_sent_messages",
         verbose_name="Отправленные сообщения"
     )
@@ -303,9 +561,13 @@ class Response(models.Model):
         blank=True,
         verbose_name='Тип оплаты'
     )
+    # Старая связь с отправленными сообщениями. Данные перенесены в журнал SentMessage
+    # (tgbot.data_migrations, после каждого migrate), код её не использует. Поле удаляется
+    # отдельным выпуском, когда manage.py check_sent_message_ledger подтвердит перенос.
     sent_messages = models.ManyToManyField(
         SentMessage,
         blank=True,
+        editable=False,
         related_name="response_sent_messages",
         verbose_name="Отправленные сообщения"
     )
@@ -317,3 +579,385 @@ class Response(models.Model):
     class Meta:
         verbose_name = 'Отклик'
         verbose_name_plural = 'Отклики'
+        constraints = [
+            # мастер откликается на задание один раз; индекс ограничения
+            # заодно обслуживает выборку откликов по (task, telegram_user)
+            models.UniqueConstraint(fields=['task', 'telegram_user'], name='response_unique_task_user'),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """
+    Исходящая операция Telegram (отправка, редактирование или удаление сообщения).
+    Записывается в той же транзакции, что и изменения в БД, и выполняется
+    диспетчером очереди пачками. Состояние доставки хранится построчно,
+    поэтому прерванная рассылка продолжается после перезапуска.
+    """
+    class Operation(models.TextChoices):
+        SEND_TASK = 'send_task', 'Отправка заявки'
+        EDIT_TASK = 'edit_task', 'Редактирование заявки'
+        DELETE_MESSAGE = 'delete_message', 'Удаление сообщения'
+        SEND_TEXT = 'send_text', 'Отправка сообщения'
+        DIGEST_TASK = 'digest_task', 'Заявка в сводку'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        PROCESSING = 'processing', 'Выполняется'
+        DONE = 'done', 'Выполнено'
+        FAILED = 'failed', 'Ошибка'
+
+    operation = models.CharField(max_length=20, choices=Operation.choices, verbose_name='Операция')
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус'
+    )
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbox_messages',
+        verbose_name='Задание'
+    )
+    telegram_user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbox_messages',
+        verbose_name='Получатель'
+    )
+    chat_id = models.BigIntegerField(null=True, blank=True, verbose_name='Chat ID')
+    message_id = models.IntegerField(null=True, blank=True, verbose_name='ID сообщения')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    next_attempt_at = models.DateTimeField(null=True, blank=True, verbose_name='Следующая попытка')
+    batch_id = models.CharField(max_length=32, blank=True, default='', verbose_name='Пачка')
+    error = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f"{self.get_operation_display()} #{self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = 'Исходящая операция'
+        verbose_name_plural = 'Исходящие операции'
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+            models.Index(fields=['batch_id']),
+        ]
+
+
+
+class DeadLetter(models.Model):
+    """
+    Исходящая операция, которую не удалось выполнить.
+    Хранит всё необходимое для повторной отправки через очередь исходящих операций.
+    """
+    operation = models.CharField(max_length=20, choices=OutboxMessage.Operation.choices, verbose_name='Операция')
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='dead_letters',
+        verbose_name='Задание'
+    )
+    telegram_user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='dead_letters',
+        verbose_name='Получатель'
+    )
+    chat_id = models.BigIntegerField(null=True, blank=True, verbose_name='Chat ID')
+    message_id = models.IntegerField(null=True, blank=True, verbose_name='ID сообщения')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    error_class = models.CharField(max_length=255, verbose_name='Класс ошибки')
+    error_message = models.TextField(blank=True, default='', verbose_name='Текст ошибки')
+    attempts = models.PositiveIntegerField(default=1, verbose_name='Попыток')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Последняя ошибка')
+    replayed_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено повторно')
+
+    def __str__(self):
+        return f"{self.get_operation_display()} → {self.chat_id}: {self.error_class}"
+
+    class Meta:
+        verbose_name = 'Неотправленная операция'
+        verbose_name_plural = 'Неотправленные операции'
+        indexes = [
+            models.Index(fields=['replayed_at', 'error_class']),
+        ]
+
+
+class ArchivedTask(models.Model):
+    """
+    Индекс заявки, перенесённой в холодный архив.
+    Сама заявка с откликами и файлами хранится строкой JSON в сжатом файле
+    settings.TASK_ARCHIVE_DIR/<partition>; offset — начало gzip-блока с ней.
+    """
+    task_id = models.PositiveIntegerField(unique=True, verbose_name='ID заявки')
+    number = models.PositiveIntegerField(db_index=True, verbose_name='Номер заявки')
+    title = models.CharField(max_length=255, verbose_name='Название')
+    creator_chat_id = models.BigIntegerField(null=True, blank=True, verbose_name='Chat ID диспетчера')
+    responses_count = models.PositiveIntegerField(default=0, verbose_name='Откликов')
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    closed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата закрытия')
+    partition = models.CharField(max_length=64, verbose_name='Файл архива')
+    offset = models.BigIntegerField(verbose_name='Смещение в файле')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+
+    @property
+    def random_task_number(self):
+        return f"{self.number:0{Constants.NUMBER_LENGTH}}"
+
+    def __str__(self):
+        return f"Заявка №{self.random_task_number} (архив)"
+
+    class Meta:
+        verbose_name = 'Архивная заявка'
+        verbose_name_plural = 'Архивные заявки'
+        ordering = ['-created_at']
+
+
+class DailyStats(models.Model):
+    """
+    Сводка за день: обновляется сигналами при создании и закрытии заявок
+    и откликов, периодически сверяется с таблицами (tgbot.logics.stats).
+    """
+    date = models.DateField(unique=True, verbose_name='Дата')
+    tasks_created = models.IntegerField(default=0, verbose_name='Заявок создано')
+    tasks_closed = models.IntegerField(default=0, verbose_name='Заявок закрыто')
+    responses = models.IntegerField(default=0, verbose_name='Откликов')
+    unique_masters = models.IntegerField(default=0, verbose_name='Откликнувшихся мастеров')
+    reconciled_at = models.DateTimeField(null=True, blank=True, verbose_name='Сверено с таблицами')
+
+    def __str__(self):
+        return f"Статистика за {self.date:%d.%m.%Y}"
+
+    class Meta:
+        verbose_name = 'Статистика за день'
+        verbose_name_plural = 'Статистика по дням'
+        ordering = ['-date']
+
+
+class DailyPaymentStats(models.Model):
+    """Отклики за день по типу оплаты"""
+    date = models.DateField(verbose_name='Дата')
+    payment_type = models.ForeignKey(
+        PaymentTypeModel,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_stats',
+        verbose_name='Тип оплаты'
+    )
+    responses = models.IntegerField(default=0, verbose_name='Откликов')
+
+    def __str__(self):
+        return f"{self.payment_type or 'Без типа оплаты'} за {self.date:%d.%m.%Y}"
+
+    class Meta:
+        verbose_name = 'Отклики по типу оплаты за день'
+        verbose_name_plural = 'Отклики по типам оплаты за день'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_type'], name='dailypayment_unique_date_type'),
+        ]
+
+
+class DailyMasterActivity(models.Model):
+    """Отклики мастера за день — по числу строк за дату считаются откликнувшиеся мастера"""
+    date = models.DateField(verbose_name='Дата')
+    telegram_user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name='daily_activity',
+        verbose_name='Мастер'
+    )
+    responses = models.IntegerField(default=0, verbose_name='Откликов')
+
+    def __str__(self):
+        return f"{self.telegram_user} за {self.date:%d.%m.%Y}"
+
+    class Meta:
+        verbose_name = 'Активность мастера за день'
+        verbose_name_plural = 'Активность мастеров по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'telegram_user'], name='dailymaster_unique_date_user'),
+        ]
+
+
+class BackgroundJob(models.Model):
+    """
+    Долгая операция, запущенная из админки (обновление профилей, рассылка,
+    синхронизация SSH). Действие админки ставит её в очередь, выполняют
+    воркеры бота или manage.py runjobs. Счётчики сохраняются после каждого
+    элемента, поэтому прерванная задача продолжается с места остановки.
+    """
+    class Kind(models.TextChoices):
+        REFRESH_USERS = 'refresh_users', 'Обновление данных пользователей'
+        MASS_MAILING = 'mass_mailing', 'Рассылка'
+        SYNC_SSH_KEYS = 'sync_ssh_keys', 'Синхронизация SSH ключей'
+        RESET_PASSWORD = 'reset_password', 'Сброс пароля сервера'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнено'
+        FAILED = 'failed', 'Ошибка'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name='Тип')
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус'
+    )
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    total = models.PositiveIntegerField(default=0, verbose_name='Всего')
+    done = models.PositiveIntegerField(default=0, verbose_name='Выполнено')
+    failed = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
+    result = models.TextField(blank=True, default='', verbose_name='Результат')
+    errors = models.TextField(blank=True, default='', verbose_name='Ошибки')
+    worker = models.CharField(max_length=64, blank=True, default='', verbose_name='Воркер')
+    created_by = models.CharField(max_length=150, blank=True, default='', verbose_name='Запустил')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начата')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def processed(self) -> int:
+        return self.done + self.failed
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    @property
+    def percent(self) -> int:
+        if not self.total:
+            return 100 if self.is_finished else 0
+        return min(100, self.processed * 100 // self.total)
+
+    @property
+    def eta(self):
+        """Оценка оставшегося времени по средней скорости с начала выполнения"""
+        if self.status != self.Status.RUNNING or not self.started_at or not self.processed:
+            return None
+        elapsed = timezone.now() - self.started_at
+        remaining = max(self.total - self.processed, 0)
+        return timedelta(seconds=round(elapsed.total_seconds() / self.processed * remaining))
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='bgjob_status_created_idx'),
+        ]
+
+
+class MailingCampaign(models.Model):
+    """
+    Рассылка администратора. Получатели и состояние доставки каждому хранятся
+    в MailingRecipient, поэтому рассылка после перезапуска продолжается
+    с неотправленных, а не начинается заново.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Отправляется'
+        DONE = 'done', 'Завершена'
+        CANCELLED = 'cancelled', 'Остановлена'
+
+    sender = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='mailing_campaigns',
+        verbose_name='Отправитель'
+    )
+    text = models.TextField(verbose_name='Текст')
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус'
+    )
+    recipients_total = models.PositiveIntegerField(default=0, verbose_name='Получателей')
+    sent = models.PositiveIntegerField(default=0, verbose_name='Отправлено')
+    failed = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
+    skipped = models.PositiveIntegerField(default=0, verbose_name='Пропущено')
+    created_by = models.CharField(max_length=150, blank=True, default='', verbose_name='Запустил')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начата')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f"Рассылка #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def throughput(self):
+        """Отправлено сообщений в минуту с начала рассылки"""
+        if not self.started_at or not self.sent:
+            return None
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.sent * 60 / max(elapsed, 1), 1)
+
+    class Meta:
+        verbose_name = 'Рассылка'
+        verbose_name_plural = 'Рассылки'
+
+
+class MailingRecipient(models.Model):
+    """Получатель рассылки и состояние доставки ему"""
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Ожидает'
+        SENDING = 'sending', 'Отправляется'
+        SENT = 'sent', 'Отправлено'
+        FAILED = 'failed', 'Ошибка'
+        SKIPPED = 'skipped', 'Пропущен'
+
+    campaign = models.ForeignKey(
+        MailingCampaign,
+        on_delete=models.CASCADE,
+        related_name='recipients',
+        verbose_name='Рассылка'
+    )
+    telegram_user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name='mailing_deliveries',
+        verbose_name='Получатель'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус'
+    )
+    message_id = models.IntegerField(null=True, blank=True, verbose_name='ID сообщения')
+    error = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f"{self.telegram_user} — {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = 'Получатель рассылки'
+        verbose_name_plural = 'Получатели рассылок'
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'telegram_user'], name='mailing_unique_campaign_user'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', 'status'], name='mailing_campaign_status_idx'),
+        ]
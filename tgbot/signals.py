@@ -73,33 +73,6 @@ def server_post_save(sender, instance, created, **kwargs):
                 password_auth, pubkey_auth, permit_root_login, permit_empty_passwords, new_password_for_user)
             
 
-@receiver(pre_delete, sender=Task)
-def cleanup_task_sent_messages(sender, instance, **kwargs):
-    """
-    Перед удалением Task чистим все связанные SentMessage.
-    """
-    msg_ids = list(instance.sent_messages.values_list('id', flat=True))
-    if msg_ids:
-        SentMessage.objects.filter(id__in=msg_ids).delete()
-
-@receiver(pre_delete, sender=Files)
-def cleanup_files_sent_messages(sender, instance, **kwargs):
-    """
-    Перед удалением Files чистим все связанные SentMessage.
-    """
-    msg_ids = list(instance.sent_messages.values_list('id', flat=True))
-    if msg_ids:
-        SentMessage.objects.filter(id__in=msg_ids).delete()
-
-@receiver(pre_delete, sender=Response)
-def cleanup_response_sent_messages(sender, instance, **kwargs):
-    """
-    Перед удалением Response чистим все связанные SentMessage.
-    """
-    msg_ids = list(instance.sent_messages.values_list('id', flat=True))
-    if msg_ids:
-        SentMessage.objects.filter(id__in=msg_ids).delete()
-
 @receiver(pre_delete, sender=TelegramUser)
 def cleanup_user_tasks(sender, instance: TelegramUser, **kwargs):
     tasks = Task.objects.filter(creator=instance)
@@ -147,55 +120,138 @@ def cleanup_task(sender, instance: Task, **kwargs):
     from tgbot.handlers.utils import delete_all_task_related
     delete_all_task_related(instance)
 
-@receiver(pre_save, sender=Configuration)
-def configuration_pre_save(sender, instance, **kwargs):
+@receiver(m2m_changed, sender=TelegramUser.tags.through)
+@receiver(post_delete, sender=TelegramUser)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_recipients(sender, **kwargs):
+    """
+    Подписки, блокировки и тэги определяют получателей рассылки —
+    при их изменении посчитанные получатели сбрасываются.
+    """
+    from tgbot.logics.tags import invalidate_recipient_cache
+    invalidate_recipient_cache()
+
+@receiver(post_save, sender=TelegramUser)
+def invalidate_tag_recipients_on_save(sender, instance: TelegramUser, created, update_fields=None, **kwargs):
+    """
+    Сохранение пользователя сбрасывает получателей, только если он новый
+    или изменились блокировки: правка имени или настроек их не меняет.
+    """
+    if not created:
+        if update_fields is not None and not any(name in update_fields for name in TelegramUser.RECIPIENT_FIELDS):
+            return
+        old = getattr(instance, "_old_instance", None)
+        if old and all(getattr(old, name) == getattr(instance, name) for name in TelegramUser.RECIPIENT_FIELDS):
+            return
+    from tgbot.logics.tags import invalidate_recipient_cache
+    invalidate_recipient_cache()
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_inline_results(sender, update_fields=None, **kwargs):
+    """Новая, удалённая или изменённая заявка сбрасывает результаты inline-поиска"""
+    if update_fields is not None and not any(name in update_fields for name in Task.SEARCH_FIELDS):
+        return
+    from tgbot.logics.task_search import invalidate_inline_cache
+    invalidate_inline_cache()
+
+def _saves_stats_fields(update_fields) -> bool:
+    return update_fields is None or any(name in update_fields for name in Task.STATS_FIELDS)
+
+@receiver(pre_save, sender=Task)
+def task_pre_save_stats(sender, instance: Task, update_fields=None, **kwargs):
     """
-    Перед сохранением сохраняем старое значение test_mode
-    в instance._old_test_mode, чтобы потом понять, поменялось ли оно.
+    Запоминает, была ли заявка закрыта до сохранения — для сводки закрытых.
+    Загруженная из базы заявка помнит прежние значения сама (Task.from_db),
+    запрос нужен только для заявки, созданной в коде с готовым pk.
     """
-    if not instance.pk:
-        # ещё нет записи в БД — это первая сохранёнка
-        instance._old_test_mode = None
+    instance._stats_old = None
+    if instance._state.adding or not _saves_stats_fields(update_fields):
+        return
+    instance._stats_old = getattr(instance, "_stats_loaded", None)
+    if instance._stats_old is None:
+        instance._stats_old = sender.objects.filter(pk=instance.pk).values(*Task.STATS_FIELDS).first()
+
+@receiver(post_save, sender=Task)
+def update_task_stats(sender, instance: Task, created, update_fields=None, **kwargs):
+    from tgbot.logics.stats import CLOSED_STAGES, record_task_closed, record_task_created, rollups_enabled
+    if not _saves_stats_fields(update_fields):
+        return
+    old = getattr(instance, "_stats_old", None)
+    # следующее сохранение этого объекта сравнивает уже с записанными значениями;
+    # после частичного сохранения прежние значения будут прочитаны из базы
+    if update_fields is None or all(name in update_fields for name in Task.STATS_FIELDS):
+        instance._stats_loaded = {name: getattr(instance, name) for name in Task.STATS_FIELDS}
     else:
-        try:
-            old = Configuration.objects.get(pk=instance.pk)
-            instance._old_test_mode = old.test_mode
-        except Configuration.DoesNotExist:
-            instance._old_test_mode = None
-
-def _restart_service():
-    # выполняем systemctl restart bot
-    try:
-        subprocess.run(
-            ['sudo', 'systemctl', 'restart', 'bot'],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-    except Exception as e:
-        # здесь можно залогировать неудачу, если нужно
-        logger.error("Failed to restart service 'bot':", e)
-
-@receiver(post_save, sender=Configuration)
-def configuration_post_save(sender, instance, created, **kwargs):
-    old = getattr(instance, '_old_test_mode', None)
-    new = instance.test_mode
-
-    # если тестовый режим не менялся — выходим
-    if not (created or (old is not None and old != new)):
+        instance.__dict__.pop("_stats_loaded", None)
+    if not rollups_enabled():
         return
+    if created:
+        record_task_created(instance)
 
-    # откладываем рестарт до конца транзакции и отдачи ответа
-    def _deferred():
-        # запускаем в отдельном потоке, чтобы не блокировать процесс Django
-        threading.Thread(target=_restart_service, daemon=True).start()
+    old_closed_at = old["closed_at"] if old and old["stage"] in CLOSED_STAGES else None
+    new_closed_at = instance.closed_at if instance.stage in CLOSED_STAGES else None
+    if old_closed_at != new_closed_at:
+        if old_closed_at:
+            record_task_closed(old_closed_at, -1)
+        if new_closed_at:
+            record_task_closed(new_closed_at)
 
-    transaction.on_commit(_deferred)
+@receiver(post_delete, sender=Task)
+def update_task_stats_on_delete(sender, instance: Task, **kwargs):
+    from tgbot.logics.stats import CLOSED_STAGES, record_task_closed, record_task_created, rollups_enabled
+    if not rollups_enabled():
+        return
+    record_task_created(instance, -1)
+    if instance.stage in CLOSED_STAGES and instance.closed_at:
+        record_task_closed(instance.closed_at, -1)
+
+@receiver(post_save, sender=Response)
+def update_response_stats(sender, instance: Response, created, **kwargs):
+    from tgbot.logics.stats import record_response, rollups_enabled
+    if created and rollups_enabled():
+        record_response(instance)
+
+@receiver(post_delete, sender=Response)
+def update_response_stats_on_delete(sender, instance: Response, **kwargs):
+    from tgbot.logics.stats import record_response, rollups_enabled
+    if rollups_enabled():
+        record_response(instance, -1)
+
+@receiver(post_migrate)
+def create_task_fts(sender, using="default", **kwargs):
+    """После миграций tgbot создаёт FTS5-индекс заявок и его триггеры"""
+    if getattr(sender, "name", None) != "tgbot":
+        return
+    from tgbot.logics.task_fts import ensure_task_fts
+    ensure_task_fts(using)
+
+@receiver(post_migrate)
+def fill_sent_message_ledger(sender, using="default", **kwargs):
+    """После миграций tgbot переносит старые связи сообщений в журнал SentMessage"""
+    if getattr(sender, "name", None) != "tgbot":
+        return
+    from django.db import connections
+    from tgbot import data_migrations
+    data_migrations.fill_sent_message_ledger(connections[using])
+
+@receiver(pre_save, sender=TelegramBotToken)
+def bot_token_pre_save(sender, instance: TelegramBotToken, **kwargs):
+    instance._old_token = None
+    if instance.pk:
+        instance._old_token = sender.objects.filter(pk=instance.pk).values_list("token", flat=True).first()
 
 @receiver(post_save, sender=TelegramBotToken)
-def tgbot_token_post_save(sender, instance, created, **kwargs):
-    def _deferred():
-        # запускаем в отдельном потоке, чтобы не блокировать процесс Django
-        threading.Thread(target=_restart_service, daemon=True).start()
+def refresh_bot_identity(sender, instance: TelegramBotToken, **kwargs):
+    """После сохранения токена данные бота запрашиваются заново в фоне"""
+    from tgbot.logics.bot_identity import forget_identity, refresh_in_background
+    old_token = getattr(instance, "_old_token", None)
+    if old_token and old_token != instance.token:
+        forget_identity(old_token)
+    token = instance.token
+    transaction.on_commit(lambda: refresh_in_background([token]))
 
-    transaction.on_commit(_deferred)
\ No newline at end of file
+@receiver(post_delete, sender=TelegramBotToken)
+def forget_bot_identity(sender, instance: TelegramBotToken, **kwargs):
+    from tgbot.logics.bot_identity import forget_identity
+    forget_identity(instance.token)
\ No newline at end of file
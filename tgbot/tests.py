@@ -0,0 +1,1240 @@
+import itertools
+import threading
+import time
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from telebot.apihelper import ApiTelegramException
+
+from tgbot.models import *
+
+
+class FakeBotApi:
+    """
+    Подменяет запросы к Bot API: запоминает вызовы и отвечает правдоподобными
+    объектами. Чаты из blocked отвечают 403, как заблокировавший бота пользователь.
+    copy_limit ограничивает число сообщений, которые copyMessages «смог» скопировать.
+    errors — исключения, которые выбросят следующие вызовы метода, по одному на вызов.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.blocked = set()
+        self.copy_limit = None
+        self.errors = {}
+        self._message_ids = itertools.count(1000)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.blocked.clear()
+            self.copy_limit = None
+            self.errors.clear()
+
+    def count(self, method_name: str) -> int:
+        return sum(1 for name, _ in self.calls if name == method_name)
+
+    def _message(self, chat_id, text=None):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private", "first_name": "x"},
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    def __call__(self, token, method_name, method="get", params=None, files=None):
+        params = params or {}
+        with self._lock:
+            self.calls.append((method_name, dict(params)))
+            errors = self.errors.get(method_name)
+            if errors:
+                raise errors.pop(0)
+        chat_id = params.get("chat_id")
+        if chat_id is not None and int(chat_id) in self.blocked:
+            raise ApiTelegramException(
+                method_name, None, {"error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+            )
+        if method_name == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bot", "username": "test_bot"}
+        if method_name == "getChat":
+            return {"id": int(chat_id), "type": "private", "first_name": f"F{chat_id}", "username": f"u{chat_id}"}
+        if method_name in ("sendMessage", "sendPhoto", "sendVideo", "sendDocument", "editMessageText"):
+            return self._message(chat_id, params.get("text", ""))
+        if method_name == "sendMediaGroup":
+            import json
+            return [self._message(chat_id) for _ in json.loads(params["media"])]
+        if method_name == "copyMessages":
+            import json
+            message_ids = json.loads(params["message_ids"])[:self.copy_limit]
+            return [{"message_id": next(self._message_ids)} for _ in message_ids]
+        return True
+
+
+def _call_now(bot, func, *args, **kwargs):
+    """
+    Вызов SyncBot без очереди: поток очереди открыл бы своё соединение
+    и не увидел бы данные незавершённой транзакции теста
+    """
+    return func(*args, **kwargs)
+
+
+api = FakeBotApi()
+# кэш в памяти вместо файлового кэша рабочего каталога
+_test_cache = override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+_patchers = [
+    mock.patch("telebot.apihelper._make_request", api),
+    mock.patch("tgbot.dispatcher.SyncBot._enqueue", _call_now),
+]
+
+
+def setUpModule():
+    _test_cache.enable()
+    _patchers[0].start()
+    # модули бота при импорте создают SyncBot по токену из базы и ставят команды
+    token = TelegramBotToken.objects.create(token="1:TEST", name="test")
+    import tgbot.dispatcher  # noqa: F401
+    token.delete()
+    _patchers[1].start()
+
+
+def tearDownModule():
+    for patcher in reversed(_patchers):
+        patcher.stop()
+    _test_cache.disable()
+
+
+class BotTestCase(TestCase):
+    """Диспетчер, мастера и способ оплаты; запросы к Bot API подменены"""
+
+    def setUp(self):
+        api.reset()
+        self.dispatcher = TelegramUser.objects.create(
+            chat_id=1, first_name="D", username="disp", can_publish_tasks=True
+        )
+        self.masters = [
+            TelegramUser.objects.create(chat_id=100 + i, first_name=f"M{i}", username=f"m{i}", can_publish_tasks=True)
+            for i in range(5)
+        ]
+        self.payment_type = PaymentTypeModel.objects.create(name="50/50")
+
+    def create_task(self, **kwargs) -> Task:
+        kwargs.setdefault("title", "Замок")
+        kwargs.setdefault("description", "Открыть входную дверь")
+        return Task.objects.create(creator=self.dispatcher, creator_message_id_to_reply=1, **kwargs)
+
+
+class BlockedMasterTest(BotTestCase):
+    def test_blocked_master_is_not_dead_letter(self):
+        from tgbot.logics.messages import send_task_to_user
+
+        master = self.masters[0]
+        api.blocked.add(master.chat_id)
+        self.assertIsNone(send_task_to_user(self.create_task(), master))
+
+        master.refresh_from_db()
+        self.assertTrue(master.bot_was_blocked)
+        self.assertFalse(DeadLetter.objects.exists())
+
+
+class OutboxRetryTest(BotTestCase):
+    """
+    Сетевые ошибки отправки задачи повторяются очередью с паузой, а в неотправленные
+    операция попадает, только когда попытки исчерпаны
+    """
+
+    def record_task(self) -> OutboxMessage:
+        from tgbot.logics.outbox import record_send_task
+        task = self.create_task()
+        record_send_task(task, [self.masters[0].id])
+        return task.outbox_messages.get()
+
+    def deliver(self, row: OutboxMessage, due=True) -> OutboxMessage:
+        from tgbot.logics.outbox import deliver_outbox
+        if due:
+            # время следующей попытки наступило
+            OutboxMessage.objects.filter(pk=row.pk).update(next_attempt_at=None)
+        deliver_outbox(OutboxMessage.objects.filter(pk=row.pk))
+        row.refresh_from_db()
+        return row
+
+    def test_failed_send_is_retried_later(self):
+        from django.utils import timezone
+        from requests.exceptions import ConnectionError
+
+        row = self.record_task()
+        api.errors["sendMessage"] = [ConnectionError("connection reset")]
+        row = self.deliver(row)
+
+        self.assertEqual(row.status, OutboxMessage.Status.PENDING)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertEqual(api.count("sendMessage"), 1)
+
+        # до наступления паузы операция не повторяется
+        row = self.deliver(row, due=False)
+        self.assertEqual(row.attempts, 1)
+
+        row = self.deliver(row)
+        self.assertEqual(row.status, OutboxMessage.Status.DONE)
+        self.assertEqual(row.attempts, 2)
+        self.assertEqual(api.count("sendMessage"), 2)
+        self.assertTrue(SentMessage.objects.filter(task=row.task, kind=SentMessage.Kind.TASK).exists())
+        self.assertFalse(DeadLetter.objects.exists())
+
+    def test_retry_after_is_respected(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        row = self.record_task()
+        api.errors["sendMessage"] = [ApiTelegramException(
+            "sendMessage", None,
+            {"error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 40}},
+        )]
+        row = self.deliver(row)
+
+        self.assertEqual(row.status, OutboxMessage.Status.PENDING)
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=30))
+
+    def test_backoff_grows(self):
+        from tgbot.logics.constants import Constants
+        from tgbot.logics.outbox import _retry_delay
+
+        row = OutboxMessage(attempts=1)
+        delays = []
+        for attempts in range(1, 4):
+            row.attempts = attempts
+            delays.append(_retry_delay(row, RuntimeError()))
+        self.assertEqual(delays, [Constants.OUTBOX_RETRY_DELAY * 2 ** n for n in range(3)])
+        row.attempts = 100
+        self.assertEqual(_retry_delay(row, RuntimeError()), Constants.OUTBOX_RETRY_MAX_DELAY)
+
+    def test_dead_letter_after_last_attempt(self):
+        from requests.exceptions import ConnectionError
+        from tgbot.logics.constants import Constants
+
+        row = self.record_task()
+        api.errors["sendMessage"] = [ConnectionError("connection reset") for _ in range(Constants.OUTBOX_MAX_ATTEMPTS)]
+        for _ in range(Constants.OUTBOX_MAX_ATTEMPTS):
+            self.assertFalse(DeadLetter.objects.exists())
+            row = self.deliver(row)
+
+        self.assertEqual(row.status, OutboxMessage.Status.FAILED)
+        self.assertEqual(row.attempts, Constants.OUTBOX_MAX_ATTEMPTS)
+        letter = DeadLetter.objects.get()
+        self.assertEqual(letter.attempts, Constants.OUTBOX_MAX_ATTEMPTS)
+
+
+class DigestTest(BotTestCase):
+    """Мастера в режиме сводки получают новые заявки одним сообщением при отправке сводок"""
+
+    def setUp(self):
+        super().setUp()
+        self.digest_masters = self.masters[:2]
+        TelegramUser.objects.filter(id__in=[master.id for master in self.digest_masters]).update(digest_mode=True)
+
+    def publish(self, **kwargs) -> Task:
+        from tgbot.logics.messages import broadcast_send_task_to_users
+        task = self.create_task(**kwargs)
+        broadcast_send_task_to_users(task)
+        return task
+
+    def digests(self, master: TelegramUser) -> list[str]:
+        return [
+            params["text"] for name, params in api.calls
+            if name == "sendMessage" and int(params["chat_id"]) == master.chat_id
+        ]
+
+    def test_flush_sends_one_digest_per_master(self):
+        from tgbot.logics.outbox import flush_digests
+
+        first = self.publish(description="Открыть входную дверь")
+        second = self.publish(description="Поменять личинку")
+        closed = self.publish(description="Вскрыть сейф")
+        closed.stage = Task.Stage.CLOSED
+        closed.save()
+        # заявки уходят сразу только мастерам без сводки
+        self.assertFalse(SentMessage.objects.filter(telegram_user__in=self.digest_masters).exists())
+        self.assertEqual(SentMessage.objects.filter(task=first, kind=SentMessage.Kind.TASK).count(), 3)
+
+        api.reset()
+        self.assertEqual(flush_digests(), 2)
+        for master in self.digest_masters:
+            [text] = self.digests(master)
+            self.assertIn(first.random_task_number, text)
+            self.assertIn(second.random_task_number, text)
+            self.assertNotIn(closed.random_task_number, text)
+        self.assertFalse(
+            OutboxMessage.objects.filter(
+                operation=OutboxMessage.Operation.DIGEST_TASK, status=OutboxMessage.Status.PENDING
+            ).exists()
+        )
+        self.assertEqual(flush_digests(), 0)
+
+    def test_flush_splits_long_digest_and_retries_failed_one(self):
+        from tgbot.logics.outbox import flush_digests
+
+        for _ in range(3):
+            self.publish()
+        api.reset()
+        api.errors["sendMessage"] = [RuntimeError("сбой")]
+        with mock.patch("tgbot.logics.constants.Constants.DIGEST_MAX_TASKS", 2):
+            # каждому мастеру — две сводки (2 + 1 заявка), первая из всех не отправилась
+            self.assertEqual(flush_digests(), 3)
+
+        retry = OutboxMessage.objects.filter(
+            operation=OutboxMessage.Operation.DIGEST_TASK, status=OutboxMessage.Status.PENDING
+        )
+        self.assertEqual(retry.count(), 2)
+        self.assertTrue(all(row.next_attempt_at for row in retry))
+
+
+class InlineSearchTest(BotTestCase):
+    """Inline-поиск открытых заявок и сброс закэшированных результатов"""
+
+    def search(self, query: str = "") -> list[str]:
+        from tgbot.logics.task_search import inline_task_results
+        results, _ = inline_task_results(self.masters[0], query, 0)
+        return [result.id for result in results]
+
+    def test_search_by_number_and_text(self):
+        door = self.create_task(description="Открыть входную дверь")
+        safe = self.create_task(description="Вскрыть сейф")
+        self.create_task(description="Сейф в гараже", stage=Task.Stage.CLOSED)
+
+        self.assertEqual(self.search(), [str(safe.id), str(door.id)])
+        self.assertEqual(self.search("сейф"), [str(safe.id)])
+        self.assertEqual(self.search(f"№{door.random_task_number}"), [str(door.id)])
+
+    def test_cache_is_reset_by_task_changes(self):
+        from tgbot.logics import task_search
+
+        task = self.create_task()
+        self.assertEqual(self.search(), [str(task.id)])
+        with mock.patch("tgbot.logics.task_search.open_tasks", wraps=task_search.open_tasks) as open_tasks:
+            # отметка, которую результаты не показывают, кэш не сбрасывает
+            task.creator_message_id_to_reply = 2
+            task.save(update_fields=["creator_message_id_to_reply"])
+            self.assertEqual(self.search(), [str(task.id)])
+            self.assertEqual(open_tasks.call_count, 0)
+
+            task.stage = Task.Stage.CLOSED
+            task.save()
+            self.assertEqual(self.search(), [])
+
+            new_task = self.create_task()
+            self.assertEqual(self.search(), [str(new_task.id)])
+
+            new_task.delete()
+            self.assertEqual(self.search(), [])
+            self.assertEqual(open_tasks.call_count, 3)
+
+
+class MentionStateTest(BotTestCase):
+    """Неработающее упоминание запоминается, и следующие рассылки отклоняются до отправки"""
+
+    def setUp(self):
+        super().setUp()
+        # без username упоминание строится по id и зависит от настроек приватности
+        TelegramUser.objects.filter(pk=self.dispatcher.pk).update(username=None)
+        self.dispatcher.refresh_from_db()
+
+    def test_failed_mention_is_remembered(self):
+        from tgbot.logics.messages import send_notification_with_mention_check
+
+        # ответ Bot API без text_mention — упоминание не получилось
+        result = send_notification_with_mention_check(self.masters[0].chat_id, self.dispatcher, "[D](tg://user?id=1)")
+        self.assertEqual(result, Constants.USER_MENTION_PROBLEM)
+        self.assertEqual(api.count("deleteMessage"), 1)
+        self.dispatcher.refresh_from_db()
+        self.assertEqual(self.dispatcher.mention_state, TelegramUser.MentionState.FAILED)
+        self.assertTrue(self.dispatcher.mention_is_broken())
+
+        # тот же результат в пределах MENTION_STATE_REFRESH не пишется повторно
+        with self.assertNumQueries(0):
+            self.dispatcher.remember_mention_state(False)
+
+    def test_broadcast_is_refused_up_front(self):
+        from tgbot.handlers.message_handler import process_task_submission
+        from tgbot.logics.messages import broadcast_send_task_to_users
+
+        self.dispatcher.remember_mention_state(False)
+        task = self.create_task()
+        api.reset()
+        self.assertEqual(broadcast_send_task_to_users(task), Constants.USER_MENTION_PROBLEM)
+        # сообщение об ошибке удаляется через 5 секунд — без ожидания
+        with mock.patch("tgbot.handlers.message_handler.time"):
+            process_task_submission(self.dispatcher.chat_id, "Открыть дверь", 2)
+
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(Task.objects.count(), 1)
+        # мастерам ничего не отправлено, диспетчеру — только объяснение
+        self.assertEqual({int(params["chat_id"]) for name, params in api.calls}, {self.dispatcher.chat_id})
+
+    def test_failed_state_expires(self):
+        from datetime import timedelta
+
+        self.dispatcher.remember_mention_state(False)
+        self.dispatcher.mention_checked_at -= timedelta(seconds=Constants.MENTION_STATE_TTL + 1)
+        self.assertFalse(self.dispatcher.mention_is_broken())
+
+
+class CopyTaskFilesTest(BotTestCase):
+    def test_partial_copy_falls_back_to_sending(self):
+        from tgbot.logics.messages import send_task_files
+
+        Configuration.objects.update_or_create(pk=1, defaults={"copy_task_media": True})
+        task = self.create_task()
+        files = [
+            Files.objects.create(task=task, file_id=f"f{i}", file_type="document", source_message_id=10 + i)
+            for i in range(2)
+        ]
+        api.copy_limit = 1
+        master = self.masters[0]
+        send_task_files(master, task)
+
+        self.assertEqual(api.count("deleteMessage"), 1)
+        self.assertEqual(api.count("sendDocument"), 2)
+        ledger = SentMessage.objects.filter(telegram_user=master, kind=SentMessage.Kind.FILE).order_by("file_id")
+        self.assertEqual([message.file_id for message in ledger], [f.id for f in files])
+
+
+class TagRecipientsTest(BotTestCase):
+    """Получатели заявки по тэгам, сброс посчитанных получателей и публикация после выбора тэгов"""
+
+    def setUp(self):
+        super().setUp()
+        self.north = Tag.objects.create(name="Север")
+        self.south = Tag.objects.create(name="Юг")
+        self.masters[0].tags.add(self.north)
+        self.masters[1].tags.add(self.south)
+        self.masters[4].blocked = True
+        self.masters[4].save()
+
+    def recipients(self, task: Task) -> set[int]:
+        from tgbot.logics.tags import task_recipient_ids
+        return set(task_recipient_ids(task))
+
+    def test_recipients_by_tags(self):
+        task = self.create_task()
+        everyone = {master.id for master in self.masters[:4]}
+        self.assertEqual(self.recipients(task), everyone)
+
+        task.tags.add(self.north)
+        # подписанные на тэг и мастера без подписок; заблокированный и диспетчер — нет
+        self.assertEqual(self.recipients(task), {self.masters[0].id, self.masters[2].id, self.masters[3].id})
+
+        task.tags.add(self.south)
+        self.assertEqual(self.recipients(task), everyone)
+
+    def test_recipients_cache_invalidation(self):
+        from tgbot.logics import tags
+
+        task = self.create_task()
+        task.tags.add(self.north)
+        self.recipients(task)
+        with mock.patch("tgbot.logics.tags._build_recipient_sets", wraps=tags._build_recipient_sets) as build:
+            master = self.masters[2]
+            master.first_name = "Новое имя"
+            master.save()
+            master.digest_mode = True
+            master.save(update_fields=["digest_mode"])
+            self.recipients(task)
+            self.assertEqual(build.call_count, 0)
+
+            master.blocked = True
+            master.save()
+            self.assertNotIn(master.id, self.recipients(task))
+            self.assertEqual(build.call_count, 1)
+
+            self.masters[3].tags.add(self.south)
+            self.assertNotIn(self.masters[3].id, self.recipients(task))
+            self.assertEqual(build.call_count, 2)
+
+    def test_publish_pending_tag_task_once(self):
+        from types import SimpleNamespace
+        from tgbot.handlers.utils import handle_task_publish
+        from tgbot.logics.constants import CallbackData
+
+        task = self.create_task(stage=Task.Stage.PENDING_TAG)
+        task.tags.add(self.north)
+        call = SimpleNamespace(
+            id="1",
+            data=f"{CallbackData.CLOSE_TAG_TOGGLES}?{CallbackData.TASK_ID}={task.id}",
+            from_user=SimpleNamespace(id=self.dispatcher.chat_id),
+            message=SimpleNamespace(chat=SimpleNamespace(id=self.dispatcher.chat_id), message_id=5),
+        )
+        handle_task_publish(call)
+        handle_task_publish(call)
+
+        task.refresh_from_db()
+        self.assertEqual(task.stage, Task.Stage.CREATED)
+        sends = task.outbox_messages.filter(operation=OutboxMessage.Operation.SEND_TASK)
+        self.assertEqual(
+            sorted(sends.values_list("telegram_user_id", flat=True)),
+            sorted([self.masters[0].id, self.masters[2].id, self.masters[3].id]),
+        )
+        self.assertEqual(task.message_ledger.filter(telegram_user__in=self.masters).count(), 3)
+
+
+class FanOutQueriesTest(TestCase):
+    """
+    Рассылка и правка задачи загружают конфигурацию, текст задачи и сообщения
+    мастеров один раз на пачку очереди: чтений столько же при 5 и при 50 мастерах
+    (все мастера в одной пачке), а на каждого мастера приходятся только записи
+    в журнал отправленных сообщений.
+    """
+
+    def setUp(self):
+        api.reset()
+        self.dispatcher = TelegramUser.objects.create(
+            chat_id=1, first_name="D", username="disp", can_publish_tasks=True
+        )
+        self.payment_type = PaymentTypeModel.objects.create(name="50/50")
+        batch_size = mock.patch("tgbot.logics.constants.Constants.OUTBOX_BATCH_SIZE", 100)
+        batch_size.start()
+        self.addCleanup(batch_size.stop)
+
+    def add_masters(self, count: int) -> list[TelegramUser]:
+        TelegramUser.objects.filter(chat_id__gte=1000).delete()
+        TelegramUser.objects.bulk_create([
+            TelegramUser(chat_id=1000 + i, first_name=f"M{i}", username=f"m{i}", can_publish_tasks=True)
+            for i in range(count)
+        ])
+        return list(TelegramUser.objects.filter(chat_id__gte=1000).order_by("id"))
+
+    def submit_task(self) -> Task:
+        from tgbot.handlers.message_handler import process_task_submission
+        with self.captureOnCommitCallbacks(execute=True):
+            process_task_submission(
+                self.dispatcher.chat_id, "Открыть входную дверь", 55, files=[{"file_id": "f1", "type": "photo"}]
+            )
+        return Task.objects.latest("id")
+
+    def count_queries(self, func) -> dict[str, int]:
+        """Чтения, записи в журнал отправленных сообщений и остальные записи"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as context:
+            func()
+        counts = {"reads": 0, "ledger_writes": 0, "other_writes": 0}
+        for query in context.captured_queries:
+            sql = query["sql"]
+            if sql.startswith("SELECT"):
+                counts["reads"] += 1
+            elif sql.startswith('INSERT INTO "tgbot_sentmessage"'):
+                counts["ledger_writes"] += 1
+            elif sql.startswith(("INSERT", "UPDATE", "DELETE")):
+                counts["other_writes"] += 1
+        return counts
+
+    def measure(self, func) -> dict[int, dict[str, int]]:
+        """Запросы func(masters) при 5 и при 50 мастерах"""
+        # первая за день задача создаёт строку дневной статистики — не считаем её
+        self.submit_task()
+        results = {}
+        for count in (5, 50):
+            Task.objects.all().delete()
+            masters = self.add_masters(count)
+            results[count] = self.count_queries(lambda: func(masters))
+        return results
+
+    def test_submission_queries(self):
+        results = self.measure(lambda masters: self.submit_task())
+
+        self.assertEqual(results[5]["reads"], results[50]["reads"])
+        self.assertEqual(results[5]["other_writes"], results[50]["other_writes"])
+        # на мастера — две записи в журнал: вложение и сама задача (и столько же диспетчеру)
+        for count, result in results.items():
+            self.assertEqual(result["ledger_writes"], 2 * count + 2)
+
+    def test_edit_queries(self):
+        from tgbot.logics.messages import broadcast_edit_master_task_message
+
+        def edit(masters):
+            task = self.submit_task()
+            Response.objects.create(task=task, telegram_user=masters[0], payment_type=self.payment_type)
+            api.reset()
+            results[len(masters)] = self.count_queries(
+                lambda: self.run_on_commit(lambda: broadcast_edit_master_task_message(task=task))
+            )
+            self.assertEqual(api.count("editMessageText"), len(masters))
+
+        results = {}
+        self.measure(edit)
+        # успешная правка ничего не пишет в журнал
+        self.assertEqual(results[5], results[50])
+        self.assertEqual(results[5]["ledger_writes"], 0)
+
+    def run_on_commit(self, func):
+        with self.captureOnCommitCallbacks(execute=True):
+            func()
+
+
+class QueryPlanTest(TestCase):
+    """Частые запросы бота и админки идут по индексам, а не полным просмотром таблиц"""
+
+    def plan(self, queryset) -> str:
+        from django.db import connection
+
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return " | ".join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index: str):
+        plan = self.plan(queryset)
+        self.assertIn(f"USING INDEX {index}", plan)
+        self.assertNotRegex(plan, r"\bSCAN \w+\b(?! USING)")
+
+    def test_task_indexes(self):
+        from django.utils import timezone
+
+        self.assertUsesIndex(Task.objects.filter(created_at__gte=timezone.now()), "task_created_idx")
+        self.assertUsesIndex(
+            Task.objects.filter(creator_id=1, creator_message_id_to_reply=5), "task_creator_reply_idx"
+        )
+        self.assertUsesIndex(Task.objects.filter(creator_id=1).order_by("-created_at"), "task_creator_created_idx")
+
+    def test_response_unique_index(self):
+        plan = self.plan(Response.objects.filter(task_id=1, telegram_user_id=2))
+        self.assertIn("USING INDEX", plan)
+        self.assertIn("(task_id=? AND telegram_user_id=?)", plan)
+
+    def test_telegram_user_indexes(self):
+        self.assertUsesIndex(TelegramUser.objects.filter(send_admin_notifications=True), "tguser_admin_notify_idx")
+        self.assertUsesIndex(TelegramUser.objects.filter(blocked=True), "tguser_blocked_idx")
+
+    def test_sent_message_index(self):
+        self.assertUsesIndex(SentMessage.objects.order_by("created_at")[:10], "sentmsg_created_idx")
+
+
+class ConcurrentWritesTest(TransactionTestCase):
+    """
+    Потоки бота одновременно пишут в очередь исходящих операций и отклики.
+    Тестовая база — файл с WAL и busy_timeout, как в работе: писатели ждут
+    друг друга, а не получают «database is locked».
+    """
+
+    threads = 8
+    rounds = 25
+
+    def test_no_database_is_locked(self):
+        from django.db import OperationalError, connection, transaction
+
+        dispatcher = TelegramUser.objects.create(chat_id=1, first_name="D", username="disp")
+        payment_type = PaymentTypeModel.objects.create(name="50/50")
+        tasks = [
+            Task.objects.create(creator=dispatcher, creator_message_id_to_reply=i, title="Замок", description="Дверь")
+            for i in range(self.rounds)
+        ]
+        masters = [
+            TelegramUser.objects.create(chat_id=100 + i, first_name=f"M{i}", username=f"m{i}")
+            for i in range(self.threads)
+        ]
+        errors = []
+        start = threading.Barrier(self.threads)
+
+        def write(master: TelegramUser):
+            try:
+                start.wait()
+                for task in tasks:
+                    with transaction.atomic():
+                        OutboxMessage.objects.filter(status=OutboxMessage.Status.PENDING).count()
+                        Response.objects.create(task=task, telegram_user=master, payment_type=payment_type)
+                        OutboxMessage.objects.create(
+                            operation=OutboxMessage.Operation.SEND_TEXT,
+                            chat_id=master.chat_id,
+                            payload={"text": f"Отклик на заявку {task.id}"},
+                        )
+                    TelegramUser.objects.filter(pk=dispatcher.pk).update(first_name=f"D{task.id}")
+            except OperationalError as e:
+                errors.append(str(e))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=write, args=(master,)) for master in masters]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Response.objects.count(), self.threads * self.rounds)
+        self.assertEqual(OutboxMessage.objects.count(), self.threads * self.rounds)
+
+
+class DbMaintenanceTest(TransactionTestCase):
+    """
+    Обслуживание SQLite. VACUUM и incremental_vacuum фиксируют транзакцию сами,
+    поэтому тест без обёртки TestCase.
+    """
+
+    def fill_and_delete(self, count: int = 500):
+        TelegramUser.objects.bulk_create([
+            TelegramUser(chat_id=10_000 + i, first_name="x" * 200, admin_signature="y" * 500) for i in range(count)
+        ])
+        TelegramUser.objects.all().delete()
+
+    def test_incremental_vacuum_frees_pages_in_steps(self):
+        from tgbot.logics import db_maintenance
+
+        db_maintenance.enable_incremental_vacuum()
+        self.fill_and_delete()
+        free_pages = db_maintenance.database_summary()["freelist_count"]
+        self.assertGreater(free_pages, 10)
+
+        # между шагами по 10 страниц — пауза, чтобы бот успевал писать
+        with mock.patch("tgbot.logics.db_maintenance.time.sleep") as pause:
+            self.assertEqual(db_maintenance.incremental_vacuum(pages_per_step=10, pause=0.5), free_pages)
+        self.assertEqual(pause.call_count, (free_pages - 1) // 10)
+        self.assertEqual(db_maintenance.database_summary()["freelist_count"], 0)
+
+    def test_row_estimate_and_report(self):
+        from tgbot.logics import db_maintenance
+
+        TelegramUser.objects.bulk_create([TelegramUser(chat_id=10_000 + i) for i in range(30)])
+        db_maintenance.analyze(analysis_limit=0)
+        self.assertEqual(db_maintenance.table_row_estimate("tgbot_telegramuser"), 30)
+        self.assertIsNone(db_maintenance.table_row_estimate("tgbot_tag"))
+
+        report = {table["name"]: table for table in db_maintenance.table_report()}
+        users = report["tgbot_telegramuser"]
+        self.assertEqual(users["rows"], 30)
+        self.assertIn("tguser_blocked_idx", [index["name"] for index in users["indexes"]])
+
+    def test_command_checks_integrity(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("dbmaintain", "--skip-vacuum", stdout=out)
+        self.assertIn("Проверка целостности: ok", out.getvalue())
+        self.assertIn("tgbot_telegramuser", out.getvalue())
+
+
+class SchedulerTest(TestCase):
+    def test_failed_task_does_not_block_others(self):
+        from tgbot.logics.scheduler import PeriodicTask
+
+        calls = []
+
+        def broken():
+            calls.append("broken")
+            raise RuntimeError("сбой")
+
+        tasks = [
+            PeriodicTask("сломанная", broken, 60),
+            PeriodicTask("рабочая", lambda: calls.append("ok"), 60),
+            PeriodicTask("отложенная", lambda: calls.append("later"), 60, run_at_start=False),
+        ]
+        for _ in range(2):
+            for task in tasks:
+                task.run_if_due()
+
+        # упавшая задача ждёт следующего интервала, а не повторяется на каждом шаге
+        self.assertEqual(calls, ["broken", "ok"])
+
+
+class JobHeartbeatTest(TransactionTestCase):
+    """Долгий шаг задачи не считается брошенным, пока воркер жив"""
+
+    def test_long_step_is_not_recovered(self):
+        from tgbot.logics import jobs
+        from tgbot.logics.constants import Constants
+
+        recovered = []
+
+        def long_step(job, progress):
+            time.sleep(0.6)
+            recovered.append(jobs.recover_jobs())
+            return "готово"
+
+        job = jobs.enqueue(BackgroundJob.Kind.REFRESH_USERS)
+        with mock.patch.dict(jobs._handlers, {BackgroundJob.Kind.REFRESH_USERS: long_step}), \
+                mock.patch.object(Constants, "JOB_STALE_SECONDS", 0.3), \
+                mock.patch.object(Constants, "JOB_HEARTBEAT_INTERVAL", 0.05):
+            jobs.run_job(jobs.claim_job("test"))
+
+        job.refresh_from_db()
+        self.assertEqual(recovered, [0])
+        self.assertEqual(job.status, BackgroundJob.Status.DONE)
+
+
+class MailingCampaignTest(BotTestCase):
+    """Рассылку начинает только задача, взявшая её из очереди; получатель отмечается до отправки"""
+
+    def create_campaign(self) -> MailingCampaign:
+        from tgbot.logics.mailing import create_campaign
+        return create_campaign(self.dispatcher, "Новости", TelegramUser.objects.filter(pk__in=[m.pk for m in self.masters]))
+
+    def run_campaign_job(self, campaign: MailingCampaign) -> BackgroundJob:
+        from tgbot.logics import jobs
+        jobs.enqueue(BackgroundJob.Kind.MASS_MAILING, payload={"campaign_id": campaign.pk})
+        return jobs.run_job(jobs.claim_job("test"))
+
+    def test_cancelled_queued_campaign_is_not_sent(self):
+        campaign = self.create_campaign()
+        MailingCampaign.objects.filter(pk=campaign.pk).update(status=MailingCampaign.Status.CANCELLED)
+        self.run_campaign_job(campaign)
+
+        campaign.refresh_from_db()
+        self.assertEqual(api.count("sendMessage"), 0)
+        self.assertEqual(campaign.status, MailingCampaign.Status.CANCELLED)
+
+    def test_recipient_taken_by_other_job_is_not_sent_twice(self):
+        from tgbot.logics.mailing import deliver_campaign
+
+        campaign = self.create_campaign()
+        campaign.recipients.filter(telegram_user=self.masters[0]).update(status=MailingRecipient.Status.SENDING)
+        deliver_campaign(campaign)
+
+        self.assertEqual(api.count("sendMessage"), len(self.masters) - 1)
+        self.assertNotIn(self.masters[0].chat_id, [params["chat_id"] for _, params in api.calls])
+
+    def test_interrupted_campaign_continues(self):
+        campaign = self.create_campaign()
+        MailingCampaign.objects.filter(pk=campaign.pk).update(status=MailingCampaign.Status.RUNNING)
+        campaign.recipients.filter(telegram_user=self.masters[0]).update(status=MailingRecipient.Status.SENDING)
+        self.run_campaign_job(campaign)
+
+        campaign.refresh_from_db()
+        self.assertEqual(api.count("sendMessage"), len(self.masters))
+        self.assertEqual(campaign.status, MailingCampaign.Status.DONE)
+        self.assertEqual(campaign.sent, len(self.masters))
+
+
+class BotIdentityTest(TestCase):
+    """Ссылка на бота в админке берётся из общего кэша и не ждёт ответа Telegram"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_bot_link_never_calls_get_me_synchronously(self):
+        from django.contrib.admin.sites import site
+        from tgbot.logics import bot_identity
+
+        token = TelegramBotToken.objects.create(token="2:LINK", name="main")
+        admin = site._registry[TelegramBotToken]
+        release = threading.Event()
+        callers = []
+        get_me = bot_identity.telebot.TeleBot.get_me
+
+        def slow_get_me(bot):
+            callers.append(threading.current_thread())
+            release.wait(5)
+            return get_me(bot)
+
+        with mock.patch.object(bot_identity.telebot.TeleBot, "get_me", slow_get_me):
+            self.assertEqual(admin.bot_link(token), "Загружается…")
+            release.set()
+            for _ in range(100):
+                if not bot_identity._pending:
+                    break
+                time.sleep(0.02)
+            link = admin.bot_link(token)
+
+        self.assertIn("https://t.me/test_bot", link)
+        self.assertEqual(len(callers), 1)
+        self.assertIsNot(callers[0], threading.current_thread())
+
+    def test_identity_is_shared_through_django_cache(self):
+        from django.core.cache import cache
+        from tgbot.logics.bot_identity import _cache_key, cached_identity, refresh_identity
+
+        refresh_identity("3:SHARED")
+        # другой процесс видит ту же запись: в кэше Django хранятся только данные
+        self.assertEqual(cache.get(_cache_key("3:SHARED"))["username"], "test_bot")
+        with mock.patch("tgbot.logics.bot_identity.refresh_in_background") as refresh:
+            identity = cached_identity("3:SHARED")
+        self.assertEqual(identity.username, "test_bot")
+        refresh.assert_not_called()
+
+
+class RefreshProfilesTest(BotTestCase):
+    """Обновление профилей из Telegram: свежие пропускаются, изменения пишутся пачкой на порцию"""
+
+    def refresh(self, **kwargs) -> dict:
+        from tgbot.logics.profile_refresh import refresh_profiles
+
+        bulk_update = TelegramUser.objects.bulk_update
+        with mock.patch("tgbot.logics.constants.Constants.PROFILE_REFRESH_CHUNK", 2):
+            with mock.patch.object(TelegramUser.objects, "bulk_update", wraps=bulk_update) as bulk:
+                stats = refresh_profiles(TelegramUser.objects.all(), **kwargs)
+        self.bulk_updates = bulk.call_count
+        return stats
+
+    def test_fresh_profiles_are_skipped(self):
+        from django.utils import timezone
+
+        fresh = self.masters[0]
+        TelegramUser.objects.filter(pk=fresh.pk).update(profile_synced_at=timezone.now())
+        api.errors["getChat"] = [RuntimeError("сбой")]
+
+        stats = self.refresh()
+
+        self.assertEqual(stats, {"refreshed": 4, "changed": 4, "skipped": 1, "failed": 1})
+        # 5 устаревших профилей порциями по 2 — три bulk_update
+        self.assertEqual(self.bulk_updates, 3)
+        self.assertNotIn(fresh.chat_id, [int(params["chat_id"]) for name, params in api.calls if name == "getChat"])
+        master = TelegramUser.objects.get(pk=self.masters[1].pk)
+        self.assertEqual((master.first_name, master.username), (f"F{master.chat_id}", f"u{master.chat_id}"))
+        self.assertIsNotNone(master.profile_synced_at)
+        self.assertEqual(TelegramUser.objects.filter(profile_synced_at__isnull=True).count(), 1)
+
+    def test_force_refreshes_everyone(self):
+        self.refresh()
+        api.reset()
+        stats = self.refresh(force=True)
+        self.assertEqual(stats, {"refreshed": 6, "changed": 0, "skipped": 0, "failed": 0})
+        self.assertEqual(api.count("getChat"), 6)
+
+
+class SentMessageLedgerBackfillTest(BotTestCase):
+    """Старые связи сообщений переносятся в журнал, повторный перенос ничего не меняет"""
+
+    def test_fill_and_check(self):
+        from django.db import connection
+        from tgbot.data_migrations import fill_sent_message_ledger, missing_sent_message_links
+
+        master = self.masters[0]
+        task = self.create_task()
+        file = Files.objects.create(task=task, file_id="f", file_type="photo")
+        response = Response.objects.create(task=task, telegram_user=master, payment_type=self.payment_type)
+        messages = [SentMessage.objects.create(message_id=i, telegram_user=master) for i in range(3)]
+        task.sent_messages.add(messages[0])
+        file.sent_messages.add(messages[1])
+        response.sent_messages.add(messages[2])
+        self.assertEqual(set(missing_sent_message_links(connection).values()), {1})
+
+        self.assertEqual(fill_sent_message_ledger(connection), 3)
+        self.assertEqual(fill_sent_message_ledger(connection), 0)
+
+        self.assertEqual(set(missing_sent_message_links(connection).values()), {0})
+        self.assertEqual(
+            list(task.message_ledger.order_by("message_id").values_list("kind", "file_id", "response_id")),
+            [(SentMessage.Kind.TASK, None, None), (SentMessage.Kind.FILE, file.id, None),
+             (SentMessage.Kind.RESPONSE, None, response.id)],
+        )
+
+
+class RetentionTest(BotTestCase):
+    """Архивация закрытых заявок по сроку и очистка журнала сообщений порциями"""
+
+    def create_closed(self, days_ago: int, stage=Task.Stage.CLOSED, **kwargs) -> Task:
+        from datetime import timedelta
+        from django.utils import timezone
+        return self.create_task(stage=stage, closed_at=timezone.now() - timedelta(days=days_ago), **kwargs)
+
+    def test_expired_closed_tasks(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from tgbot.logics.retention import expired_closed_tasks
+
+        old = self.create_closed(40)
+        self.create_closed(10)
+        self.create_closed(40, stage=Task.Stage.CREATED)
+        # закрыта до появления closed_at — возраст считается от создания
+        legacy = self.create_task(stage=Task.Stage.CLOSED)
+        Task.objects.filter(pk=legacy.pk).update(created_at=timezone.now() - timedelta(days=40))
+        legacy_recent = self.create_task(stage=Task.Stage.CLOSED)
+
+        self.assertEqual(set(expired_closed_tasks(30)), {old, legacy})
+        self.assertNotIn(legacy_recent, expired_closed_tasks(30))
+
+    def test_retention_works_in_chunks(self):
+        from tgbot.logics.messages import broadcast_send_task_to_users
+        from tgbot.logics.retention import apply_retention
+
+        tasks = [self.create_closed(40) for _ in range(5)]
+        fresh = self.create_closed(10)
+        for task in (tasks[0], fresh):
+            broadcast_send_task_to_users(task)
+        ledger = SentMessage.objects.filter(task=tasks[0]).count()
+        self.assertEqual(ledger, len(self.masters))
+        config = Configuration.get_solo()
+        config.task_retention_days = 30
+        config.delete_archived_messages = True
+        config.save()
+
+        # после каждой порции (по 2) — пауза; порции заявок: 2 + 2 + 1, журнала: 2 + 2 + 1
+        with mock.patch("tgbot.logics.retention.time.sleep") as pause:
+            result = apply_retention(chunk_size=2)
+
+        self.assertEqual(result, {"archived": 5, "pruned": ledger, "queued": ledger})
+        self.assertEqual(pause.call_count, 3 + 3)
+        self.assertEqual(Task.objects.filter(stage=Task.Stage.ARCHIVED).count(), 5)
+        self.assertFalse(SentMessage.objects.filter(task=tasks[0]).exists())
+        self.assertEqual(SentMessage.objects.filter(task=fresh).count(), len(self.masters))
+        self.assertEqual(
+            OutboxMessage.objects.filter(operation=OutboxMessage.Operation.DELETE_MESSAGE).count(), ledger
+        )
+
+
+class TaskSearchAdminTest(BotTestCase):
+    """Поиск заявок в админке: FTS5-индекс с триггерами и поиск по случайному номеру"""
+
+    def admin_search(self, term: str) -> list[int]:
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        model_admin = admin.site._registry[Task]
+        queryset, _ = model_admin.get_search_results(RequestFactory().get("/"), Task.objects.all(), term)
+        return list(queryset.values_list("id", flat=True))
+
+    def test_index_follows_queryset_update_and_delete(self):
+        from tgbot.logics.task_fts import fts_available
+
+        self.assertTrue(fts_available())
+        door = self.create_task(title="Дверь", description="Открыть входную дверь")
+        lock = self.create_task(title="Замок", description="Дверь в подъезде, заменить личинку")
+
+        # совпадение в названии весит больше, слова ищутся по началу
+        self.assertEqual(self.admin_search("двер"), [door.id, lock.id])
+
+        Task.objects.filter(pk=door.pk).update(title="Сейф", description="Вскрыть сейф")
+        self.assertEqual(self.admin_search("двер"), [lock.id])
+        self.assertEqual(self.admin_search("сейф"), [door.id])
+
+        Task.objects.filter(pk=lock.pk).delete()
+        self.assertEqual(self.admin_search("личинк"), [])
+
+    def test_search_by_random_number(self):
+        first = self.create_task()
+        second = self.create_task()
+
+        self.assertEqual(self.admin_search(first.random_task_number), [first.id])
+        self.assertEqual(self.admin_search(second.random_task_number), [second.id])
+
+
+class EstimatedCountPaginatorTest(BotTestCase):
+    """Число строк большой таблицы без фильтров берётся из статистики ANALYZE"""
+
+    def count(self, queryset) -> int:
+        from tgbot.admin import EstimatedCountPaginator
+        return EstimatedCountPaginator(queryset, 100).count
+
+    def test_estimate_above_threshold_only(self):
+        from tgbot.logics.db_maintenance import analyze
+
+        for _ in range(30):
+            self.create_task()
+        analyze(analysis_limit=0)
+        for _ in range(5):
+            self.create_task()
+
+        with mock.patch("tgbot.logics.constants.Constants.ADMIN_ESTIMATED_COUNT_THRESHOLD", 20):
+            # оценка — с последнего ANALYZE, без COUNT(*) по таблице
+            with self.assertNumQueries(1):
+                self.assertEqual(self.count(Task.objects.all()), 30)
+            # отфильтрованный список считается точно
+            self.assertEqual(self.count(Task.objects.filter(stage=Task.Stage.CREATED)), 35)
+
+        with mock.patch("tgbot.logics.constants.Constants.ADMIN_ESTIMATED_COUNT_THRESHOLD", 100):
+            self.assertEqual(self.count(Task.objects.all()), 35)
+
+        # без статистики по таблице — тоже точный COUNT(*)
+        self.assertEqual(self.count(Tag.objects.all()), 0)
+
+
+class ExportTest(BotTestCase):
+    """Выгрузка CSV/JSONL порциями по id > последнего выгруженного"""
+
+    def setUp(self):
+        super().setUp()
+        self.tasks = [self.create_task(title=f"Заявка {i}") for i in range(5)]
+        self.tasks[0].tags.add(Tag.objects.create(name="Север"))
+
+    def test_csv_in_keyset_chunks(self):
+        import csv
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tgbot.logics.export import export_lines
+
+        with CaptureQueriesContext(connection) as context:
+            rows = list(csv.reader(export_lines(Task.objects.all(), "csv", chunk_size=2)))
+
+        self.assertEqual(rows[0][:3], ["id", "number", "title"])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [task.id for task in self.tasks])
+        self.assertEqual(rows[1][rows[0].index("tags")], "Север")
+        chunks = [query["sql"] for query in context.captured_queries if 'FROM "tgbot_task"' in query["sql"]]
+        # три порции и пустая последняя, без OFFSET
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(all('"tgbot_task"."id" >' in sql for sql in chunks[1:]))
+        self.assertFalse(any("OFFSET" in sql for sql in chunks))
+
+    def test_jsonl_survives_deletes_between_chunks(self):
+        import json
+        from tgbot.logics.export import export_lines
+
+        lines = export_lines(Task.objects.filter(stage=Task.Stage.CREATED), "jsonl", chunk_size=2)
+        records = [json.loads(next(lines)) for _ in range(2)]
+        # уже выгруженные строки удалены — со смещением следующая порция пропустила бы строки
+        Task.objects.filter(id__in=[record["id"] for record in records]).delete()
+        records += [json.loads(line) for line in lines]
+
+        self.assertEqual([record["id"] for record in records], [task.id for task in self.tasks])
+        self.assertEqual(records[0]["tags"], "Север")
+
+
+class ColdArchiveTest(BotTestCase):
+    """Перенос закрытых заявок в файловый архив и чтение их обратно по индексу"""
+
+    def setUp(self):
+        import tempfile
+        from datetime import timedelta
+        from django.utils import timezone
+        from tgbot.logics.messages import broadcast_send_task_to_users
+
+        super().setUp()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings = override_settings(TASK_ARCHIVE_DIR=archive_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.task = self.create_task()
+        self.task.tags.add(Tag.objects.create(name="Север"))
+        Files.objects.create(task=self.task, file_id="f1", file_type="photo")
+        Response.objects.create(task=self.task, telegram_user=self.masters[0], payment_type=self.payment_type)
+        broadcast_send_task_to_users(self.task)
+        self.task.stage = Task.Stage.CLOSED
+        self.task.closed_at = timezone.now() - timedelta(days=40)
+        self.task.save()
+        api.reset()
+
+    def archive(self) -> int:
+        from tgbot.logics.cold_archive import archive_old_tasks
+        return archive_old_tasks(days=30)
+
+    def test_round_trip(self):
+        from tgbot.logics.cold_archive import load_archived_task
+
+        self.assertTrue(SentMessage.objects.filter(task_id=self.task.id).exists())
+        self.assertEqual(self.archive(), 1)
+
+        self.assertFalse(Task.objects.filter(id=self.task.id).exists())
+        self.assertFalse(SentMessage.objects.filter(task_id=self.task.id).exists())
+        entry = ArchivedTask.objects.get(task_id=self.task.id)
+        self.assertEqual(entry.responses_count, 1)
+        record = load_archived_task(entry)
+        self.assertEqual(record["title"], self.task.title)
+        self.assertEqual(record["tags"], ["Север"])
+        self.assertEqual([file["file_id"] for file in record["files"]], ["f1"])
+        self.assertEqual([response["master"]["chat_id"] for response in record["responses"]], [self.masters[0].chat_id])
+        # сообщения заявки в Telegram остаются у мастеров
+        self.assertEqual(api.count("deleteMessage") + api.count("deleteMessages"), 0)
+        self.assertFalse(OutboxMessage.objects.filter(operation=OutboxMessage.Operation.DELETE_MESSAGE).exists())
+
+    def test_rerun_after_interrupted_archive(self):
+        from tgbot.logics.cold_archive import load_archived_task
+
+        # блок уже дописан в файл, а транзакция с индексом и удалением не прошла
+        with mock.patch.object(ArchivedTask.objects, "bulk_create", side_effect=RuntimeError("сбой")):
+            with self.assertRaises(RuntimeError):
+                self.archive()
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())
+        self.assertFalse(ArchivedTask.objects.exists())
+
+        self.assertEqual(self.archive(), 1)
+        entry = ArchivedTask.objects.get(task_id=self.task.id)
+        self.assertGreater(entry.offset, 0)
+        self.assertEqual(load_archived_task(entry)["id"], self.task.id)
+
+
+class StatsRollupTest(BotTestCase):
+    """Сводки, которые ведут сигналы, совпадают с пересчётом reconcile() после каждого шага"""
+
+    def snapshot(self):
+        return (
+            list(DailyStats.objects.order_by("date").values_list(
+                "date", "tasks_created", "tasks_closed", "responses", "unique_masters"
+            )),
+            sorted(DailyPaymentStats.objects.exclude(responses=0).values_list("date", "payment_type_id", "responses")),
+            sorted(DailyMasterActivity.objects.values_list("date", "telegram_user_id", "responses")),
+        )
+
+    def assertMatchesReconcile(self):
+        from django.utils import timezone
+        from tgbot.logics.stats import reconcile
+
+        incremental = self.snapshot()
+        reconcile(timezone.localdate())
+        self.assertEqual(incremental, self.snapshot())
+
+    def respond(self, task: Task, master: TelegramUser) -> Response:
+        return Response.objects.create(task=task, telegram_user=master, payment_type=self.payment_type)
+
+    def close(self, task: Task):
+        from django.utils import timezone
+        task.stage = Task.Stage.CLOSED
+        task.closed_at = timezone.now()
+        task.save()
+
+    def test_task_lifecycle(self):
+        first, second = self.create_task(), self.create_task()
+        self.assertMatchesReconcile()
+
+        self.respond(first, self.masters[0])
+        self.respond(second, self.masters[0])
+        cancelled = self.respond(first, self.masters[1])
+        self.assertMatchesReconcile()
+        self.assertEqual(DailyStats.objects.get().unique_masters, 2)
+
+        # отмена отклика: мастер больше не откликался сегодня
+        cancelled.delete()
+        self.assertMatchesReconcile()
+        self.assertEqual(DailyStats.objects.get().unique_masters, 1)
+
+        self.close(first)
+        self.assertMatchesReconcile()
+
+        # повтор: отклики удаляются, заявка снова открыта
+        first = Task.objects.get(pk=first.pk)
+        first.responses.all().delete()
+        first.stage = Task.Stage.CREATED
+        first.closed_at = None
+        first.save()
+        self.assertMatchesReconcile()
+        self.assertEqual(DailyStats.objects.get().tasks_closed, 0)
+
+        # повторное закрытие того же объекта сравнивается с уже записанными значениями
+        self.close(first)
+        self.close(first)
+        self.assertMatchesReconcile()
+        self.assertEqual(DailyStats.objects.get().tasks_closed, 1)
+
+        # отмена заявки удаляет её вместе с откликами
+        second.delete()
+        first.delete()
+        self.assertMatchesReconcile()
+        self.assertEqual(
+            DailyStats.objects.values_list("tasks_created", "tasks_closed", "responses", "unique_masters").get(),
+            (0, 0, 0, 0),
+        )
+
+    def test_rollups_paused(self):
+        from tgbot.logics.stats import rollups_paused
+
+        task = self.create_task()
+        self.respond(task, self.masters[0])
+        self.close(task)
+        before = self.snapshot()
+        with rollups_paused():
+            Task.objects.get(pk=task.pk).delete()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_save_does_not_reread_task(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        task_id = self.create_task().pk
+        task = Task.objects.get(pk=task_id)
+        with CaptureQueriesContext(connection) as queries:
+            self.close(task)
+        reads = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and 'FROM "tgbot_task"' in q["sql"]]
+        self.assertEqual(reads, [])
+        self.assertEqual(DailyStats.objects.get().tasks_closed, 1)